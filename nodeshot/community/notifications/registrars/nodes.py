@@ -3,12 +3,12 @@ from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
-from nodeshot.core.nodes.signals import node_status_changed
+from nodeshot.core.nodes.signals import node_status_changed, nodes_bulk_saved
 from nodeshot.core.nodes.models import Node
 
 from ..settings import settings
 from ..models import Notification
-from ..tasks import create_notifications
+from ..tasks import create_notifications, create_notifications_for_objects
 
 
 base_queryset = User.objects.filter(is_active=True)
@@ -37,6 +37,21 @@ def node_created_handler(sender, **kwargs):
         })
 
 
+@receiver(nodes_bulk_saved, sender=Node)
+def nodes_bulk_created_handler(sender, **kwargs):
+    """ same as node_created_handler for the nodes created by a bulk operation, in a single task """
+    created = kwargs['created']
+    if created:
+        # nodes created by a bulk operation belong to the same user
+        queryset = exclude_owner_of_node(created[0])
+        create_notifications_for_objects.delay(**{
+            "users": queryset,
+            "notification_model": Notification,
+            "notification_type": "node_created",
+            "related_objects": created
+        })
+
+
 # ------ NODE STATUS CHANGED ------ #
 
 @receiver(node_status_changed)
@@ -83,6 +98,7 @@ def node_deleted_handler(sender, **kwargs):
 def disconnect():
     """ disconnect signals """
     post_save.disconnect(node_created_handler, sender=Node)
+    nodes_bulk_saved.disconnect(nodes_bulk_created_handler, sender=Node)
     node_status_changed.disconnect(node_status_changed_handler)
     pre_delete.disconnect(node_deleted_handler, sender=Node)
 
@@ -90,6 +106,7 @@ def disconnect():
 def reconnect():
     """ reconnect signals """
     post_save.connect(node_created_handler, sender=Node)
+    nodes_bulk_saved.connect(nodes_bulk_created_handler, sender=Node)
     node_status_changed.connect(node_status_changed_handler)
     pre_delete.connect(node_deleted_handler, sender=Node)
 
@@ -40,3 +40,12 @@ def create_notifications(users, notification_model, notification_type, related_o
             n.related_object = related_object
         # create notification and send according to user settings
         n.save()
+
+
+@task
+def create_notifications_for_objects(users, notification_model, notification_type, related_objects):
+    """
+    same as create_notifications for many related objects, in a single background job
+    """
+    for related_object in related_objects:
+        create_notifications(users, notification_model, notification_type, related_object)
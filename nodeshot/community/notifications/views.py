@@ -1,11 +1,13 @@
 from rest_framework import generics, permissions, authentication
 from rest_framework.response import Response
 
+from nodeshot.core.base.mixins import CursorPaginationMixin
+
 from .models import *
 from .serializers import *
 
 
-class NotificationList(generics.ListAPIView):
+class NotificationList(CursorPaginationMixin, generics.ListAPIView):
     """
     Retrieve a list of notifications of the current user.
     
@@ -17,6 +19,7 @@ class NotificationList(generics.ListAPIView):
      * `action=all`: retrieve all notifications with pagination
         * `limit=<n>`: specify number of items per page (defaults to 30)
         * `limit=0`: turns off pagination
+        * `cursor=`: paginate with cursors (faster on deep pages, no count), follow the `next` and `previous` links
     """
     authentication_classes = (authentication.SessionAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
@@ -109,8 +109,9 @@ Node.participation_settings = _node_participation_settings
 from django.dispatch import receiver
 from django.db.models.signals import post_save
 from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.signals import nodes_bulk_saved
 
-from ..tasks import create_related_object
+from ..tasks import create_related_object, bulk_create_related_objects
 
 
 @receiver(post_save, sender=Node)
@@ -126,6 +127,15 @@ def create_node_rating_counts_settings(sender, **kwargs):
         create_related_object.delay(NodeParticipationSettings, { 'node': node })
 
 
+@receiver(nodes_bulk_saved, sender=Node)
+def bulk_create_node_rating_counts_settings(sender, **kwargs):
+    """ create rating count and settings of the nodes created by a bulk operation """
+    ids = [node.id for node in kwargs['created']]
+    if ids:
+        bulk_create_related_objects.delay(NodeRatingCount, 'node_id', ids)
+        bulk_create_related_objects.delay(NodeParticipationSettings, 'node_id', ids)
+
+
 @receiver(post_save, sender=Layer)
 def create_layer_rating_settings(sender, **kwargs):
     """ create layer rating settings """
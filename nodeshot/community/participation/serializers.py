@@ -166,17 +166,31 @@ class LayerParticipationSettingsSerializer(serializers.ModelSerializer):
 
 from nodeshot.core.nodes.serializers import ExtensibleNodeSerializer
 
+def prefetch_comments(nodes, request):
+    """ comments of many nodes (and their authors) in a single query """
+    comments = dict([(node.pk, []) for node in nodes])
+    for comment in Comment.objects.filter(node__in=comments.keys()).select_related('user'):
+        comments[comment.node_id].append(comment)
+    return comments
+
 ExtensibleNodeSerializer.add_relationship(
     'comments',
     serializer=CommentRelationSerializer,
     many=True,
-    queryset='obj.comment_set.all()'
+    queryset='obj.comment_set.all()',
+    prefetch=prefetch_comments
 )
 
+def prefetch_counts(nodes, request):
+    """ counts of many nodes in a single query """
+    counts = NodeRatingCount.objects.filter(node__in=[node.pk for node in nodes])
+    return dict([(count.node_id, count) for count in counts])
+
 ExtensibleNodeSerializer.add_relationship(
     'counts',
     serializer=ParticipationSerializer,
-    queryset='obj.noderatingcount'
+    queryset='obj.noderatingcount',
+    prefetch=prefetch_counts
 )
 
 ExtensibleNodeSerializer.add_relationship(
@@ -213,7 +227,18 @@ def has_already_voted(obj, request):
     # hasn't voted yet or not authenticated
     return False
 
+def prefetch_has_already_voted(nodes, request):
+    """ same as has_already_voted for many nodes in a single query """
+    votes = dict([(node.pk, False) for node in nodes])
+    if request.user.is_authenticated():
+        queryset = Vote.objects.filter(node_id__in=votes.keys(), user_id=request.user.id)
+        for node_id, vote in queryset.values_list('node_id', 'vote'):
+            if votes[node_id] is False:
+                votes[node_id] = vote
+    return votes
+
 ExtensibleNodeSerializer.add_relationship(
     'has_already_voted',
-    function=has_already_voted
+    function=has_already_voted,
+    prefetch=prefetch_has_already_voted
 )
@@ -9,4 +9,11 @@ def create_related_object(model, kwargs):
     """
     create object with specified kwargs in background
     """
-    model.objects.create(**kwargs)
\ No newline at end of file
+    model.objects.create(**kwargs)
+
+@task
+def bulk_create_related_objects(model, field_name, ids):
+    """
+    create one object for each id (value of field_name) in background with a single query
+    """
+    model.objects.bulk_create([model(**{ field_name: id }) for id in ids])
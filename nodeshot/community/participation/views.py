@@ -8,7 +8,7 @@ from rest_framework import permissions, authentication, generics
 from .models import Rating, Vote, Comment
 from .serializers import *
 
-from nodeshot.core.base.mixins import CustomDataMixin
+from nodeshot.core.base.mixins import CursorPaginationMixin, CustomDataMixin
 from nodeshot.core.nodes.models import Node
 from nodeshot.core.layers.models import Layer
 
@@ -41,9 +41,13 @@ class AllNodesParticipationList(generics.ListAPIView):
 all_nodes_participation= AllNodesParticipationList.as_view()
 
 
-class AllNodesCommentList(generics.ListAPIView):
+class AllNodesCommentList(CursorPaginationMixin, generics.ListAPIView):
     """
     Retrieve comments  for all nodes
+
+    Parameters:
+
+     * `cursor=`: paginate with cursors (faster on deep pages, no count), follow the `next` and `previous` links
     """
     authentication_classes = (authentication.SessionAuthentication,)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
@@ -56,9 +60,13 @@ class AllNodesCommentList(generics.ListAPIView):
 all_nodes_comments= AllNodesCommentList.as_view()
 
  
-class LayerNodesCommentList(generics.ListAPIView):
+class LayerNodesCommentList(CursorPaginationMixin, generics.ListAPIView):
     """
     Retrieve comments  for all nodes of a layer
+
+    Parameters:
+
+     * `cursor=`: paginate with cursors (faster on deep pages, no count), follow the `next` and `previous` links
     """
     authentication_classes = (authentication.SessionAuthentication,)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
@@ -142,9 +150,13 @@ class LayerParticipationSettingsDetail(generics.RetrieveAPIView):
 layer_participation_settings = LayerParticipationSettingsDetail.as_view() 
 
 
-class NodeCommentList(CustomDataMixin, generics.ListCreateAPIView):
+class NodeCommentList(CursorPaginationMixin, CustomDataMixin, generics.ListCreateAPIView):
     """
     Retrieve a **list** of comments for the specified node
+
+    Parameters:
+
+     * `cursor=`: paginate with cursors (faster on deep pages, no count), follow the `next` and `previous` links
     
     ### POST
     
@@ -179,7 +179,8 @@ from nodeshot.core.nodes.base import ExtensibleNodeSerializer
 ExtensibleNodeSerializer.add_relationship(
     name='user',
     serializer=ProfileRelationSerializer,
-    queryset='obj.user'
+    queryset='obj.user',
+    prefetch_related=['user']
 )
 
 
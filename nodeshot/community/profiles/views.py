@@ -122,7 +122,7 @@ if 'nodeshot.core.nodes' in settings.INSTALLED_APPS:
 
         Parameters:
 
-         * `search=<word>`: search <word> in name of nodes of specified layer
+         * `search=<words>`: full text search of <words> in name, slug, address and description of nodes (most relevant first)
          * `limit=<n>`: specify number of items per page (defaults to 40)
          * `limit=0`: turns off pagination
         """
@@ -134,6 +134,10 @@ if 'nodeshot.core.nodes' in settings.INSTALLED_APPS:
 
             return super(UserNodes, self).get_queryset().filter(user_id=self.user.id)
 
+        def get_validators(self):
+            """ the response contains the profile too, which doesn't keep track of changes """
+            return None
+
         def get(self, request, *args, **kwargs):
             """ Retrieve list of nodes of the specified user """
             # ListSerializerMixin.list returns a serializer object
@@ -148,6 +148,15 @@ else:
             'OPTIONS': {
                 'CLIENT_CLASS': 'redis_cache.client.DefaultClient',
             }
+        },
+        # versions of cached data, must not be cleared together with the default cache
+        # (see NODESHOT_VERSIONS_CACHE)
+        'versions': {
+            'BACKEND': 'redis_cache.cache.RedisCache',
+            'LOCATION': '127.0.0.1:6379:2',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'redis_cache.client.DefaultClient',
+            }
         }
     }
 
@@ -265,6 +274,10 @@ CELERYBEAT_SCHEDULE = {
     'purge_notifications': {
         'task': 'nodeshot.community.notifications.tasks.purge_notifications',
         'schedule': timedelta(days=1),
+    },
+    'purge_node_deletions': {
+        'task': 'nodeshot.core.nodes.tasks.purge_node_deletions',
+        'schedule': timedelta(days=1),
     }
 }
 
@@ -35,7 +35,11 @@ if 'social_auth' in settings.INSTALLED_APPS:
 
 
 if 'grappelli' in settings.INSTALLED_APPS:
+    from nodeshot.core.nodes.admin import NodeAutocompleteLookup
+
     urlpatterns = urlpatterns + patterns('',
+        # full text search of nodes, must be before grappelli.urls
+        url(r'^grappelli/lookup/autocomplete/$', NodeAutocompleteLookup.as_view(), name='grp_autocomplete_lookup'),
         url(r'^grappelli/', include('grappelli.urls')),
     )
 
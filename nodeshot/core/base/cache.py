@@ -1,7 +1,18 @@
 """
 utilities for caching
 """
-from django.core.cache import cache
+import uuid
+
+from django.core.cache import cache, get_cache
+
+from .settings import GROUP_NAME_CACHE_TIMEOUT, VERSIONS_CACHE
+
+
+# versions are stored in a separate cache, which is not cleared
+# together with cached pages (see cache_delete_pattern_or_all)
+versions_cache = get_cache(VERSIONS_CACHE)
+
+GROUP_NAMES_VERSION_KEY = 'group_names_version'
 
 
 def cache_delete_pattern_or_all(pattern):
@@ -13,30 +24,93 @@ def cache_delete_pattern_or_all(pattern):
         cache.clear()
 
 
-def cache_by_group(view_instance, view_method, request, args, kwargs):
+def get_version(key):
     """
-    Cache view response by media type and user group.
-    The cache_key is constructed this way: "{view_name:path.group.media_type}"
-    EG: "MenuList:/api/v1/menu/.public.application/json"
+    returns the current version of key, which is shared by all the processes;
+    data cached or kept in memory with an older version is stale
+    """
+    version = versions_cache.get(key)
+    if version is None:
+        versions_cache.add(key, uuid.uuid4().hex, None)
+        version = versions_cache.get(key)
+    return version
+
+
+def new_version(key):
+    """ changes the version of key, which invalidates the data of every process """
+    versions_cache.set(key, uuid.uuid4().hex, None)
+
+
+def group_name_cache_key(user_pk):
+    return 'group_name:%s:%s' % (get_version(GROUP_NAMES_VERSION_KEY), user_pk)
+
+
+def get_group_name(user):
+    """
+    Returns the name of the group which determines what the user can see.
     Possible groups are:
         * public
         * superuser
         * the rest are retrieved from DB (registered, community, trusted are the default ones)
+
+    The group name is cached on the user instance, which lasts for the whole
+    request (request.user), and in the django cache (shared by all the processes)
+    for NODESHOT_GROUP_NAME_CACHE_TIMEOUT seconds; it is invalidated when the
+    group membership of the user changes (see invalidate_group_names).
     """
-    if request.user.is_anonymous():
-        group = 'public'
-    elif request.user.is_superuser:
-        group = 'superuser'
-    else:
-        try:
-            group = request.user.groups.all().order_by('-id').first().name
-        except IndexError:
-            group = 'public'
+    if user.is_anonymous():
+        return 'public'
+    elif user.is_superuser:
+        return 'superuser'
+
+    # request-scoped cache
+    try:
+        return user._group_name
+    except AttributeError:
+        pass
+
+    # shared cache
+    key = group_name_cache_key(user.pk) if GROUP_NAME_CACHE_TIMEOUT else None
+    group_name = cache.get(key) if key else None
+    if group_name is None:
+        group = user.groups.all().order_by('-id').first()
+        group_name = group.name if group is not None else 'public'
+        if key:
+            cache.set(key, group_name, GROUP_NAME_CACHE_TIMEOUT)
+
+    user._group_name = group_name
+    return group_name
+
+
+def invalidate_group_names(users=None):
+    """
+    Forgets the cached group names of the specified users (instances or pks),
+    or of all the users if no user is specified (by changing their version).
+    """
+    if users is None:
+        new_version(GROUP_NAMES_VERSION_KEY)
+        return
 
+    keys = []
+    for user in users:
+        if hasattr(user, 'pk'):
+            user.__dict__.pop('_group_name', None)
+            user = user.pk
+        keys.append(group_name_cache_key(user))
+    cache.delete_many(keys)
+
+
+def cache_by_group(view_instance, view_method, request, args, kwargs):
+    """
+    Cache view response by media type and user group.
+    The cache_key is constructed this way: "{view_name:path.group.media_type}"
+    EG: "MenuList:/api/v1/menu/.public.application/json"
+    Possible groups are the ones returned by get_group_name
+    """
     key = '%s:%s.%s.%s' % (
         view_instance.__class__.__name__,
         request.META['PATH_INFO'],
-        group,
+        get_group_name(request.user),
         request.accepted_media_type
     )
 
@@ -0,0 +1,93 @@
+"""
+Simplification and coordinate precision of the geometries of responses
+
+Geometries are simplified (ST_SimplifyPreserveTopology) and encoded
+in GeoJSON (ST_AsGeoJSON) by the database according to the parameters:
+
+    ?simplify=<tolerance>       tolerance in degrees
+    ?simplify=true&zoom=<n>     tolerance suitable for maps at zoom level n
+    ?precision=<n>              number of decimal digits of coordinates
+
+Zoom levels are a finite set of tolerances, therefore geometries simplified
+for a zoom level can be cached (see GeoJSONOptions.cache_key).
+"""
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import ParseError
+
+from .settings import GEOJSON_SIMPLIFY_PIXELS, GEOJSON_SIMPLIFY_MAX_ZOOM
+
+
+__all__ = [
+    'MAX_PRECISION',
+    'zoom_tolerance',
+    'GeoJSONOptions',
+]
+
+
+# max number of decimal digits supported by ST_AsGeoJSON
+MAX_PRECISION = 15
+
+
+def zoom_tolerance(zoom):
+    """ tolerance in degrees corresponding to NODESHOT_GEOJSON_SIMPLIFY_PIXELS at the specified zoom level """
+    return 360.0 / (256 * 2 ** zoom) * GEOJSON_SIMPLIFY_PIXELS
+
+
+class GeoJSONOptions(object):
+    """ how geometries are encoded in GeoJSON, the default options encode them as they are """
+
+    def __init__(self, tolerance=None, precision=MAX_PRECISION, zoom=None):
+        self.zoom = zoom
+        self.tolerance = zoom_tolerance(zoom) if zoom is not None and tolerance is None else tolerance
+        self.precision = precision
+
+    @classmethod
+    def from_query_params(cls, params):
+        """ reads the simplify, zoom and precision parameters, raises ParseError if invalid """
+        simplify = params.get('simplify', None)
+        tolerance = zoom = None
+
+        if simplify == 'true':
+            try:
+                zoom = int(params['zoom'])
+            except (KeyError, ValueError):
+                raise ParseError(_('simplify=true requires a valid zoom parameter'))
+            if zoom < 0:
+                raise ParseError(_('zoom must be a positive number'))
+            # no need to simplify at the highest zoom levels
+            if zoom > GEOJSON_SIMPLIFY_MAX_ZOOM:
+                zoom = None
+        elif simplify not in (None, '', 'false'):
+            try:
+                tolerance = float(simplify)
+            except ValueError:
+                raise ParseError(_('simplify must be either true or a tolerance in degrees'))
+            if not 0 < tolerance < 360:
+                raise ParseError(_('tolerance must be a positive number of degrees'))
+
+        try:
+            precision = int(params.get('precision', MAX_PRECISION))
+        except ValueError:
+            raise ParseError(_('precision must be a number'))
+        if not 0 <= precision <= MAX_PRECISION:
+            raise ParseError(_('precision must be between 0 and %d') % MAX_PRECISION)
+
+        return cls(tolerance=tolerance, precision=precision, zoom=zoom)
+
+    @property
+    def is_default(self):
+        return self.tolerance is None and self.precision == MAX_PRECISION
+
+    @property
+    def cache_key(self):
+        """ part of the cache key of geometries encoded with these options, None if not worth caching """
+        if self.tolerance is not None and self.zoom is None:
+            return None
+        return '%s:%s' % (self.zoom, self.precision)
+
+    def as_sql(self, column):
+        """ SQL expression which returns the GeoJSON of column (quoted) """
+        if self.tolerance is not None:
+            column = 'ST_SimplifyPreserveTopology(%s, %r)' % (column, float(self.tolerance))
+        return 'ST_AsGeoJSON(%s, %d)' % (column, int(self.precision))
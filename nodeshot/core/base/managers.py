@@ -7,6 +7,7 @@ from django_hstore.query import HStoreQuerySet, HStoreGeoQuerySet
 from django_hstore.managers import HStoreManager, HStoreGeoManager
 
 from nodeshot.core.base.choices import ACCESS_LEVELS
+from nodeshot.core.base.cache import get_group_name
 
 
 # -------- MIXINS -------- #
@@ -60,17 +61,15 @@ class ACLMixin(BaseUtilityMixin):
         
         :param user: an user instance
         """
-        if user.is_superuser:
+        group_name = get_group_name(user)
+        
+        if group_name == 'superuser':
             try:
                 queryset = self.get_query_set()
             except AttributeError:
                 queryset = self
-        elif user.is_authenticated():
-            # get user group (higher id)
-            group = user.groups.all().order_by('-id')[0]
-            queryset = self.filter(access_level__lte=ACCESS_LEVELS.get(group.name))
         else:
-            queryset = self.filter(access_level__lte=ACCESS_LEVELS.get('public'))
+            queryset = self.filter(access_level__lte=ACCESS_LEVELS.get(group_name))
         return queryset
 
 
@@ -2,12 +2,24 @@
 reusable restframework mixins for API views
 """
 
+import hashlib
 import reversion
 import warnings
+from calendar import timegm
 
-from django.http import Http404
+from django.http import Http404, HttpResponseNotModified
+from django.contrib.gis.geos import Polygon
+from django.db.models import Max, Count
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+from django.utils.translation import ugettext_lazy as _
 
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
+
+from .cache import get_group_name
+from .geojson import GeoJSONOptions
+from .pagination import CursorPage
+from .serializers import CursorPaginationSerializer
 
 
 class ACLMixin(object):
@@ -23,6 +35,187 @@ class ACLMixin(object):
         return self.queryset.accessible_to(user=self.request.user)
 
 
+class BBoxFilterMixin(object):
+    """
+    Restricts the queryset to the objects whose bounding box overlaps
+    the bounding box specified in the "bbox" query parameter:
+
+        ?bbox=<minx>,<miny>,<maxx>,<maxy>
+
+    Points are returned only if they are inside the box, while other geometries
+    are returned also if they just intersect it (or if only their bounding box does).
+
+    The "&&" operator used by the "bboverlaps" lookup is always answered by
+    the GiST index of the geometry column. The name of the geometry field
+    can be changed through the "bbox_filter_field" attribute.
+    """
+    bbox_filter_field = 'geometry'
+
+    def get_bbox(self):
+        """ returns a Polygon representing the requested bounding box or None """
+        bbox = self.request.QUERY_PARAMS.get('bbox', None)
+
+        if bbox is None:
+            return None
+
+        try:
+            minx, miny, maxx, maxy = [float(value) for value in bbox.split(',')]
+        except ValueError:
+            raise ParseError(_('bbox must be in the format minx,miny,maxx,maxy'))
+
+        if minx > maxx or miny > maxy:
+            raise ParseError(_('bbox minimum values must not be greater than maximum values'))
+
+        polygon = Polygon.from_bbox((minx, miny, maxx, maxy))
+        polygon.srid = 4326
+        return polygon
+
+    def get_queryset(self):
+        queryset = super(BBoxFilterMixin, self).get_queryset()
+        bbox = self.get_bbox()
+
+        if bbox is not None:
+            queryset = queryset.filter(**{ '%s__bboverlaps' % self.bbox_filter_field: bbox })
+
+        return queryset
+
+
+class GeoJSONOptionsMixin(object):
+    """
+    Adds the geometry simplification and coordinate precision parameters
+    (see nodeshot.core.base.geojson) to views which output geometries:
+
+        ?simplify=<tolerance>
+        ?simplify=true&zoom=<n>
+        ?precision=<n>
+
+    Options are passed to serializers in the "geojson_options" key of the context.
+    """
+    def get_geojson_options(self):
+        if getattr(self, '_geojson_options', None) is None:
+            self._geojson_options = GeoJSONOptions.from_query_params(self.request.QUERY_PARAMS)
+        return self._geojson_options
+
+    def get_serializer_context(self):
+        context = super(GeoJSONOptionsMixin, self).get_serializer_context()
+        context['geojson_options'] = self.get_geojson_options()
+        return context
+
+
+class NotModified(Exception):
+    """ raised by ConditionalGetMixin to skip the handler of the request """
+    pass
+
+
+class ConditionalGetMixin(object):
+    """
+    Adds the ETag and Last-Modified headers to GET responses and answers
+    with "304 Not Modified" to conditional requests (If-None-Match, If-Modified-Since)
+    if nothing changed, in which case nothing is serialized.
+
+    Validators are computed with a single aggregate query on the queryset of the view
+    (restricted to the requested object in detail views): the latest "updated" value,
+    the number of rows, the group of the user and the requested format.
+    """
+    conditional_updated_field = 'updated'
+
+    def get_conditional_queryset(self):
+        """ objects which determine the content of the response """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = self.kwargs.get(self.lookup_field, None)
+        if lookup is not None:
+            queryset = queryset.filter(**{ self.lookup_field: lookup })
+        return queryset
+
+    def get_validators(self):
+        """
+        returns a tuple containing the etag and the last modification date (might be None)
+        or None if the response cannot be validated
+        """
+        values = self.get_conditional_queryset().aggregate(last_modified=Max(self.conditional_updated_field),
+                                                           count=Count('pk'))
+        key = '%s:%s:%s:%s' % (values['last_modified'],
+                               values['count'],
+                               get_group_name(self.request.user),
+                               self.request.accepted_renderer.format)
+        return '"%s"' % hashlib.md5(key.encode('utf-8')).hexdigest(), values['last_modified']
+
+    def is_not_modified(self, request, etag, last_modified):
+        """ same logic of django.views.decorators.http.condition """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag.strip('"') in etags
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since and last_modified:
+            return timegm(last_modified.utctimetuple()) <= if_modified_since
+
+        return False
+
+    def set_validator_headers(self, response):
+        etag, last_modified = self._validators
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super(ConditionalGetMixin, self).initial(request, *args, **kwargs)
+        self._validators = None
+
+        if request.method in ('GET', 'HEAD'):
+            self._validators = self.get_validators()
+            if self._validators and self.is_not_modified(request, *self._validators):
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return self.set_validator_headers(HttpResponseNotModified())
+        return super(ConditionalGetMixin, self).handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ConditionalGetMixin, self).finalize_response(request, response, *args, **kwargs)
+        if getattr(self, '_validators', None) and response.status_code == 200:
+            self.set_validator_headers(response)
+        return response
+
+
+class CursorPaginationMixin(object):
+    """
+    Adds keyset pagination to paginated list views, selected with the "cursor" query parameter:
+
+        ?cursor=            first page
+        ?cursor=<cursor>    page pointed by the "next" or "previous" links
+
+    Unlike page number pagination the cost of a page doesn't depend on its depth
+    and objects are not counted. Objects are ordered by "cursor_fields".
+    Views which are not paginated by default use "cursor_paginate_by" as page size.
+    """
+    cursor_fields = ('id',)
+    cursor_paginate_by = 50
+    cursor_pagination_serializer_class = CursorPaginationSerializer
+
+    def paginate_queryset(self, queryset, page_size=None):
+        cursor = self.request.QUERY_PARAMS.get('cursor', None)
+
+        if cursor is None or page_size is not None:
+            return super(CursorPaginationMixin, self).paginate_queryset(queryset, page_size)
+
+        page_size = self.get_paginate_by() or self.cursor_paginate_by
+        return CursorPage(queryset, cursor, page_size, self.cursor_fields)
+
+    def get_pagination_serializer(self, page):
+        if not isinstance(page, CursorPage):
+            return super(CursorPaginationMixin, self).get_pagination_serializer(page)
+
+        class SerializerClass(self.cursor_pagination_serializer_class):
+            class Meta:
+                object_serializer_class = self.get_serializer_class()
+
+        return SerializerClass(instance=page, context=self.get_serializer_context())
+
+
 class CustomDataMixin(object):
     """
     Implements custom data in views
@@ -117,14 +117,17 @@ class BaseAccessLevel(BaseDate):
     class Meta:
         abstract = True
     
-    def __init__(self, *args, **kwargs):
+    @classmethod
+    def set_access_level_options(cls):
         """
         Determines default value for field "access_level" and determines if is editable
-        In the case the field is not editable it won't show up at all
+        In the case the field is not editable it won't show up at all.
+        Called once for each model (see set_access_level_options_on_prepare)
+        instead of every time an instance is created.
         """
         
         # {APP_NAME}_{MODEL_NAME}, eg: NODES_NODE
-        app_descriptor = '%s_%s' % (self._meta.app_label.upper(), self._meta.object_name.upper())
+        app_descriptor = '%s_%s' % (cls._meta.app_label.upper(), cls._meta.object_name.upper())
         
         # looks up in settings.py
         # example: NODESHOT_ACL_NODES_NODE_DEFAULT
@@ -137,11 +140,9 @@ class BaseAccessLevel(BaseDate):
         ACL_EDITABLE = getattr(settings, 'NODESHOT_ACL_%s_EDITABLE' % app_descriptor, ACL_DEFAULT_EDITABLE)
         
         # set "default" and "editable" attributes
-        self._meta.get_field('access_level').default = ACL_DEFAULT
-        self._meta.get_field('access_level').editable = ACL_EDITABLE
-        
-        # call super __init__
-        super(BaseAccessLevel, self).__init__(*args, **kwargs)
+        field = cls._meta.get_field('access_level')
+        field.default = ACL_DEFAULT
+        field.editable = ACL_EDITABLE
 
 
 class BaseOrdered(models.Model):
@@ -172,3 +173,43 @@ class BaseOrderedACL(BaseOrdered, BaseAccessLevel):
     class Meta:
         ordering = ["order"]
         abstract = True
+
+
+# ------ Signals ------ #
+
+
+from django.dispatch import receiver
+from django.db.models.signals import class_prepared, m2m_changed, post_save, pre_delete
+from django.contrib.auth.models import Group
+
+from .cache import invalidate_group_names
+
+
+@receiver(class_prepared)
+def set_access_level_options_on_prepare(sender, **kwargs):
+    """ resolve the access level settings of each model only once, when its class is ready """
+    # multi-table inheritance children (eg: Ethernet) share the field of their parent (eg: Interface)
+    if issubclass(sender, BaseAccessLevel) and sender._meta.get_field('access_level').model is sender:
+        sender.set_access_level_options()
+
+
+@receiver(m2m_changed)
+def clear_group_names(sender, **kwargs):
+    """ forget the cached group names of users whose group membership changes """
+    if not kwargs['action'].startswith('post_'):
+        return
+    instance = kwargs['instance']
+    # group.user_set.add(...), group.user_set.clear()
+    if isinstance(instance, Group):
+        pk_set = kwargs['pk_set']
+        invalidate_group_names(list(pk_set) if pk_set is not None else None)
+    # user.groups.add(...), user.groups.clear()
+    elif kwargs['model'] is Group:
+        invalidate_group_names([instance])
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def clear_all_group_names(sender, **kwargs):
+    """ renaming or deleting a group affects all its users """
+    invalidate_group_names()
@@ -0,0 +1,111 @@
+"""
+Keyset (cursor) pagination
+
+Pages are delimited by the values of the ordering fields of their first and
+last objects instead of by an offset, therefore retrieving a page costs the
+same regardless of its depth and no COUNT(*) is needed.
+Cursors are opaque strings which encode those values and the direction.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import ParseError
+
+
+__all__ = [
+    'encode_cursor',
+    'decode_cursor',
+    'keyset_filter',
+    'CursorPage',
+]
+
+
+def encode_cursor(values, reverse=False):
+    """ returns an opaque cursor which points after (or before if reverse is True) values """
+    data = json.dumps({
+        'k': [value.isoformat() if hasattr(value, 'isoformat') else value for value in values],
+        'r': reverse
+    })
+    return base64.urlsafe_b64encode(data)
+
+
+def decode_cursor(cursor, model, fields):
+    """
+    returns a tuple containing the values of fields and the direction encoded in cursor
+    (None and False for an empty cursor, which indicates the first page)
+    """
+    if not cursor:
+        return None, False
+
+    try:
+        data = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        values = [model._meta.get_field(field).to_python(value) for field, value in zip(fields, data['k'])]
+        reverse = bool(data['r'])
+        assert len(values) == len(fields)
+    except Exception:
+        raise ParseError(_('invalid cursor'))
+
+    return values, reverse
+
+
+def keyset_filter(fields, values, lookup, inclusive=False):
+    """
+    Q object which compares the tuple of fields to values, eg:
+    (updated, id) > (u, i) becomes updated > u OR (updated = u AND id > i)
+
+    :param lookup: either "gt" or "lt"
+    :param inclusive: if True the row equal to values is matched too
+    """
+    query = Q()
+    equal = {}
+
+    for field, value in zip(fields, values):
+        query |= Q(**dict(equal, **{ '%s__%s' % (field, lookup): value }))
+        equal[field] = value
+
+    if inclusive:
+        query |= Q(**equal)
+
+    return query
+
+
+class CursorPage(object):
+    """
+    Page of a queryset paginated with a cursor, ordered by fields (ascending).
+    object_list is a queryset too: the boundaries of the page are retrieved
+    first (using only the ordering fields), then the objects between them.
+    """
+    def __init__(self, queryset, cursor, page_size, fields):
+        position, reverse = decode_cursor(cursor, queryset.model, fields)
+
+        if reverse:
+            keys_queryset = queryset.order_by(*['-%s' % field for field in fields])
+        else:
+            keys_queryset = queryset.order_by(*fields)
+
+        if position is not None:
+            keys_queryset = keys_queryset.filter(keyset_filter(fields, position, 'lt' if reverse else 'gt'))
+
+        keys = list(keys_queryset.values_list(*fields)[:page_size + 1])
+        has_more = len(keys) > page_size
+        keys = keys[:page_size]
+
+        if reverse:
+            keys.reverse()
+
+        if keys:
+            self.object_list = queryset.filter(keyset_filter(fields, keys[0], 'gt', inclusive=True))\
+                                       .filter(keyset_filter(fields, keys[-1], 'lt', inclusive=True))\
+                                       .order_by(*fields)
+        else:
+            self.object_list = queryset.none()
+
+        # moving in one direction there are more objects in the other one, unless this is the first page
+        more_after = has_more if not reverse else position is not None
+        more_before = has_more if reverse else position is not None
+
+        self.next_cursor = encode_cursor(keys[-1]) if keys and more_after else None
+        self.previous_cursor = encode_cursor(keys[0], reverse=True) if keys and more_before else None
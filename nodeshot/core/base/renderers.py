@@ -0,0 +1,212 @@
+"""
+Compact binary renderers
+
+ * MessagePackRenderer (?format=msgpack): the same data of the JSON renderer encoded
+   with MessagePack (requires the msgpack-python package)
+ * GeobufRenderer (?format=geobuf): GeoJSON encoded with Geobuf (requires the geobuf package);
+   coordinates are rounded to 15 significant digits (the digits a double can always hold)
+   and encoded with the number of decimal digits of their shortest representation;
+   successful responses which are not GeoJSON or whose coordinates can't be encoded
+   exactly (eg: tiny values) get "406 Not Acceptable", errors are rendered in JSON
+
+Renderers are added to views by CompactRenderersMixin only if the packages are installed.
+"""
+import json
+from decimal import Decimal
+
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import status
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import geobuf
+except ImportError:  # pragma: no cover
+    geobuf = None
+
+
+__all__ = [
+    'MessagePackRenderer',
+    'GeobufRenderer',
+    'CompactRenderersMixin',
+    'coordinates_precision',
+]
+
+
+GEOJSON_TYPES = ('FeatureCollection', 'Feature', 'Point', 'MultiPoint', 'LineString',
+                 'MultiLineString', 'Polygon', 'MultiPolygon', 'GeometryCollection')
+# max number of decimal digits of coordinates encoded by geobuf
+MAX_PRECISION = 15
+# coordinates are rounded to the number of significant digits which doubles can always hold
+SIGNIFICANT_DIGITS = 15
+# coordinates are encoded as round(value * 10 ** precision); the product is computed with doubles
+# and is rounded to the right integer only if it's smaller than 2 ** 51 (the error of value
+# and the error of the product are both at most 2 ** -53 times the product)
+MAX_INTEGER = 2 ** 51
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        # types which MessagePack doesn't know (eg: dates) are converted like the JSON renderer does;
+        # byte strings are encoded as strings, as in JSON
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=False)
+
+
+def round_significant(value):
+    """ value rounded to SIGNIFICANT_DIGITS significant digits """
+    return float('%.*g' % (SIGNIFICANT_DIGITS, value))
+
+
+def decimal_digits(value):
+    """ number of decimal digits of the shortest representation of value """
+    string = repr(value)
+    if 'e' in string or 'E' in string:
+        return max(-Decimal(string).as_tuple().exponent, 0)
+    if '.' not in string:
+        return 0
+    digits = len(string) - string.index('.') - 1
+    # eg: 12.0
+    return 0 if string.endswith('.0') else digits
+
+
+def inspect_coordinates(data, stats):
+    """
+    updates stats, a list containing the max number of decimal digits, the number of dimensions
+    and the max absolute value of the coordinates, with the coordinates of a GeoJSON object;
+    float coordinates are rounded to SIGNIFICANT_DIGITS significant digits (in place)
+    """
+    if isinstance(data, dict):
+        if data.get('type') == 'FeatureCollection':
+            for feature in data.get('features') or []:
+                inspect_coordinates(feature, stats)
+        elif data.get('type') == 'Feature':
+            inspect_coordinates(data.get('geometry'), stats)
+        elif data.get('type') == 'GeometryCollection':
+            for geometry in data.get('geometries') or []:
+                inspect_coordinates(geometry, stats)
+        elif 'coordinates' in data:
+            inspect_coordinates(data['coordinates'], stats)
+    elif isinstance(data, (list, tuple)) and data:
+        # a position
+        if not isinstance(data[0], (list, tuple)):
+            stats[1] = max(stats[1], len(data))
+            for i, value in enumerate(data):
+                if isinstance(value, float):
+                    value = data[i] = round_significant(value)
+                    stats[0] = max(stats[0], decimal_digits(value))
+                if isinstance(value, (int, long, float)):
+                    stats[2] = max(stats[2], abs(value))
+        else:
+            for item in data:
+                inspect_coordinates(item, stats)
+    return stats
+
+
+def coordinates_precision(data):
+    """
+    rounds the coordinates of a GeoJSON object (decoded from JSON) to SIGNIFICANT_DIGITS
+    significant digits and returns the number of decimal digits and the number of dimensions
+    needed to encode them without losing anything, or None if that's not possible:
+    coordinates are encoded as the integers round(value * 10 ** precision), which are decoded
+    to the same values only if they are smaller than MAX_INTEGER
+    """
+    precision, dimensions, maximum = inspect_coordinates(data, [0, 2, 0])
+    if precision > MAX_PRECISION or maximum * 10 ** precision >= MAX_INTEGER:
+        return None
+    return precision, dimensions
+
+
+class GeobufEncoder(geobuf.Encoder if geobuf else object):
+    """ encodes null properties too (as JSON values, like the javascript encoder does) """
+
+    def encode_property(self, key, value, properties, values):
+        geobuf.Encoder.encode_property(self, key, value, properties, values)
+        if value is None:
+            values[len(values) - 1].json_value = 'null'.encode('utf-8')
+
+
+class GeobufRenderer(BaseRenderer):
+    media_type = 'application/x-geobuf'
+    format = 'geobuf'
+    charset = None
+    render_style = 'binary'
+
+    @staticmethod
+    def prepare(data):
+        """
+        returns a tuple containing the data to encode (the values of the JSON output
+        with rounded coordinates), the precision and the number of dimensions,
+        or None if data is not GeoJSON or its coordinates can't be encoded exactly
+        """
+        if not isinstance(data, dict) or data.get('type') not in GEOJSON_TYPES:
+            return None
+        # same values of the JSON output (eg: dates become strings)
+        data = json.loads(json.dumps(data, cls=JSONEncoder))
+        result = coordinates_precision(data)
+        if result is None:
+            return None
+        return (data,) + result
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        # prepared by CompactRenderersMixin.finalize_response
+        prepared = (renderer_context or {}).get('geobuf')
+        if prepared is None:
+            prepared = self.prepare(data)
+        if prepared is None:
+            raise ValueError('data cannot be encoded exactly in Geobuf')
+        data, precision, dimensions = prepared
+        return GeobufEncoder().encode(data, precision, dimensions)
+
+
+class CompactRenderersMixin(object):
+    """
+    Adds the MessagePack renderer and, if geobuf is True (views which return GeoJSON),
+    the Geobuf renderer to the renderers of a view; renderers whose package is not installed are skipped.
+
+    Geobuf is never replaced silently by JSON: errors are rendered in JSON (with the JSON content type)
+    and successful responses which can't be encoded exactly get "406 Not Acceptable".
+    """
+    geobuf = False
+
+    def get_renderers(self):
+        renderers = super(CompactRenderersMixin, self).get_renderers()
+        if msgpack is not None:
+            renderers.append(MessagePackRenderer())
+        if geobuf is not None and self.geobuf:
+            renderers.append(GeobufRenderer())
+        return renderers
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        prepared = None
+        if isinstance(getattr(request, 'accepted_renderer', None), GeobufRenderer) and \
+           isinstance(response, Response) and response.data is not None:
+            if status.is_success(response.status_code):
+                prepared = GeobufRenderer.prepare(response.data)
+                if prepared is None:
+                    response = Response({
+                        'detail': _('The coordinates of this response cannot be encoded exactly in Geobuf, '
+                                    'use a lower precision (precision=<n>) or JSON.')
+                    }, status=status.HTTP_406_NOT_ACCEPTABLE)
+            if prepared is None:
+                request.accepted_renderer = JSONRenderer()
+                request.accepted_media_type = JSONRenderer.media_type
+        response = super(CompactRenderersMixin, self).finalize_response(request, response, *args, **kwargs)
+        if prepared is not None:
+            response.renderer_context['geobuf'] = prepared
+        return response
@@ -1,8 +1,14 @@
+import simplejson as json
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import NoReverseMatch
+from django.db.models.query import QuerySet, prefetch_related_objects
 
-from rest_framework import serializers
-from rest_framework.fields import Field
+from rest_framework import serializers, pagination
+from rest_framework.fields import Field, get_component
 from rest_framework.reverse import reverse
+from rest_framework.templatetags.rest_framework import replace_query_param
+from rest_framework_gis.fields import GeometryField
 
 
 class ExtraFieldSerializerOptions(serializers.ModelSerializerOptions):
@@ -82,6 +88,25 @@ class DynamicRelationshipsMixin(object):
         'view_name': 'api_node_comments',
         'lookup_field': 'slug'
     })
+    
+    Relationships are resolved in batches: the first time a relationship is
+    needed its "prefetch" function is called once for all the objects which
+    are being serialized (eg: a page) and the results are stored in a cache
+    which lives in the serializer context (therefore it's shared by nested
+    serializers and lasts for the whole request), eg:
+    
+    >>> def prefetch_images(nodes, request):
+        images = dict([(node.pk, []) for node in nodes])
+        for image in Image.objects.filter(node__in=nodes).accessible_to(request.user):
+            images[image.node_id].append(image)
+        return images
+    >>> NodeDetailSerializer.add_relationship(
+        'images',
+        serializer=ImageRelationSerializer,
+        many=True,
+        queryset=lambda obj, request: obj.image_set.accessible_to(request.user),
+        prefetch=prefetch_images
+    )
     """
     _relationships = {}
     
@@ -89,7 +114,7 @@ class DynamicRelationshipsMixin(object):
     def add_relationship(_class, name,
                          view_name=None, lookup_field=None,
                          serializer=None, many=False, queryset=None,
-                         function=None):
+                         function=None, prefetch=None, prefetch_related=None):
         """ adds a relationship to serializer
         :param name: relationship name (dictionary key)
         :type name: str
@@ -101,33 +126,63 @@ class DynamicRelationshipsMixin(object):
         :type serializer: Serializer
         :param many: indicates if it's a list or a single element, defaults to False
         :type many: bool
-        :param queryset: queryset string representation to use for the serializer
-        :type queryset: QuerySet
+        :param queryset: queryset to use for the serializer, either a callable or its string representation
+        :type queryset: function(obj, request) or str
         :param function: function that returns the value to display (dict, list or str)
         :type function: function(obj, request)
+        :param prefetch: function that resolves the relationship for many objects at once,
+                         returns a dictionary which maps the pk of each object to the instance
+                         (or list of instances) to serialize or to the value to display;
+                         objects missing from the dictionary are resolved one by one
+        :type prefetch: function(objects, request)
+        :param prefetch_related: lookups to prefetch on the objects before resolving the
+                                 relationship, see QuerySet.prefetch_related
+        :type prefetch_related: list
         :returns: None
         """
         if view_name is not None and lookup_field is not None:
             _class._relationships[name] = {
                 'type': 'link',
                 'view_name': view_name,
-                'lookup_field': lookup_field
+                'lookup_field': lookup_field,
+                'prefetch': None,
+                'prefetch_related': prefetch_related or []
             }
         elif serializer is not None and queryset is not None:
             _class._relationships[name] = {
                 'type': 'serializer',
                 'serializer': serializer,
                 'many': many,
-                'queryset': queryset
+                'queryset': _class.compile_queryset(name, queryset),
+                'prefetch': prefetch,
+                'prefetch_related': prefetch_related or []
             }
         elif function is not None:
             _class._relationships[name] = {
                 'type': 'function',
-                'function': function
+                'function': function,
+                'prefetch': prefetch,
+                'prefetch_related': prefetch_related or []
             }
         else:
             raise ValueError('missing arguments, either pass view_name and lookup_field or serializer and queryset')
     
+    @staticmethod
+    def compile_queryset(name, queryset):
+        """
+        returns a callable which accepts obj and request;
+        string representations are compiled only once, at registration time
+        """
+        if callable(queryset):
+            return queryset
+        
+        code = compile(queryset, '<relationship %s>' % name, 'eval')
+        
+        def get_queryset(obj, request):
+            return eval(code, {}, { 'obj': obj, 'request': request })
+        
+        return get_queryset
+    
     def get_lookup_value(self, obj, string):
         if '.' in string:
             if '()' in string:
@@ -149,6 +204,55 @@ class DynamicRelationshipsMixin(object):
         else:
             return getattr(obj, string)
     
+    @property
+    def data(self):
+        """ remembers the objects which are being serialized in order to resolve relationships in batch """
+        if self._data is None and self.many and self.object is not None:
+            if not isinstance(self.object, QuerySet):
+                self.object = list(self.object)
+            # evaluates querysets only once, iterating again uses their result cache
+            self._relationship_objects = list(self.object)
+        return super(DynamicRelationshipsMixin, self).data
+    
+    def field_to_native(self, obj, field_name):
+        """ same as data, for serializers used as nested fields (eg: object_serializer of pagination serializers) """
+        if self.many and obj is not None and self.source != '*':
+            value = obj
+            try:
+                for component in (self.source or field_name).split('.'):
+                    if value is None:
+                        break
+                    value = get_component(value, component)
+            except ObjectDoesNotExist:
+                value = None
+            # related managers return a new queryset each time, they are resolved one by one
+            if isinstance(value, (QuerySet, list, tuple)):
+                self._relationship_objects = list(value)
+        return super(DynamicRelationshipsMixin, self).field_to_native(obj, field_name)
+    
+    def get_prefetched_relationship(self, name, obj):
+        """
+        returns a dictionary which maps the pk of the serialized objects to the
+        prefetched values of the relationship called name (prefetching them if needed)
+        """
+        options = self._relationships[name]
+        cache = self.context.setdefault('relationships_cache', {})
+        # pks of the objects which have already been prefetched and their values
+        done, values = cache.setdefault((obj.__class__, name), (set(), {}))
+        
+        if obj.pk not in done:
+            objects = getattr(self, '_relationship_objects', None) or []
+            # obj might not be part of the batch, eg: detail of a single object
+            if obj not in objects:
+                objects = [obj]
+            if options['prefetch_related']:
+                prefetch_related_objects(objects, options['prefetch_related'])
+            if options['prefetch'] is not None:
+                values.update(options['prefetch'](objects, self.context['request']))
+            done.update([item.pk for item in objects])
+        
+        return values
+    
     def get_relationships(self, obj):
         request = self.context['request']
         format = self.context['format']
@@ -156,6 +260,10 @@ class DynamicRelationshipsMixin(object):
         
         # loop over private _relationship attribute
         for key, options in self._relationships.iteritems():
+            if options['prefetch'] is not None or options['prefetch_related']:
+                prefetched = self.get_prefetched_relationship(key, obj)
+            else:
+                prefetched = {}
             # if relationship is a link
             if options['type'] == 'link':
                 # get lookup value
@@ -167,13 +275,19 @@ class DynamicRelationshipsMixin(object):
                                 format=format)
             # if relationship is a serializer
             elif options['type'] == 'serializer':
-                queryset = eval(options['queryset'])
+                if obj.pk in prefetched:
+                    queryset = prefetched[obj.pk]
+                else:
+                    queryset = options['queryset'](obj, request)
                 # get serializer representation
                 value = options['serializer'](instance=queryset,
                                               context=self.context,
                                               many=options['many']).data
             elif options['type'] == 'function':
-                value = options['function'](obj, request)
+                if obj.pk in prefetched:
+                    value = prefetched[obj.pk]
+                else:
+                    value = options['function'](obj, request)
             else:
                 raise ValueError('type %s not recognized' % options['type'])
             # populate new dictionary with value
@@ -270,3 +384,46 @@ class GeoJSONPaginationSerializer(GeoJSONBasePaginationSerializer):
         """ returns FeatureCollection type for geojson """
         
         return "FeatureCollection"
+
+
+class NextCursorField(serializers.Field):
+    """ link to the next page of a CursorPage """
+    cursor_attribute = 'next_cursor'
+
+    def to_native(self, value):
+        cursor = getattr(value, self.cursor_attribute)
+        if cursor is None:
+            return None
+        request = self.context.get('request')
+        url = request and request.build_absolute_uri() or ''
+        return replace_query_param(url, 'cursor', cursor)
+
+
+class PreviousCursorField(NextCursorField):
+    """ link to the previous page of a CursorPage """
+    cursor_attribute = 'previous_cursor'
+
+
+class CursorPaginationSerializer(pagination.BasePaginationSerializer):
+    """ pagination serializer of a CursorPage, objects are not counted """
+    next = NextCursorField(source='*')
+    previous = PreviousCursorField(source='*')
+
+
+class GeoJSONCursorPaginationSerializer(GeoJSONPaginationSerializer):
+    """ geoJSON pagination serializer of a CursorPage """
+    next = NextCursorField(source='*')
+    previous = PreviousCursorField(source='*')
+
+
+class PrecomputedGeometryField(GeometryField):
+    """
+    GeometryField which outputs the GeoJSON computed by the database
+    (eg: simplified, see nodeshot.core.base.geojson) if the object has it
+    in the "<field>_geojson" attribute
+    """
+    def field_to_native(self, obj, field_name):
+        geojson = getattr(obj, '%s_geojson' % (self.source or field_name), None)
+        if geojson is not None:
+            return json.loads(geojson)
+        return super(PrecomputedGeometryField, self).field_to_native(obj, field_name)
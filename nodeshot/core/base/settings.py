@@ -1,3 +1,5 @@
+import os
+
 from django.conf import settings
 
 ACCESS_LEVELS = getattr(settings, 'NODESHOT_ACCESS_LEVELS', {
@@ -8,3 +10,19 @@ ACCESS_LEVELS = getattr(settings, 'NODESHOT_ACCESS_LEVELS', {
 ACL_DEFAULT_VALUE = getattr(settings, 'NODESHOT_ACL_DEFAULT_VALUE', 'public')
 ACL_DEFAULT_EDITABLE  = getattr(settings, 'NODESHOT_ACL_DEFAULT_EDITABLE', True)
 DISCONNECTABLE_SIGNALS = getattr(settings, 'NODESHOT_DISCONNECTABLE_SIGNALS', [])
+GROUP_NAME_CACHE_TIMEOUT = getattr(settings, 'NODESHOT_GROUP_NAME_CACHE_TIMEOUT', 300)
+# cache alias which stores the versions of cached data (see nodeshot.core.base.cache.get_version)
+VERSIONS_CACHE = getattr(settings, 'NODESHOT_VERSIONS_CACHE',
+                         'versions' if 'versions' in getattr(settings, 'CACHES', {}) else 'default')
+# precomputed snapshots of expensive responses (see nodeshot.core.base.snapshots)
+SNAPSHOTS_ENABLED = getattr(settings, 'NODESHOT_SNAPSHOTS_ENABLED', False)
+SNAPSHOTS_ROOT = getattr(settings, 'NODESHOT_SNAPSHOTS_ROOT', os.path.join(getattr(settings, 'SITE_ROOT', ''), 'snapshots'))
+# how snapshots are served: "memory", "x-accel-redirect" (nginx) or "x-sendfile" (apache, lighttpd)
+SNAPSHOTS_SERVE = getattr(settings, 'NODESHOT_SNAPSHOTS_SERVE', 'memory')
+SNAPSHOTS_ACCEL_URL = getattr(settings, 'NODESHOT_SNAPSHOTS_ACCEL_URL', '/snapshots/')
+SNAPSHOTS_DEBOUNCE = getattr(settings, 'NODESHOT_SNAPSHOTS_DEBOUNCE', 10)
+SNAPSHOTS_BROTLI = getattr(settings, 'NODESHOT_SNAPSHOTS_BROTLI', True)
+# simplification of geometries (see nodeshot.core.base.geojson)
+GEOJSON_SIMPLIFY_PIXELS = getattr(settings, 'NODESHOT_GEOJSON_SIMPLIFY_PIXELS', 1)
+GEOJSON_SIMPLIFY_MAX_ZOOM = getattr(settings, 'NODESHOT_GEOJSON_SIMPLIFY_MAX_ZOOM', 18)
+GEOJSON_SIMPLIFY_CACHE_TIMEOUT = getattr(settings, 'NODESHOT_GEOJSON_SIMPLIFY_CACHE_TIMEOUT', 86400)
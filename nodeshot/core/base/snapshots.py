@@ -0,0 +1,300 @@
+"""
+Precomputed and precompressed JSON snapshots of expensive responses
+
+Applications register the responses which can be snapshotted (eg: essential_data of the UI,
+the GeoJSON of the nodes of each layer) with register_snapshot; snapshots are written on disk
+(gzip and, if the brotli module is installed, brotli) once for each group of users
+(see nodeshot.core.base.cache.get_group_name), so that requests can be answered
+without querying the database nor serializing anything.
+
+When data changes, schedule_snapshots marks the affected snapshots as dirty (with marker
+files next to the snapshots) and schedules a single celery task which rebuilds them after
+NODESHOT_SNAPSHOTS_DEBOUNCE seconds, so that many changes in a short time cause only one rebuild.
+"""
+import os
+import gzip
+import tempfile
+import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, HttpResponseNotModified
+from django.test.client import RequestFactory
+from django.utils.http import parse_etags
+
+from .cache import get_group_name
+from .choices import ACCESS_LEVELS
+from .settings import (SNAPSHOTS_ENABLED, SNAPSHOTS_ROOT, SNAPSHOTS_SERVE,
+                       SNAPSHOTS_ACCEL_URL, SNAPSHOTS_DEBOUNCE, SNAPSHOTS_BROTLI)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+__all__ = [
+    'snapshots_enabled',
+    'get_snapshot_names',
+    'register_snapshot',
+    'snapshot_groups',
+    'groups_for_access_level',
+    'build_snapshot',
+    'warm_snapshots',
+    'delete_snapshots',
+    'schedule_snapshots',
+    'rebuild_dirty_snapshots',
+    'snapshot_response',
+]
+
+
+DIRTY_EXTENSION = '.dirty'
+# marks of the snapshots which are being rebuilt
+REBUILDING_EXTENSION = '.rebuilding'
+SCHEDULED_CACHE_KEY = 'snapshots_scheduled'
+
+# { name: (builder, keys) }
+_registry = {}
+# in-memory copy of the snapshots served by this process: { path: (version, content) }
+_blobs = {}
+
+
+def snapshots_enabled():
+    return SNAPSHOTS_ENABLED
+
+
+def get_snapshot_names():
+    return sorted(_registry.keys())
+
+
+def register_snapshot(name, builder, keys=None):
+    """
+    :name: name of the snapshot
+    :builder: function(request, key) which returns (or yields) the JSON content
+    :keys: optional function which returns the list of keys of the snapshot
+           (eg: the ids of layers), if omitted the snapshot has a single key (None)
+    """
+    _registry[name] = (builder, keys)
+
+
+def snapshot_groups():
+    """ names of the groups of users which see different data """
+    groups = sorted(ACCESS_LEVELS.items(), key=lambda item: item[1])
+    return [name for name, level in groups] + ['superuser']
+
+
+def groups_for_access_level(access_level):
+    """ names of the groups which can see objects with the specified access level """
+    return [name for name in snapshot_groups() if name == 'superuser' or ACCESS_LEVELS[name] >= access_level]
+
+
+def get_snapshot_request(group_name):
+    """ a request of a user of the specified group to the main site (see SITE_URL) """
+    url = urlparse.urlparse(settings.SITE_URL)
+    request = RequestFactory().get('/', HTTP_HOST=url.netloc, **{ 'wsgi.url_scheme': url.scheme or 'http' })
+    if group_name == 'public':
+        request.user = AnonymousUser()
+    else:
+        request.user = get_user_model()(username='snapshot', is_superuser=group_name == 'superuser')
+        # see get_group_name
+        request.user._group_name = group_name
+    return request
+
+
+def get_snapshot_path(name, key, group_name, encoding='gzip'):
+    extension = 'br' if encoding == 'br' else 'gz'
+    parts = [name] if key is None else [name, str(key)]
+    return os.path.join(SNAPSHOTS_ROOT, *(parts + ['%s.json.%s' % (group_name, extension)]))
+
+
+def write_file(path, content):
+    """ writes a new file and replaces path with it, so that readers never see partial files """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(descriptor, 'wb') as f:
+        f.write(content)
+    # readable by the web server (see NODESHOT_SNAPSHOTS_SERVE)
+    os.chmod(temp_path, 0644)
+    os.rename(temp_path, path)
+
+
+def build_snapshot(name, key=None, group_names=None):
+    """ (re)builds the specified snapshot for the specified groups (defaults to all groups) """
+    builder = _registry[name][0]
+    for group_name in group_names or snapshot_groups():
+        chunks = builder(get_snapshot_request(group_name), key)
+        if isinstance(chunks, basestring):
+            chunks = [chunks]
+        content = ''.join([chunk.encode('utf-8') if isinstance(chunk, unicode) else chunk for chunk in chunks])
+
+        gzipped = tempfile.SpooledTemporaryFile()
+        with gzip.GzipFile(fileobj=gzipped, mode='wb', compresslevel=9) as f:
+            f.write(content)
+        gzipped.seek(0)
+        write_file(get_snapshot_path(name, key, group_name), gzipped.read())
+
+        if brotli is not None and SNAPSHOTS_BROTLI:
+            write_file(get_snapshot_path(name, key, group_name, 'br'), brotli.compress(content))
+
+
+def warm_snapshots(names=None):
+    """ builds all the snapshots (eg: after deploys), returns the number of snapshots built """
+    count = 0
+    for name in names or _registry.keys():
+        keys = _registry[name][1]
+        for key in (keys() if keys else [None]):
+            build_snapshot(name, key)
+            count += 1
+    return count
+
+
+def delete_snapshots(name, key=None):
+    """ deletes the files of the specified snapshot (eg: when a layer is deleted) """
+    for group_name in snapshot_groups():
+        for encoding in ('gzip', 'br'):
+            path = get_snapshot_path(name, key, group_name, encoding)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def get_dirty_path(name, key, group_name):
+    parts = [name] if key is None else [name, str(key)]
+    return os.path.join(SNAPSHOTS_ROOT, *(parts + [group_name + DIRTY_EXTENSION]))
+
+
+def schedule_snapshots(name, key=None, group_names=None):
+    """
+    marks the specified snapshot as dirty for the specified groups (defaults to all groups)
+    and schedules a rebuild in NODESHOT_SNAPSHOTS_DEBOUNCE seconds unless it's already scheduled;
+    marks are empty files, which are created atomically and survive cache flushes and restarts
+    """
+    if not snapshots_enabled():
+        return
+    for group_name in group_names or snapshot_groups():
+        path = get_dirty_path(name, key, group_name)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            # created by another process in the meantime
+            except OSError:
+                pass
+        open(path, 'a').close()
+
+    if cache.add(SCHEDULED_CACHE_KEY, True, SNAPSHOTS_DEBOUNCE + 60):
+        from .tasks import rebuild_snapshots
+        rebuild_snapshots.apply_async(countdown=SNAPSHOTS_DEBOUNCE)
+
+
+def get_dirty_marks():
+    """
+    yields (path, name, key, group_name) for each mark of dirty snapshots,
+    including the marks left by rebuilds which have been interrupted
+    """
+    for directory, dirnames, filenames in os.walk(SNAPSHOTS_ROOT):
+        parts = os.path.relpath(directory, SNAPSHOTS_ROOT).split(os.sep)
+        if parts == ['.']:
+            continue
+        name, key = parts[0], parts[1] if len(parts) > 1 else None
+        for filename in filenames:
+            group_name, extension = os.path.splitext(filename)
+            if extension in (DIRTY_EXTENSION, REBUILDING_EXTENSION):
+                yield os.path.join(directory, filename), name, key, group_name
+
+
+def rebuild_dirty_snapshots():
+    """
+    rebuilds the snapshots marked as dirty by schedule_snapshots;
+    marks are renamed before the rebuild, so that changes which happen during the rebuild
+    mark the snapshot as dirty again, and deleted only after the rebuild succeeded
+    """
+    cache.delete(SCHEDULED_CACHE_KEY)
+    # { (name, key): { group_name: path of the mark } }
+    dirty = {}
+    for path, name, key, group_name in get_dirty_marks():
+        if path.endswith(DIRTY_EXTENSION):
+            claimed = path[:-len(DIRTY_EXTENSION)] + REBUILDING_EXTENSION
+            try:
+                os.rename(path, claimed)
+            # claimed by another rebuild
+            except OSError:
+                continue
+            path = claimed
+        dirty.setdefault((name, key), {})[group_name] = path
+
+    for (name, key), marks in dirty.items():
+        if name in _registry:
+            build_snapshot(name, key, marks.keys())
+        for path in marks.values():
+            if os.path.exists(path):
+                os.remove(path)
+    return len(dirty)
+
+
+def get_version(path):
+    """ changes every time the file is rebuilt (files are replaced, hence the inode changes too) """
+    stat = os.stat(path)
+    return '%s-%s-%s' % (stat.st_ino, int(stat.st_mtime * 1000), stat.st_size)
+
+
+def read_snapshot(path, version):
+    """ returns the content of a snapshot file, kept in memory until the file changes """
+    blob = _blobs.get(path)
+    if blob is None or blob[0] != version:
+        with open(path, 'rb') as f:
+            blob = (version, f.read())
+        _blobs[path] = blob
+    return blob[1]
+
+
+def snapshot_response(request, name, key=None):
+    """
+    returns the response containing the snapshot which the user of request can see
+    (building it if needed) or None if snapshots are disabled
+    """
+    if not snapshots_enabled():
+        return None
+
+    group_name = get_group_name(request.user)
+    # custom groups which are not access levels
+    if group_name not in snapshot_groups():
+        return None
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    path = get_snapshot_path(name, key, group_name)
+    if not os.path.exists(path):
+        build_snapshot(name, key, [group_name])
+
+    encoding = 'gzip'
+    brotli_path = get_snapshot_path(name, key, group_name, 'br')
+    if 'br' in accept_encoding and os.path.exists(brotli_path):
+        encoding, path = 'br', brotli_path
+
+    version = get_version(path)
+    etag = '"%s-%s"' % (version, encoding)
+    if etag.strip('"') in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return HttpResponseNotModified()
+
+    # clients which don't support compression (rare)
+    if encoding == 'gzip' and 'gzip' not in accept_encoding:
+        with gzip.open(path, 'rb') as f:
+            response = HttpResponse(f.read(), content_type='application/json')
+    elif SNAPSHOTS_SERVE == 'x-accel-redirect':
+        response = HttpResponse(content_type='application/json')
+        response['X-Accel-Redirect'] = SNAPSHOTS_ACCEL_URL + os.path.relpath(path, SNAPSHOTS_ROOT)
+        response['Content-Encoding'] = encoding
+    elif SNAPSHOTS_SERVE == 'x-sendfile':
+        response = HttpResponse(content_type='application/json')
+        response['X-Sendfile'] = path
+        response['Content-Encoding'] = encoding
+    else:
+        response = HttpResponse(read_snapshot(path, version), content_type='application/json')
+        response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    # content depends on the group of the user
+    response['Vary'] = 'Accept-Encoding, Cookie'
+    return response
@@ -0,0 +1,79 @@
+"""
+utilities for streaming large collections of objects
+"""
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+__all__ = [
+    'CHUNK_SIZE',
+    'queryset_chunks',
+    'queryset_iterator',
+    'stream_json',
+    'stream_feature_collection',
+]
+
+
+CHUNK_SIZE = 1000
+
+
+def queryset_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields lists of at most chunk_size objects of queryset, ordered by primary key.
+    Works with values() querysets too, as long as they include the "id" column.
+
+    Each chunk is retrieved with a separate query filtered on the last primary key seen,
+    therefore only one chunk is held in memory at any given time
+    (QuerySet.iterator() would still fetch all the rows in the database driver).
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+
+    while True:
+        if last_pk is None:
+            chunk = list(queryset[:chunk_size])
+        else:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+
+        if not chunk:
+            break
+
+        yield chunk
+
+        if len(chunk) < chunk_size:
+            break
+
+        last = chunk[-1]
+        last_pk = last['id'] if isinstance(last, dict) else last.pk
+
+
+def queryset_iterator(queryset, chunk_size=CHUNK_SIZE):
+    """ iterates over queryset keeping at most chunk_size objects in memory """
+    for chunk in queryset_chunks(queryset, chunk_size):
+        for obj in chunk:
+            yield obj
+
+
+def stream_json(data):
+    """ JSON representation of data, supports the same types of the JSON renderer """
+    return json.dumps(data, cls=JSONEncoder)
+
+
+def stream_feature_collection(queryset, serializer, chunk_size=CHUNK_SIZE):
+    """
+    Yields the GeoJSON FeatureCollection of queryset one chunk at a time
+
+    :param queryset: queryset of objects to serialize
+    :param serializer: serializer which turns each object in a GeoJSON Feature through its to_native method
+                       (eg: GeoFeatureModelSerializer)
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+
+    for chunk in queryset_chunks(queryset, chunk_size):
+        features = [stream_json(serializer.to_native(obj)) for obj in chunk]
+        yield separator + ', '.join(features)
+        separator = ', '
+
+    yield ']}'
@@ -0,0 +1,8 @@
+from celery import task
+
+
+@task
+def rebuild_snapshots():
+    """ rebuilds the snapshots which have been marked as dirty """
+    from .snapshots import rebuild_dirty_snapshots
+    return rebuild_dirty_snapshots()
@@ -1,6 +1,7 @@
 from django.test.client import FakePayload, MULTIPART_CONTENT
 from django.test.client import Client as BaseClient
 from django.test import TestCase
+from django.db import connection
 from django.conf import settings
 
 from urlparse import urlparse, urlsplit
@@ -42,4 +43,20 @@ class BaseTestCase(TestCase):
     Test case with a client that can do patch requests
     """
     
-    client_class = Client
\ No newline at end of file
+    client_class = Client
+
+
+def query_plan(queryset, seqscan=False):
+    """
+    Returns the query plan of a queryset as a string.
+    Sequential scans are disabled by default because the planner
+    would prefer them anyway on the small tables used in tests.
+    """
+    sql, params = queryset.query.sql_with_params()
+    cursor = connection.cursor()
+    if not seqscan:
+        cursor.execute('SET enable_seqscan = off')
+    cursor.execute('EXPLAIN %s' % sql, params)
+    plan = '\n'.join(row[0] for row in cursor.fetchall())
+    cursor.execute('SET enable_seqscan = on')
+    return plan
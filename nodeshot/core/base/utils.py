@@ -1,3 +1,4 @@
+import threading
 from datetime import datetime, timedelta
 
 from django.utils.translation import ugettext_lazy as _
@@ -14,6 +15,7 @@ __all__ = [
     'check_dependencies',
     'choicify',
     'get_key_by_value',
+    'bulk_update',
     'now',
     'now_after',
     'after',
@@ -77,13 +79,24 @@ def get_key_by_value(dictionary, search_value):
             return ugettext(key)
 
 
+# number of pause_disconnectable_signals calls which have not been resumed yet
+_paused_signals = 0
+_paused_signals_lock = threading.Lock()
+
+
 def pause_disconnectable_signals():
     """
     Disconnects non critical signals like notifications, websockets and stuff like that.
-    Use when managing large chunks of nodes
+    Use when managing large chunks of nodes.
+    Calls might be nested or concurrent (eg: layers synchronized by different threads):
+    signals are disconnected by the first call and reconnected by the last resume_disconnectable_signals call
     """
-    for signal in DISCONNECTABLE_SIGNALS:
-        signal['disconnect']()
+    global _paused_signals
+    with _paused_signals_lock:
+        _paused_signals += 1
+        if _paused_signals == 1:
+            for signal in DISCONNECTABLE_SIGNALS:
+                signal['disconnect']()
 
 
 def resume_disconnectable_signals():
@@ -91,8 +104,58 @@ def resume_disconnectable_signals():
     Reconnects non critical signals like notifications, websockets and stuff like that.
     Use when managing large chunks of nodes
     """
-    for signal in DISCONNECTABLE_SIGNALS:
-        signal['reconnect']()
+    global _paused_signals
+    with _paused_signals_lock:
+        _paused_signals = max(_paused_signals - 1, 0)
+        if _paused_signals == 0:
+            for signal in DISCONNECTABLE_SIGNALS:
+                signal['reconnect']()
+
+
+def bulk_update(objects, fields, batch_size=500):
+    """
+    Updates the specified fields of many objects of the same model
+    with one "UPDATE ... FROM (VALUES ...)" query for each batch.
+    The save method is not called, therefore no signal is sent
+    and auto_now fields must be set explicitly.
+    
+    :param objects: list of model instances which have already been saved
+    :param fields: list of the names of the fields to update
+    :param batch_size: max number of objects updated by each query
+    """
+    from django.db import connection
+    
+    if not objects:
+        return
+    
+    opts = objects[0]._meta
+    qn = connection.ops.quote_name
+    columns = [opts.pk] + [opts.get_field(name) for name in fields]
+    
+    set_sql = ', '.join(['%s = "v".%s' % (qn(field.column), qn(field.column)) for field in columns[1:]])
+    column_names = ', '.join([qn(field.column) for field in columns])
+    cursor = connection.cursor()
+    
+    for start in range(0, len(objects), batch_size):
+        rows = []
+        params = []
+        for obj in objects[start:start + batch_size]:
+            row = []
+            for field in columns:
+                value = getattr(obj, field.attname)
+                # geometry fields need a special placeholder
+                if hasattr(field, 'get_placeholder'):
+                    placeholder = field.get_placeholder(value, connection)
+                else:
+                    placeholder = '%s'
+                # explicit casts, otherwise the types of NULL values can't be determined
+                row.append('CAST(%s AS %s)' % (placeholder, field.db_type(connection)))
+                params.append(field.get_db_prep_save(value, connection=connection))
+            rows.append('(%s)' % ', '.join(row))
+        cursor.execute('UPDATE %s SET %s FROM (VALUES %s) AS "v" (%s) WHERE %s.%s = "v".%s' % (
+            qn(opts.db_table), set_sql, ', '.join(rows), column_names,
+            qn(opts.db_table), qn(opts.pk.column), qn(opts.pk.column)
+        ), params)
 
 
 # time shortcuts
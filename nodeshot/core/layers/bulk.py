@@ -0,0 +1,257 @@
+"""
+Bulk import of the nodes of a layer from a GeoJSON FeatureCollection
+
+Features are validated all together before anything is written:
+the existing nodes and the names already taken are retrieved with
+one query each instead of once for each feature (statuses come from
+the status registry).
+Then new nodes are inserted with bulk_create, existing nodes (matched by slug)
+are updated in batches and the nodes_bulk_saved signal is sent once
+instead of sending post_save for each node (node_status_changed is still
+sent for each updated node whose status has changed, like Node.save does).
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.contrib.gis.geos import GEOSGeometry, GEOSException
+from django.contrib.gis.geos.collections import GeometryCollection
+from django.db import transaction
+from django.template.defaultfilters import slugify
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import ParseError
+
+from nodeshot.core.base.utils import bulk_update, now
+from nodeshot.core.nodes.models import Node, NodeDeletion, Status
+from nodeshot.core.nodes.registry import get_status_registry, get_status
+from nodeshot.core.nodes.signals import node_status_changed, nodes_bulk_saved
+from nodeshot.core.nodes.settings import REVERSION_ENABLED
+
+from .settings import BULK_MAX_NODES, BULK_BATCH_SIZE
+
+if REVERSION_ENABLED:
+    import reversion
+
+
+__all__ = ['BulkNodeImport']
+
+
+class BulkNodeImport(object):
+    """
+    Creates or updates the nodes of layer described by the features of a FeatureCollection.
+
+    >>> importer = BulkNodeImport(layer, user)
+    >>> report = importer.load(feature_collection)
+    >>> if importer.is_valid:
+    ...     importer.save()
+    """
+    # properties of features which can be written
+    properties = ('name', 'slug', 'status', 'elev', 'address', 'description', 'access_level', 'is_published', 'data')
+    # properties which can be written only by admins and mantainers of the layer
+    admin_properties = ('status', 'access_level', 'is_published')
+    # fields written when a node is updated
+    update_fields = ('name', 'status', 'geometry', 'elev', 'address', 'description',
+                     'access_level', 'is_published', 'data', 'updated')
+
+    def __init__(self, layer, user):
+        self.layer = layer
+        self.user = user
+        self.report = []
+        self.created = []
+        self.updated = []
+        self._is_admin = None
+
+    @property
+    def is_admin(self):
+        """ True if user is a superuser, can change any node or is a mantainer of the layer """
+        if self._is_admin is None:
+            self._is_admin = self.user.is_superuser or self.user.has_perm('nodes.change_node') or \
+                             self.layer.mantainers.filter(pk=self.user.pk).exists()
+        return self._is_admin
+
+    @property
+    def is_valid(self):
+        return not [item for item in self.report if item['result'] == 'error']
+
+    def get_features(self, data):
+        """ ensure data is a FeatureCollection and return its features """
+        if not isinstance(data, dict) or data.get('type') != 'FeatureCollection' or not isinstance(data.get('features'), list):
+            raise ParseError(_('a GeoJSON FeatureCollection is expected'))
+        features = data['features']
+        if len(features) > BULK_MAX_NODES:
+            raise ParseError(_('too many features, the maximum is %d') % BULK_MAX_NODES)
+        return features
+
+    def parse_feature(self, feature):
+        """ returns the properties and the geometry of a feature """
+        if not isinstance(feature, dict) or not isinstance(feature.get('properties') or {}, dict):
+            raise ValidationError({ 'non_field_errors': [_('invalid feature')] })
+        properties = feature.get('properties') or {}
+        try:
+            geometry = GEOSGeometry(json.dumps(feature['geometry']))
+        except (KeyError, TypeError, ValueError, GEOSException):
+            raise ValidationError({ 'geometry': [_('invalid geometry')] })
+        # same as Node.save: a geometry collection of just 1 item becomes that item
+        if isinstance(geometry, GeometryCollection) and 0 < len(geometry) < 2:
+            geometry = geometry[0]
+        return properties, geometry
+
+    def load(self, data):
+        """
+        validates all the features of data and prepares the nodes to create and update;
+        returns a report (a list containing the result of each feature)
+        """
+        features = self.get_features(data)
+        parsed = []
+
+        for feature in features:
+            try:
+                parsed.append(self.parse_feature(feature))
+            except ValidationError as e:
+                parsed.append(e)
+
+        # the same as Node.save does for each node
+        slugs = [slugify(item[0].get('slug') or item[0].get('name') or '') if isinstance(item, tuple) else None
+                 for item in parsed]
+        names = [item[0].get('name') for item in parsed if isinstance(item, tuple)]
+
+        # one query for each kind of related data
+        existing = dict([(node.slug, node) for node in Node.objects.filter(slug__in=[slug for slug in slugs if slug])])
+        taken_names = dict(Node.objects.filter(name__in=names).values_list('name', 'slug'))
+        statuses = get_status_registry()
+        seen_slugs = set()
+        seen_names = set()
+        valid = []
+
+        for index, (item, slug) in enumerate(zip(parsed, slugs)):
+            result = { 'index': index, 'slug': slug }
+            self.report.append(result)
+
+            try:
+                if isinstance(item, ValidationError):
+                    raise item
+                properties, geometry = item
+                if not slug:
+                    raise ValidationError({ 'name': [_('This field is required.')] })
+                if slug in seen_slugs:
+                    raise ValidationError({ 'slug': [_('duplicated slug')] })
+                seen_slugs.add(slug)
+                node = self.get_node(existing.get(slug), slug, properties, geometry, statuses)
+
+                if node.name in seen_names or taken_names.get(node.name, slug) != slug:
+                    raise ValidationError({ 'name': [_('Node with this name already exists.')] })
+                seen_names.add(node.name)
+
+                # field validation (uniqueness has been checked above)
+                node.clean_fields()
+            except ValidationError as e:
+                self.set_error(result, e)
+                continue
+
+            valid.append((result, node))
+
+        # extensible validation of all the nodes at once (same as Node.clean)
+        errors = Node.validate_batch([node for result, node in valid])
+
+        for (result, node), error in zip(valid, errors):
+            if error is not None:
+                self.set_error(result, error)
+            elif node.pk:
+                result['result'] = 'updated'
+                self.updated.append(node)
+            else:
+                result['result'] = 'created'
+                self.created.append(node)
+
+        return self.report
+
+    def set_error(self, result, e):
+        result['result'] = 'error'
+        result['errors'] = e.message_dict if hasattr(e, 'error_dict') else { 'non_field_errors': e.messages }
+
+    def get_node(self, node, slug, properties, geometry, statuses):
+        """ returns the node to create or update, with the values of properties """
+        unknown = set(properties.keys()) - set(self.properties)
+        if unknown:
+            raise ValidationError(dict([(key, [_('unknown property')]) for key in unknown]))
+        forbidden = set(properties.keys()) & set(self.admin_properties)
+        if forbidden and not self.is_admin:
+            raise ValidationError(dict([(key, [_('you are not allowed to set this property')]) for key in forbidden]))
+
+        if node is None:
+            node = Node(layer=self.layer, user_id=self.user.id, slug=slug)
+        else:
+            if node.layer_id != self.layer.id:
+                raise ValidationError({ 'slug': [_('a node with this slug exists in another layer')] })
+            if not self.user.is_superuser and node.user_id != self.user.id:
+                raise ValidationError({ 'slug': [_('you are not allowed to change this node')] })
+            node.layer = self.layer
+            # remember the previous location, like the pre_save receiver of the layers app does
+            node._previous_location = (node.layer_id, node.geometry)
+
+        for key, value in properties.items():
+            if key == 'slug':
+                continue
+            if key == 'status':
+                status = statuses.get_by_slug(value)
+                if status is None:
+                    raise ValidationError({ 'status': [_('unknown status')] })
+                node.status = status
+            else:
+                setattr(node, key, value)
+
+        node.geometry = geometry
+
+        if node.status_id is None and statuses.default is not None:
+            node.status = statuses.default
+
+        return node
+
+    def save(self):
+        """
+        writes all the nodes in a single transaction and sends the nodes_bulk_saved signal
+        (and node_status_changed for each updated node whose status has changed);
+        django-reversion records a single revision containing all the nodes
+        """
+        if not self.is_valid:
+            raise ValueError('cannot save invalid nodes')
+
+        with transaction.atomic():
+            timestamp = now()
+            for node in self.created:
+                node.added = node.updated = timestamp
+            for node in self.updated:
+                node.updated = timestamp
+
+            Node.objects.bulk_create(self.created, batch_size=BULK_BATCH_SIZE)
+            bulk_update(self.updated, self.update_fields, batch_size=BULK_BATCH_SIZE)
+            # pre_save is not sent: tombstones of nodes whose access level has been raised
+            NodeDeletion.log_visibility_changes(self.updated, timestamp)
+
+            # bulk_create doesn't set primary keys
+            ids = dict(Node.objects.filter(slug__in=[node.slug for node in self.created]).values_list('slug', 'id'))
+            for node in self.created:
+                node.id = ids[node.slug]
+                node._current_status = node.status_id
+
+            if REVERSION_ENABLED and reversion.is_registered(Node):
+                reversion.default_revision_manager.save_revision(
+                    self.created + self.updated,
+                    user=self.user,
+                    comment='imported through the RESTful API'
+                )
+
+        # same as Node.save
+        for node in self.updated:
+            if node._current_status and node.status_id != node._current_status:
+                node_status_changed.send(
+                    sender=Node,
+                    instance=node,
+                    old_status=get_status(node._current_status) or Status.objects.get(pk=node._current_status),
+                    new_status=node.status
+                )
+            node._current_status = node.status_id
+            node._current_visibility = (node.layer_id, node.access_level)
+
+        nodes_bulk_saved.send(sender=Node, created=self.created, updated=self.updated)
+        return self.report
@@ -0,0 +1,133 @@
+"""
+Process-local spatial index of the areas of layers
+
+The areas of all the layers are kept in memory as prepared geometries
+indexed by an STR packed R-tree, so that point in layer lookups
+(Node.intersecting_layers, containment validation) don't need any DB query.
+
+The index is built lazily; it is rebuilt when a layer changes (the version
+stored in NODESHOT_VERSIONS_CACHE changes, which invalidates the index of every process)
+and anyway after NODESHOT_LAYERS_AREA_INDEX_TIMEOUT seconds.
+"""
+import math
+from time import time
+
+from nodeshot.core.base.cache import get_version, new_version
+
+from .settings import AREA_INDEX_TIMEOUT
+
+
+__all__ = [
+    'STRtree',
+    'LayerAreaIndex',
+    'get_layer_index',
+    'invalidate_layer_index',
+]
+
+
+VERSION_CACHE_KEY = 'layers_area_index_version'
+
+
+class STRtree(object):
+    """
+    Static R-tree packed with the Sort-Tile-Recursive algorithm.
+    Items are (extent, value) tuples, extent being (xmin, ymin, xmax, ymax).
+    """
+    node_capacity = 10
+
+    def __init__(self, items):
+        # a node is a tuple: (extent, children, value); leaves have no children
+        nodes = [(tuple(extent), None, (position, value)) for position, (extent, value) in enumerate(items)]
+        while len(nodes) > self.node_capacity:
+            nodes = self._pack(nodes)
+        self.root = (self._union(nodes), nodes, None) if nodes else None
+
+    def _union(self, nodes):
+        return (
+            min([node[0][0] for node in nodes]),
+            min([node[0][1] for node in nodes]),
+            max([node[0][2] for node in nodes]),
+            max([node[0][3] for node in nodes])
+        )
+
+    def _pack(self, nodes):
+        """ groups nodes in parent nodes: vertical slices sorted by x, then runs sorted by y """
+        capacity = self.node_capacity
+        slice_size = int(math.ceil(math.sqrt(math.ceil(len(nodes) / float(capacity))))) * capacity
+        nodes = sorted(nodes, key=lambda node: node[0][0] + node[0][2])
+        parents = []
+        for i in range(0, len(nodes), slice_size):
+            vertical_slice = sorted(nodes[i:i + slice_size], key=lambda node: node[0][1] + node[0][3])
+            for j in range(0, len(vertical_slice), capacity):
+                children = vertical_slice[j:j + capacity]
+                parents.append((self._union(children), children, None))
+        return parents
+
+    def query(self, x, y):
+        """ returns the values whose extent contains the point x, y (in insertion order) """
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            extent, children, value = stack.pop()
+            if not (extent[0] <= x <= extent[2] and extent[1] <= y <= extent[3]):
+                continue
+            if children is None:
+                results.append(value)
+            else:
+                stack.extend(children)
+        return [value for position, value in sorted(results)]
+
+
+class LayerAreaIndex(object):
+    """ prepared areas of layers indexed by an STRtree """
+
+    def __init__(self, layers):
+        self.layers = {}
+        self.prepared_areas = {}
+        items = []
+        for layer in layers:
+            self.layers[layer.pk] = layer
+            if layer.area is None:
+                continue
+            self.prepared_areas[layer.pk] = layer.area.prepared
+            items.append((layer.area.extent, layer))
+        self.tree = STRtree(items)
+        self.created = time()
+
+    def get_layer(self, layer_id):
+        return self.layers.get(layer_id)
+
+    def contains(self, layer_id, geometry):
+        """ returns True if the area of the specified layer contains geometry """
+        prepared_area = self.prepared_areas.get(layer_id)
+        return prepared_area is not None and prepared_area.contains(geometry)
+
+    def layers_containing(self, point, published=None):
+        """ returns the layers whose area contains point, optionally filtered by is_published """
+        return [
+            layer for layer in self.tree.query(point.x, point.y)
+            if (published is None or layer.is_published == published) and self.contains(layer.pk, point)
+        ]
+
+
+_index = None
+_index_version = None
+
+
+def get_layer_index():
+    """ returns the layer area index of the current process, (re)building it if necessary """
+    global _index, _index_version
+    version = get_version(VERSION_CACHE_KEY)
+    index = _index
+    if index is None or version != _index_version or time() - index.created > AREA_INDEX_TIMEOUT:
+        from .models import Layer
+        index = LayerAreaIndex(Layer.objects.all())
+        _index, _index_version = index, version
+    return index
+
+
+def invalidate_layer_index():
+    """ drops the index of the current process and signals the other processes to rebuild theirs """
+    global _index
+    _index = None
+    new_version(VERSION_CACHE_KEY)
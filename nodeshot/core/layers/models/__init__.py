@@ -18,5 +18,112 @@ from nodeshot.core.nodes.serializers import ExtensibleNodeSerializer
 ExtensibleNodeSerializer.add_relationship(**{
     'name': 'layer',
     'view_name': 'api_layer_detail',
-    'lookup_field': 'layer.slug'
+    'lookup_field': 'layer.slug',
+    'prefetch_related': ['layer']
 })
+
+
+# ------ Signals ------ #
+
+from django.dispatch import receiver
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.clusters import invalidate_clusters
+from nodeshot.core.nodes.signals import nodes_bulk_saved
+
+from ..signals import layer_is_published_changed
+from ..tiles import invalidate_tiles, invalidate_layer_tiles
+from ..index import invalidate_layer_index
+from ..snapshots import schedule_layer_snapshots
+from nodeshot.core.base.snapshots import schedule_snapshots, delete_snapshots
+
+
+@receiver(pre_save, sender=Node)
+def store_previous_node_location(sender, **kwargs):
+    """ remember layer and geometry of existing nodes in order to invalidate the tiles they were in """
+    node = kwargs['instance']
+    node._previous_location = None
+    if node.pk and not kwargs.get('raw', False):
+        node._previous_location = Node.objects.filter(pk=node.pk).values_list('layer_id', 'geometry').first()
+
+
+@receiver(post_save, sender=Node)
+def invalidate_node_tiles(sender, **kwargs):
+    """
+    invalidate the vector tiles touched by the node before and after the change
+    and the clusters of the previous layer if the node has been moved to another layer
+    """
+    node = kwargs['instance']
+    previous = getattr(node, '_previous_location', None)
+    if previous is not None:
+        invalidate_tiles(previous[0], [previous[1]])
+        # node moved to another layer
+        if previous[0] != node.layer_id:
+            invalidate_clusters(previous[0])
+    invalidate_tiles(node.layer_id, [node.geometry])
+
+
+@receiver(nodes_bulk_saved, sender=Node)
+def invalidate_bulk_node_tiles(sender, **kwargs):
+    """ same as invalidate_node_tiles, for all the nodes saved by a bulk operation at once """
+    geometries = {}
+    for node in kwargs['created'] + kwargs['updated']:
+        geometries.setdefault(node.layer_id, []).append(node.geometry)
+        previous = getattr(node, '_previous_location', None)
+        if previous is not None:
+            geometries.setdefault(previous[0], []).append(previous[1])
+            # node moved to another layer
+            if previous[0] != node.layer_id:
+                invalidate_clusters(previous[0])
+    for layer_id, layer_geometries in geometries.items():
+        invalidate_tiles(layer_id, layer_geometries)
+
+
+@receiver(pre_delete, sender=Node)
+def invalidate_deleted_node_tiles(sender, **kwargs):
+    """ invalidate the vector tiles touched by the node which is being deleted """
+    node = kwargs['instance']
+    invalidate_tiles(node.layer_id, [node.geometry])
+
+
+@receiver(post_save, sender=Node)
+@receiver(post_delete, sender=Node)
+def schedule_node_layer_snapshots(sender, **kwargs):
+    """ rebuild the GeoJSON snapshots of the layer of the node """
+    node = kwargs['instance']
+    schedule_layer_snapshots([node], created=kwargs.get('created', True))
+
+
+@receiver(nodes_bulk_saved, sender=Node)
+def schedule_bulk_node_layer_snapshots(sender, **kwargs):
+    schedule_layer_snapshots(kwargs['created'], created=True)
+    schedule_layer_snapshots(kwargs['updated'], created=False)
+
+
+@receiver(layer_is_published_changed)
+@receiver(pre_delete, sender=Layer)
+def invalidate_layer_caches(sender, **kwargs):
+    """ publishing, unpublishing or deleting a layer affects tiles and clusters of all its nodes """
+    invalidate_layer_tiles(kwargs['instance'].id)
+    invalidate_clusters(kwargs['instance'].id)
+    invalidate_clusters('all')
+
+
+@receiver(layer_is_published_changed)
+@receiver(post_save, sender=Layer)
+@receiver(post_delete, sender=Layer)
+def invalidate_layer_area_index(sender, **kwargs):
+    """ layer areas are indexed in memory by each process """
+    invalidate_layer_index()
+
+
+@receiver(layer_is_published_changed)
+@receiver(post_save, sender=Layer)
+def schedule_layer_nodes_snapshots(sender, **kwargs):
+    schedule_snapshots('layer_nodes', kwargs['instance'].pk)
+
+
+@receiver(post_delete, sender=Layer)
+def delete_layer_nodes_snapshots(sender, **kwargs):
+    delete_snapshots('layer_nodes', kwargs['instance'].pk)
@@ -1,4 +1,7 @@
+import math
+
 from django.contrib.gis.db import models
+from django.db import connection
 from django.utils.translation import ugettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.contrib.gis.measure import D
@@ -12,6 +15,7 @@ from nodeshot.core.nodes.models import Node
 from ..settings import settings, NODES_MINIMUM_DISTANCE, HSTORE_SCHEMA
 from ..managers import LayerManager
 from ..signals import layer_is_published_changed
+from ..index import get_layer_index
 
 
 class Layer(BaseDate):
@@ -127,7 +131,8 @@ class Layer(BaseDate):
 
 @property
 def intersecting_layers(self):
-    return Layer.objects.filter(area__contains=self.point)
+    """ layers whose area contains the node, looked up in the in-memory layer area index """
+    return get_layer_index().layers_containing(self.point)
 
 Node.intersecting_layers = intersecting_layers
 
@@ -159,11 +164,150 @@ def node_contained_in_layer_area_validation(self):
     """
     if layer defines an area, ensure node coordinates are contained in the area
     """
+    if not self.layer_id:
+        return
+    # the prepared area is looked up in the in-memory layer area index
+    index = get_layer_index()
+    layer = index.get_layer(self.layer_id)
     # if area is a polygon ensure it contains the node
-    if self.layer and isinstance(self.layer.area, Polygon) and not self.layer.area.contains(self.geometry):
+    if layer is not None:
+        if isinstance(layer.area, Polygon) and not index.contains(layer.pk, self.geometry):
+            raise ValidationError(_('Node must be inside layer area'))
+    # layer not indexed yet
+    elif isinstance(self.layer.area, Polygon) and not self.layer.area.contains(self.geometry):
         raise ValidationError(_('Node must be inside layer area'))
 
 
-Node.add_validation_method(new_nodes_allowed_for_layer)
-Node.add_validation_method(nodes_minimum_distance_validation)
-Node.add_validation_method(node_contained_in_layer_area_validation)
+# ------ Batch equivalents (see Node.validate_batch) ------ #
+
+
+def get_layers_of_nodes(nodes):
+    """
+    returns a dictionary of the layers of the specified nodes ({ layer_id: layer });
+    layers which are not already cached on the node instances are retrieved with one query
+    and then cached on each node, so that node.layer won't perform any further query
+    """
+    cache_name = Node._meta.get_field('layer').get_cache_name()
+    layers = {}
+    for node in nodes:
+        layer = getattr(node, cache_name, None)
+        if layer is not None and layer.pk == node.layer_id:
+            layers[layer.pk] = layer
+    missing = set([node.layer_id for node in nodes if node.layer_id]) - set(layers.keys())
+    if missing:
+        layers.update(Layer.objects.in_bulk(list(missing)))
+    for node in nodes:
+        if node.layer_id in layers:
+            setattr(node, cache_name, layers[node.layer_id])
+    return layers
+
+
+def new_nodes_allowed_for_layer_batch(nodes):
+    layers = get_layers_of_nodes(nodes)
+    errors = {}
+    for index, node in enumerate(nodes):
+        layer = layers.get(node.layer_id)
+        if not node.pk and layer and not layer.new_nodes_allowed:
+            errors[index] = ValidationError(_('New nodes are not allowed for this layer'))
+    return errors
+
+
+# meters of a degree of latitude on the sphere of ST_Distance_Sphere (radius 6370986 m),
+# rounded down so that the degrees computed by _expand_degrees are never too few
+METERS_PER_DEGREE = 111000.0
+
+
+def _expand_degrees(geometry, distance):
+    """
+    returns the degrees by which the bounding box of geometry (in WGS84) must be expanded
+    to contain all the points which are within distance meters from it: a degree of longitude
+    is shorter at higher latitudes, therefore the highest latitude of the box is used
+    """
+    extent = geometry.extent
+    latitude = max(abs(extent[1]), abs(extent[3])) + distance / METERS_PER_DEGREE
+    # close to the poles the box would contain all the longitudes
+    if latitude >= 89:
+        return 360
+    return distance / (METERS_PER_DEGREE * math.cos(math.radians(latitude)))
+
+
+def nodes_minimum_distance_batch(nodes):
+    """
+    checks the minimum distance of all the nodes with one spatial self-join;
+    each node is compared with the nodes stored in the DB and with the nodes which
+    precede it in the list, which are considered as already saved, as it would
+    happen when validating and saving nodes one by one.
+
+    ST_Distance_Sphere can't use the spatial index, so the nodes are filtered first
+    with the bounding box of each candidate expanded by the minimum distance (&& operator)
+    """
+    layers = get_layers_of_nodes(nodes)
+    if not [layer for layer in layers.values() if layer.nodes_minimum_distance]:
+        return {}
+    field = Node._meta.get_field('geometry')
+    candidates = []
+    params = []
+    for index, node in enumerate(nodes):
+        if node.geometry is None:
+            continue
+        layer = layers.get(node.layer_id)
+        distance = layer.nodes_minimum_distance if layer else 0
+        geometry = node.geometry
+        if geometry.srid and geometry.srid != field.srid:
+            geometry = geometry.transform(field.srid, clone=True)
+        candidates.append('(%s, %s::integer, ST_SetSRID(ST_GeomFromText(%s), %s), %s, %s::float8)')
+        params += [index, node.pk, geometry.wkt, field.srid, distance, _expand_degrees(geometry, distance)]
+    if not candidates:
+        return {}
+
+    sql = """
+        WITH candidate (idx, id, geom, distance, expand) AS (VALUES {values})
+        SELECT candidate.idx FROM candidate
+        WHERE candidate.distance > 0 AND (
+            EXISTS (SELECT 1 FROM {table} AS node
+                    WHERE node.id IS DISTINCT FROM candidate.id
+                    AND node.id NOT IN (SELECT previous.id FROM candidate AS previous
+                                        WHERE previous.idx < candidate.idx AND previous.id IS NOT NULL)
+                    AND node.{column} && ST_Expand(candidate.geom, candidate.expand)
+                    AND {distance}(node.{column}, candidate.geom) <= candidate.distance)
+            OR EXISTS (SELECT 1 FROM candidate AS previous
+                       WHERE previous.idx < candidate.idx
+                       AND previous.geom && ST_Expand(candidate.geom, candidate.expand)
+                       AND {distance}(previous.geom, candidate.geom) <= candidate.distance)
+        )
+    """.format(
+        values=', '.join(candidates),
+        table=connection.ops.quote_name(Node._meta.db_table),
+        column=connection.ops.quote_name(field.column),
+        distance=connection.ops.distance_sphere
+    )
+
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+
+    errors = {}
+    for (index,) in cursor.fetchall():
+        minimum_distance = layers[nodes[index].layer_id].nodes_minimum_distance
+        errors[index] = ValidationError(_('Distance between nodes cannot be less than %s meters') % minimum_distance)
+    return errors
+
+
+def node_contained_in_layer_area_batch(nodes):
+    """ uses the prepared areas of the in-memory layer area index """
+    index = get_layer_index()
+    errors = {}
+    for position, node in enumerate(nodes):
+        layer = index.get_layer(node.layer_id)
+        if layer is None:
+            try:
+                node.node_contained_in_layer_area_validation()
+            except ValidationError as e:
+                errors[position] = e
+        elif isinstance(layer.area, Polygon) and not index.contains(layer.pk, node.geometry):
+            errors[position] = ValidationError(_('Node must be inside layer area'))
+    return errors
+
+
+Node.add_validation_method(new_nodes_allowed_for_layer, new_nodes_allowed_for_layer_batch)
+Node.add_validation_method(nodes_minimum_distance_validation, nodes_minimum_distance_batch)
+Node.add_validation_method(node_contained_in_layer_area_validation, node_contained_in_layer_area_batch)
@@ -4,7 +4,7 @@ from rest_framework import serializers, pagination
 from rest_framework_gis import serializers as geoserializers
 from rest_framework_hstore.serializers import HStoreSerializer
 
-from nodeshot.core.base.serializers import GeoJSONPaginationSerializer
+from nodeshot.core.base.serializers import GeoJSONPaginationSerializer, PrecomputedGeometryField
 from nodeshot.core.nodes.models import Node
 from nodeshot.core.nodes.serializers import NodeListSerializer
 
@@ -31,6 +31,8 @@ class LayerListSerializer(geoserializers.GeoModelSerializer, HStoreSerializer):
     nodes = serializers.HyperlinkedIdentityField(view_name='api_layer_nodes_list', lookup_field='slug')
     geojson = serializers.HyperlinkedIdentityField(view_name='api_layer_nodes_geojson', lookup_field='slug')
     center = serializers.SerializerMethodField('get_center')
+    # might be simplified, see nodeshot.core.layers.simplify
+    area = PrecomputedGeometryField()
 
     def get_center(self, obj):
         return json.loads(obj.center.geojson)
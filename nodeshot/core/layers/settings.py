@@ -5,6 +5,16 @@ HSTORE_SCHEMA = getattr(settings, 'NODESHOT_LAYERS_HSTORE_SCHEMA', None)
 NODES_MINIMUM_DISTANCE = getattr(settings, 'NODESHOT_LAYERS_NODES_MINIMUM_DISTANCE', 0)
 REVERSION_ENABLED = getattr(settings, 'NODESHOT_LAYERS_REVERSION_ENABLED', True)
 TEXT_HTML = getattr(settings, 'NODESHOT_LAYERS_TEXT_HTML', True)
+TILES_MAX_ZOOM = getattr(settings, 'NODESHOT_LAYERS_TILES_MAX_ZOOM', 18)
+TILES_EXTENT = getattr(settings, 'NODESHOT_LAYERS_TILES_EXTENT', 4096)
+TILES_CACHE_TIMEOUT = getattr(settings, 'NODESHOT_LAYERS_TILES_CACHE_TIMEOUT', 86400)
+# above this number of tiles the whole tile cache of a layer is dropped
+TILES_INVALIDATION_LIMIT = getattr(settings, 'NODESHOT_LAYERS_TILES_INVALIDATION_LIMIT', 512)
+# max number of features accepted by the bulk import of nodes and number of rows written by each query
+BULK_MAX_NODES = getattr(settings, 'NODESHOT_LAYERS_BULK_MAX_NODES', 5000)
+BULK_BATCH_SIZE = getattr(settings, 'NODESHOT_LAYERS_BULK_BATCH_SIZE', 500)
+# max age in seconds of the in-memory index of layer areas of each process
+AREA_INDEX_TIMEOUT = getattr(settings, 'NODESHOT_LAYERS_AREA_INDEX_TIMEOUT', 600)
 
 
 if HSTORE_SCHEMA:
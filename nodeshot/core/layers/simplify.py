@@ -0,0 +1,66 @@
+"""
+Simplified areas of layers
+
+Areas are simplified and encoded in GeoJSON by the database (see nodeshot.core.base.geojson)
+with one query for all the layers of a response; areas simplified for a zoom level are cached
+for each layer, the cache key contains the "updated" value of the layer
+so that the cached areas are not used anymore as soon as the layer changes.
+"""
+from django.core.cache import cache
+from django.db import connection
+
+from nodeshot.core.base.settings import GEOJSON_SIMPLIFY_CACHE_TIMEOUT
+
+from .models import Layer
+
+
+__all__ = [
+    'area_cache_key',
+    'set_area_geojson',
+]
+
+
+def area_cache_key(layer, options):
+    return 'layer_area:%s:%s:%s' % (layer.pk, layer.updated.isoformat(), options.cache_key)
+
+
+def set_area_geojson(layers, options):
+    """
+    sets the area_geojson attribute of each layer (see PrecomputedGeometryField)
+    to its area encoded according to options; returns the list of layers
+    """
+    layers = list(layers)
+    if options is None or options.is_default or not layers:
+        return layers
+
+    keys = {}
+    if options.cache_key is not None:
+        keys = dict([(layer.pk, area_cache_key(layer, options)) for layer in layers])
+    cached = cache.get_many(keys.values()) if keys else {}
+    missing = []
+
+    for layer in layers:
+        geojson = cached.get(keys.get(layer.pk))
+        if geojson is None:
+            missing.append(layer)
+        else:
+            layer.area_geojson = geojson
+
+    if not missing:
+        return layers
+
+    column = '%s.%s' % (connection.ops.quote_name(Layer._meta.db_table), connection.ops.quote_name('area'))
+    areas = dict(Layer.objects.filter(pk__in=[layer.pk for layer in missing])
+                              .extra(select={ 'area_geojson': options.as_sql(column) })
+                              .values_list('id', 'area_geojson'))
+    to_cache = {}
+
+    for layer in missing:
+        layer.area_geojson = areas.get(layer.pk)
+        if layer.pk in keys and layer.area_geojson is not None:
+            to_cache[keys[layer.pk]] = layer.area_geojson
+
+    if to_cache:
+        cache.set_many(to_cache, GEOJSON_SIMPLIFY_CACHE_TIMEOUT)
+
+    return layers
@@ -0,0 +1,45 @@
+"""
+GeoJSON snapshots of the nodes of each layer (see nodeshot.core.base.snapshots)
+"""
+from nodeshot.core.base.snapshots import register_snapshot, schedule_snapshots, groups_for_access_level
+from nodeshot.core.base.streaming import stream_feature_collection
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.serializers import FastNodeGeoSerializer
+
+
+__all__ = ['schedule_layer_snapshots']
+
+
+def build_layer_nodes_snapshot(request, layer_id):
+    """ same content of /api/v1/layers/<slug>/nodes.geojson?stream=true """
+    queryset = Node.objects.published().accessible_to(request.user).filter(layer_id=layer_id)
+    serializer = FastNodeGeoSerializer(context={ 'request': request })
+    return stream_feature_collection(serializer.values(queryset), serializer)
+
+
+def get_layer_ids():
+    from .models import Layer
+    return list(Layer.objects.filter(is_external=False).values_list('id', flat=True))
+
+
+def schedule_layer_snapshots(nodes, created):
+    """
+    schedules the rebuild of the snapshots of the layers of nodes;
+    new (or deleted) nodes affect only the groups which can see them,
+    changed nodes might have changed access level and affect all the groups
+    """
+    layers = {}
+    for node in nodes:
+        if created:
+            layers.setdefault(node.layer_id, set()).update(groups_for_access_level(node.access_level))
+        else:
+            layers[node.layer_id] = None
+            # node moved to another layer
+            previous = getattr(node, '_previous_location', None)
+            if previous is not None and previous[0] != node.layer_id:
+                layers[previous[0]] = None
+    for layer_id, group_names in layers.items():
+        schedule_snapshots('layer_nodes', layer_id, group_names)
+
+
+register_snapshot('layer_nodes', build_layer_nodes_snapshot, get_layer_ids)
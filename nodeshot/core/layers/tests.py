@@ -2,18 +2,29 @@
 nodeshot.core.layers unit tests
 """
 
+import gzip
+import shutil
+import tempfile
 import simplejson as json
+from cStringIO import StringIO
 
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext as _
 from django.contrib.gis.geos import GEOSGeometry, Point
+from django.contrib.auth import get_user_model
 
+from nodeshot.core.base import snapshots
 from nodeshot.core.base.tests import user_fixtures
 from nodeshot.core.nodes.models import Node  # test additional validation added by layer model
+from nodeshot.core.nodes.signals import node_status_changed
 
 from .models import Layer
+from .index import STRtree, get_layer_index
+from .tiles import MVT_CONTENT_TYPE, tile_polygon, tiles_for_extent, lonlat_to_tile
+
+User = get_user_model()
 
 
 class LayerTest(TestCase):
@@ -173,6 +184,77 @@ class LayerTest(TestCase):
         # ensure "features" are at root level
         self.assertEqual(len(response.data['features']), layer_public_nodes_count)
 
+    def test_layer_nodes_geojson_stream(self):
+        layer = Layer.objects.get(pk=1)
+        url = reverse('api_layer_nodes_geojson', args=[layer.slug])
+        response = self.client.get(url)
+        expected = response.data
+
+        response = self.client.get(url, { 'stream': 'true' })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(''.join(response.streaming_content))
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual(len(data['features']), len(expected['features']))
+        self.assertEqual(sorted([f['id'] for f in data['features']]),
+                         sorted([f['id'] for f in expected['features']]))
+
+    def test_layer_nodes_conditional_get(self):
+        layer = Layer.objects.get(pk=1)
+        url = reverse('api_layer_nodes_list', args=[layer.slug])
+        response = self.client.get(url)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # layer info is part of the response
+        layer.description = 'changed'
+        layer.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['description'], 'changed')
+
+    def test_layer_nodes_snapshot(self):
+        """ ensure the precomputed snapshots have the same content of the streamed GeoJSON """
+        root, original_root = tempfile.mkdtemp(), snapshots.SNAPSHOTS_ROOT
+        snapshots.SNAPSHOTS_ENABLED, snapshots.SNAPSHOTS_ROOT = True, root
+        url = reverse('api_layer_nodes_geojson', args=['rome'])
+
+        def get_snapshot(**kwargs):
+            response = self.client.get(url, { 'snapshot': 'true' }, HTTP_ACCEPT_ENCODING='gzip, deflate', **kwargs)
+            if response.status_code != 200:
+                return response, None
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            return response, json.loads(gzip.GzipFile(fileobj=StringIO(response.content)).read())
+
+        try:
+            expected = json.loads(''.join(self.client.get(url, { 'stream': 'true' }).streaming_content))
+            response, data = get_snapshot()
+            self.assertEqual(data, expected)
+            self.assertTrue(response['Vary'])
+
+            # once built only the layer is retrieved
+            with self.assertNumQueries(1):
+                response, data = get_snapshot()
+            self.assertEqual(data, expected)
+            response, data = get_snapshot(HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+            # changes rebuild the snapshot (celery is eager during tests)
+            Node.objects.get(slug='fusolab').delete()
+            response, data = get_snapshot()
+            self.assertEqual(len(data['features']), len(expected['features']) - 1)
+            # marks are deleted once the snapshot has been rebuilt
+            self.assertEqual(list(snapshots.get_dirty_marks()), [])
+
+            # clients which don't support compression
+            response = self.client.get(url, { 'snapshot': 'true' })
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(json.loads(response.content), data)
+        finally:
+            snapshots.SNAPSHOTS_ENABLED, snapshots.SNAPSHOTS_ROOT = False, original_root
+            shutil.rmtree(root)
+
     def test_layers_api_post(self):
         layer_count = Layer.objects.all().count()
         # POST to create, 400
@@ -194,6 +276,109 @@ class LayerTest(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(Layer.objects.all().count(), layer_count + 1)
 
+    def test_layer_nodes_bulk(self):
+        layer = Layer.objects.get(pk=1)
+        url = reverse('api_layer_nodes_bulk', args=[layer.slug])
+        data = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'geometry': { 'type': 'Point', 'coordinates': [12.51, 41.88] },
+                    'properties': { 'name': 'bulk 1' }
+                },
+                {
+                    'type': 'Feature',
+                    'geometry': { 'type': 'Point', 'coordinates': [12.52, 41.89] },
+                    'properties': { 'name': 'bulk 2', 'address': 'via bulk' }
+                },
+                {
+                    'type': 'Feature',
+                    'geometry': { 'type': 'Point', 'coordinates': [12.58, 41.87] },
+                    'properties': { 'slug': 'fusolab', 'description': 'changed' }
+                }
+            ]
+        }
+        count = Node.objects.count()
+
+        # authentication required
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.login(username='admin', password='tester')
+
+        # unknown, unpublished and external layers
+        response = self.client.post(reverse('api_layer_nodes_bulk', args=['wrong']), json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(reverse('api_layer_nodes_bulk', args=['vienna']), json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+        # not a FeatureCollection
+        response = self.client.post(url, json.dumps(data['features']), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # one invalid feature, nothing is written
+        invalid = { 'type': 'FeatureCollection', 'features': data['features'] + [
+            { 'type': 'Feature', 'geometry': None, 'properties': { 'name': 'bulk 3' } },
+            { 'type': 'Feature', 'geometry': { 'type': 'Point', 'coordinates': [12.5, 41.8] }, 'properties': { 'name': 'bulk 1' } }
+        ]}
+        response = self.client.post(url, json.dumps(invalid), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([f['result'] for f in response.data['features']], ['created', 'created', 'updated', 'error', 'error'])
+        self.assertIn('geometry', response.data['features'][3]['errors'])
+        self.assertIn('slug', response.data['features'][4]['errors'])
+        self.assertEqual(Node.objects.count(), count)
+
+        response = self.client.post(url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(Node.objects.count(), count + 2)
+
+        node = Node.objects.get(slug='bulk-2')
+        self.assertEqual(node.layer_id, layer.id)
+        self.assertEqual(node.user.username, 'admin')
+        self.assertEqual(node.address, 'via bulk')
+        self.assertIsNotNone(node.status_id)
+        self.assertEqual(node.geometry, GEOSGeometry('POINT (12.52 41.89)'))
+
+        node = Node.objects.get(slug='fusolab')
+        self.assertEqual(node.description, 'changed')
+        self.assertEqual(node.geometry, GEOSGeometry('POINT (12.58 41.87)'))
+
+        # node_status_changed is sent for each node whose status changes
+        changed = []
+        def receiver(instance, old_status, new_status, **kwargs):
+            changed.append((instance.slug, old_status.slug, new_status.slug))
+        node_status_changed.connect(receiver, sender=Node)
+        try:
+            data['features'][2]['properties']['status'] = 'planned'
+            data['features'][1]['properties']['status'] = 'planned'
+            data['features'][1]['properties']['slug'] = 'bulk-2'
+            response = self.client.post(url, json.dumps(data), content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(changed, [('bulk-2', 'potential', 'planned'), ('fusolab', 'active', 'planned')])
+        finally:
+            node_status_changed.disconnect(receiver, sender=Node)
+
+        # access_level and is_published can be set only by admins and mantainers of the layer
+        self.client.logout()
+        self.client.login(username='registered', password='tester')
+        restricted = { 'type': 'FeatureCollection', 'features': [{
+            'type': 'Feature',
+            'geometry': { 'type': 'Point', 'coordinates': [12.53, 41.86] },
+            'properties': { 'name': 'bulk 4', 'is_published': False, 'access_level': 0, 'status': 'active' }
+        }]}
+        response = self.client.post(url, json.dumps(restricted), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data['features'][0]['errors'])
+        self.assertIn('is_published', response.data['features'][0]['errors'])
+        self.assertIn('access_level', response.data['features'][0]['errors'])
+        layer.mantainers.add(User.objects.get(username='registered'))
+        response = self.client.post(url, json.dumps(restricted), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Node.objects.get(slug='bulk-4').is_published)
+
     def test_unpublish_layer_should_unpublish_nodes(self):
         layer = Layer.objects.first()
         layer.is_published = False
@@ -250,6 +435,176 @@ class LayerTest(TestCase):
         layer.save()
         new_node.full_clean()
 
+    def test_node_validate_batch(self):
+        """ ensure batch validation gives the same results of validating nodes one by one """
+        layer = Layer.objects.get(slug='rome')
+        layer.nodes_minimum_distance = 100
+        layer.area = GEOSGeometry('POLYGON ((12.19 41.92, 12.58 42.17, 12.82 41.86, 12.43 41.64, 12.43 41.65, 12.19 41.92))')
+        layer.save()
+        existing = Node.objects.select_related('layer').get(slug='fusolab')
+
+        nodes = [
+            # an existing node can keep its position
+            existing,
+            # valid
+            Node(name='batch1', slug='batch1', layer=layer, geometry=Point(12.7022391919, 41.8720419277)),
+            # too close to an existing node
+            Node(name='batch2', slug='batch2', layer=layer, geometry=existing.geometry),
+            # outside the layer area
+            Node(name='batch3', slug='batch3', layer=layer, geometry=Point(50, 50)),
+            # too close to a node which precedes it in the batch
+            Node(name='batch4', slug='batch4', layer=layer, geometry=Point(12.7022391919, 41.8720419278)),
+            # about 90 meters east of batch1: 0.00108 degrees of longitude are less than 100 meters at this latitude
+            Node(name='batch5', slug='batch5', layer=layer, geometry=Point(12.7033191919, 41.8720419277))
+        ]
+
+        # build the layer area index
+        get_layer_index()
+
+        # layers are retrieved from the nodes and distance is checked with one query
+        with self.assertNumQueries(1):
+            errors = Node.validate_batch(nodes)
+
+        self.assertIsNone(errors[0])
+        self.assertIsNone(errors[1])
+        self.assertIn(_('Distance between nodes cannot be less than %s meters') % 100, errors[2].messages)
+        self.assertIn(_('Node must be inside layer area'), errors[3].messages)
+        self.assertIn(_('Distance between nodes cannot be less than %s meters') % 100, errors[4].messages)
+        self.assertIn(_('Distance between nodes cannot be less than %s meters') % 100, errors[5].messages)
+
+        # same results of per node validation
+        for node, error in zip(nodes, errors):
+            try:
+                node.clean()
+            except ValidationError as e:
+                self.assertEqual(e.messages, error.messages)
+            else:
+                # the last node is invalid only because of a node of the batch
+                if node.name != 'batch4':
+                    self.assertIsNone(error)
+
+    def test_layer_area_index(self):
+        """ ensure point in layer lookups are answered by the in-memory index """
+        rome = Layer.objects.get(slug='rome')
+        rome.area = GEOSGeometry('POLYGON ((12.19 41.92, 12.58 42.17, 12.82 41.86, 12.43 41.64, 12.43 41.65, 12.19 41.92))')
+        rome.save()
+        node = Node.objects.get(slug='fusolab')
+
+        index = get_layer_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(node.intersecting_layers, [index.get_layer(rome.pk)])
+            self.assertEqual(get_layer_index().layers_containing(Point(50, 50)), [])
+        self.assertTrue(index.contains(rome.pk, node.geometry))
+
+        # saving a layer invalidates the index
+        rome.area = GEOSGeometry('POLYGON ((40 40, 60 40, 60 60, 40 60, 40 40))')
+        rome.save()
+        self.assertIsNot(get_layer_index(), index)
+        self.assertEqual(node.intersecting_layers, [])
+        self.assertEqual([layer.slug for layer in get_layer_index().layers_containing(Point(50, 50))], ['rome'])
+
+        # unpublished layers can be excluded
+        rome.is_published = False
+        rome.save()
+        self.assertEqual(get_layer_index().layers_containing(Point(50, 50), published=True), [])
+
+        # deleting a layer invalidates the index
+        index = get_layer_index()
+        Layer.objects.get(slug='vienna').delete()
+        self.assertIsNone(get_layer_index().get_layer(4))
+
+    def test_layer_index_node_save(self):
+        """ saving a node clears the cache, but the index of layer areas is not rebuilt """
+        from django.core.cache import get_cache
+        from nodeshot.core.base import cache
+        from nodeshot.core.nodes import models as node_models
+
+        default, versions = node_models.cache, cache.versions_cache
+        # a backend without delete_pattern is cleared completely each time a node is saved
+        node_models.cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='default')
+        cache.versions_cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='versions')
+        try:
+            index = get_layer_index()
+            Node.objects.get(slug='fusolab').save()
+            self.assertIs(get_layer_index(), index)
+            # saving a layer still invalidates the index
+            Layer.objects.get(slug='rome').save()
+            self.assertIsNot(get_layer_index(), index)
+        finally:
+            node_models.cache, cache.versions_cache = default, versions
+
+    def test_strtree(self):
+        """ STRtree must return the same results of a linear scan """
+        items = [((x, y, x + 1.5, y + 1.5), (x, y)) for x in range(30) for y in range(30)]
+        tree = STRtree(items)
+        for point in [(0, 0), (10.7, 3.2), (29.9, 29.9), (-1, 5), (15, 31.6)]:
+            expected = [value for extent, value in items
+                        if extent[0] <= point[0] <= extent[2] and extent[1] <= point[1] <= extent[3]]
+            self.assertEqual(tree.query(*point), expected)
+        self.assertEqual(STRtree([]).query(0, 0), [])
+
+    def test_layers_api_contains(self):
+        rome = Layer.objects.get(slug='rome')
+        rome.area = GEOSGeometry('POLYGON ((12.19 41.92, 12.58 42.17, 12.82 41.86, 12.43 41.64, 12.43 41.65, 12.19 41.92))')
+        rome.save()
+        url = reverse('api_layer_list')
+
+        response = self.client.get(url, { 'contains': '12.58,41.87' })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([layer['slug'] for layer in response.data], ['rome'])
+
+        response = self.client.get(url, { 'contains': '50,50' })
+        self.assertEqual(response.data, [])
+
+        response = self.client.get(url, { 'contains': 'wrong' })
+        self.assertEqual(response.status_code, 400)
+
+    def test_layers_api_simplify(self):
+        from django.core.cache import get_cache
+        from nodeshot.core.base.geojson import GeoJSONOptions
+        from . import simplify
+        from .simplify import area_cache_key
+
+        rome = Layer.objects.get(slug='rome')
+        rome.area = GEOSGeometry('POLYGON ((12.19 41.92, 12.58 42.17, 12.58001 42.17001, 12.82 41.86, 12.43 41.64, 12.19 41.92))')
+        rome.save()
+        url = reverse('api_layer_detail', args=['rome'])
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['area']['coordinates'][0]), 6)
+
+        # vertexes closer than the tolerance are removed
+        response = self.client.get(url, { 'simplify': '0.001' })
+        self.assertEqual(len(response.data['area']['coordinates'][0]), 5)
+
+        # coordinates are rounded
+        response = self.client.get(url, { 'precision': '1' })
+        self.assertEqual(response.data['area']['coordinates'][0][0], [12.2, 41.9])
+
+        # areas simplified for a zoom level are cached until the layer changes
+        # (the test settings use the dummy cache, which doesn't store anything)
+        cache, simplify.cache = simplify.cache, get_cache('django.core.cache.backends.locmem.LocMemCache')
+        try:
+            response = self.client.get(reverse('api_layer_geojson'), { 'simplify': 'true', 'zoom': 5 })
+            self.assertEqual(response.status_code, 200)
+            feature = [feature for feature in response.data['features'] if feature['properties']['slug'] == 'rome'][0]
+            key = area_cache_key(rome, GeoJSONOptions(zoom=5))
+            self.assertEqual(json.loads(simplify.cache.get(key)), feature['geometry'])
+        finally:
+            simplify.cache = cache
+        rome.save()
+        self.assertNotEqual(area_cache_key(rome, GeoJSONOptions(zoom=5)), key)
+
+        # node geometries
+        response = self.client.get(reverse('api_layer_nodes_geojson', args=['rome']), { 'precision': '0' })
+        for feature in response.data['features']:
+            for coordinate in feature['geometry']['coordinates']:
+                self.assertEqual(coordinate, round(coordinate))
+
+        for params in [{ 'simplify': 'wrong' }, { 'simplify': '-1' }, { 'simplify': 'true' }, { 'precision': '16' }]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400)
+
     def test_node_geometry_distance_and_area(self):
         """ test minimum distance check between nodes """
         self.client.login(username='admin', password='tester')
@@ -336,3 +691,35 @@ class LayerTest(TestCase):
         self.assertNotEqual(l.center, l.area)
         l.area = None
         self.assertIsNone(l.center)
+
+    def test_layer_nodes_tile(self):
+        node = Node.objects.get(slug='fusolab')
+        lng, lat = node.geometry.coords
+        x, y = lonlat_to_tile(lng, lat, 14)
+        # tile containing fusolab
+        url = reverse('api_layer_nodes_tile', args=[node.layer.slug, 14, x, y])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], MVT_CONTENT_TYPE)
+        self.assertIn('fusolab', response.content)
+        # empty tile
+        url = reverse('api_layer_nodes_tile', args=[node.layer.slug, 14, x + 10, y + 10])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('fusolab', response.content)
+        # out of range
+        url = reverse('api_layer_nodes_tile', args=[node.layer.slug, 1, 2, 2])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        # layer not found
+        url = reverse('api_layer_nodes_tile', args=['idontexist', 14, x, y])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_tiles_for_extent(self):
+        self.assertEqual(tiles_for_extent((12.5, 41.8, 12.5, 41.8), 0), [(0, 0, 0)])
+        tiles = tiles_for_extent((12.5, 41.8, 12.5, 41.8), 14)
+        self.assertEqual(len(tiles), 1)
+        self.assertTrue(tile_polygon(*tiles[0]).contains(Point(12.5, 41.8)))
+        # extent on the border of two tiles
+        self.assertEqual(len(tiles_for_extent((0, 10, 0, 10), 1)), 2)
@@ -0,0 +1,170 @@
+"""
+Mapbox Vector Tiles of the nodes of a layer
+
+Tiles follow the usual "slippy map" numbering (z/x/y, spherical mercator),
+are rendered from Node.geometry (which is backed by a spatial index)
+and are stored in the django cache, one entry per layer, group and tile.
+"""
+import math
+
+from django.core.cache import cache
+from django.contrib.gis.geos import Polygon
+
+from nodeshot.core.base.cache import cache_delete_pattern_or_all
+from nodeshot.core.base.choices import ACCESS_LEVELS
+
+from .settings import TILES_MAX_ZOOM, TILES_EXTENT, TILES_CACHE_TIMEOUT, TILES_INVALIDATION_LIMIT
+
+try:
+    import mapbox_vector_tile
+except ImportError:
+    mapbox_vector_tile = None
+
+
+__all__ = [
+    'MVT_CONTENT_TYPE',
+    'tile_is_valid',
+    'tile_polygon',
+    'tiles_for_extent',
+    'tile_cache_key',
+    'get_tile',
+    'render_tile',
+    'invalidate_tiles',
+    'invalidate_layer_tiles',
+]
+
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+MAX_LATITUDE = 85.0511287798066
+ORIGIN_SHIFT = 2 * math.pi * 6378137 / 2.0
+# tiny margin used to include the neighbouring tiles of geometries lying on a tile border
+EPSILON = 1e-9
+
+
+def tile_is_valid(z, x, y):
+    """ returns True if z/x/y identifies an existing tile which can be served """
+    if z < 0 or z > TILES_MAX_ZOOM:
+        return False
+    n = 2 ** z
+    return 0 <= x < n and 0 <= y < n
+
+
+def lonlat_to_tile(lng, lat, z):
+    """ returns the x, y numbers of the tile of zoom level z containing the specified coordinates """
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    n = 2 ** z
+    lat_rad = math.radians(lat)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.log(math.tan(lat_rad) + 1.0 / math.cos(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_to_lonlat(x, y, z):
+    """ returns the coordinates of the north west corner of the specified tile """
+    n = 2.0 ** z
+    lng = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return lng, lat
+
+
+def tile_polygon(z, x, y):
+    """ returns the area of the specified tile as a WGS84 polygon """
+    west, north = tile_to_lonlat(x, y, z)
+    east, south = tile_to_lonlat(x + 1, y + 1, z)
+    polygon = Polygon.from_bbox((west, south, east, north))
+    polygon.srid = 4326
+    return polygon
+
+
+def mercator_bounds(z, x, y):
+    """ returns the bounds of the specified tile in spherical mercator (EPSG:3857) """
+    size = 2 * ORIGIN_SHIFT / 2 ** z
+    minx = -ORIGIN_SHIFT + x * size
+    maxy = ORIGIN_SHIFT - y * size
+    return (minx, maxy - size, minx + size, maxy)
+
+
+def tiles_for_extent(extent, z):
+    """
+    returns a list of (z, x, y) tuples of the tiles of zoom level z touched by extent
+
+    :param extent: (xmin, ymin, xmax, ymax) tuple in WGS84
+    """
+    xmin, ymin, xmax, ymax = extent
+    min_x, min_y = lonlat_to_tile(xmin - EPSILON, ymax + EPSILON, z)
+    max_x, max_y = lonlat_to_tile(xmax + EPSILON, ymin - EPSILON, z)
+    return [(z, x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+
+def tile_cache_key(layer_id, group, z, x, y):
+    """ "layer_tile:{layer_id}:{group}:{z}/{x}/{y}", eg: "layer_tile:1:public:12/2200/1490" """
+    return 'layer_tile:%s:%s:%d/%d/%d' % (layer_id, group, z, x, y)
+
+
+def render_tile(queryset, z, x, y):
+    """
+    Encodes the nodes of queryset which intersect the specified tile
+    as a Mapbox Vector Tile containing one layer named "nodes".
+    Only the columns needed by the tile are retrieved, geometries are
+    reprojected in the database.
+    """
+    if mapbox_vector_tile is None:
+        raise ImportError('vector tiles require the mapbox-vector-tile package')
+
+    rows = queryset.filter(geometry__intersects=tile_polygon(z, x, y))\
+                   .transform(3857)\
+                   .values_list('slug', 'name', 'status__slug', 'geometry')
+    features = []
+
+    for slug, name, status, geometry in rows:
+        properties = {'slug': slug, 'name': name}
+        # the encoder does not support null values
+        if status:
+            properties['status'] = status
+        features.append({'geometry': str(geometry.wkb), 'properties': properties})
+
+    return mapbox_vector_tile.encode([{'name': 'nodes', 'features': features}],
+                                     quantize_bounds=mercator_bounds(z, x, y),
+                                     extents=TILES_EXTENT)
+
+
+def get_tile(queryset, layer_id, group, z, x, y):
+    """ returns the cached tile or renders and caches it if necessary """
+    key = tile_cache_key(layer_id, group, z, x, y)
+    tile = cache.get(key)
+
+    if tile is None:
+        tile = render_tile(queryset, z, x, y)
+        cache.set(key, tile, TILES_CACHE_TIMEOUT)
+
+    return tile
+
+
+def invalidate_layer_tiles(layer_id):
+    """ drops every cached tile of the specified layer """
+    cache_delete_pattern_or_all('layer_tile:%s:*' % layer_id)
+
+
+def invalidate_tiles(layer_id, geometries):
+    """
+    Drops from the cache only the tiles touched by the specified geometries,
+    on every zoom level and for every group.
+    If too many tiles are involved (eg: big polygons) the tiles of the whole layer are dropped.
+
+    :param layer_id: id of the layer the geometries belong to
+    :param geometries: iterable of GEOSGeometry objects (None values are ignored)
+    """
+    tiles = set()
+
+    for geometry in geometries:
+        if geometry is None:
+            continue
+        extent = geometry.extent
+        for z in range(TILES_MAX_ZOOM + 1):
+            tiles.update(tiles_for_extent(extent, z))
+            if len(tiles) > TILES_INVALIDATION_LIMIT:
+                invalidate_layer_tiles(layer_id)
+                return
+
+    groups = ACCESS_LEVELS.keys() + ['superuser']
+    cache.delete_many([tile_cache_key(layer_id, group, *tile) for tile in tiles for group in groups])
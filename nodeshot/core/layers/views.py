@@ -1,17 +1,32 @@
-from django.http import Http404
+import hashlib
+
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils.translation import ugettext_lazy as _
+from django.contrib.gis.geos import Point
 
 from rest_framework import generics, permissions, authentication
 from rest_framework.response import Response
-
-from nodeshot.core.base.mixins import ListSerializerMixin
+from rest_framework.exceptions import ParseError
+
+from nodeshot.core.base.mixins import ListSerializerMixin, ConditionalGetMixin, GeoJSONOptionsMixin
+from nodeshot.core.base.cache import get_group_name
+from nodeshot.core.base.serializers import GeoJSONCursorPaginationSerializer
+from nodeshot.core.base.streaming import stream_feature_collection
+from nodeshot.core.base.snapshots import snapshots_enabled, snapshot_response
+from nodeshot.core.base.renderers import CompactRenderersMixin
 from nodeshot.core.base.utils import Hider
-from nodeshot.core.nodes.views import NodeList
-from nodeshot.core.nodes.serializers import NodeGeoSerializer
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.views import NodeList, NodeClusterMixin
+from nodeshot.core.nodes.serializers import NodeGeoSerializer, FastNodeGeoSerializer
 
 from .settings import REVERSION_ENABLED
 from .models import Layer
+from .bulk import BulkNodeImport
+from .index import get_layer_index
+from .simplify import set_area_geojson
 from .serializers import *
+from .tiles import MVT_CONTENT_TYPE, tile_is_valid, get_tile
 
 
 if REVERSION_ENABLED:
@@ -30,10 +45,33 @@ else:
         pass
 
 
-class LayerList(LayerListBase):
+class LayerAreaMixin(GeoJSONOptionsMixin):
+    """ simplifies the areas of the layers returned by GET requests according to the GeoJSON options """
+
+    def get_pagination_serializer(self, page):
+        page.object_list = set_area_geojson(page.object_list, self.get_geojson_options())
+        return super(LayerAreaMixin, self).get_pagination_serializer(page)
+
+    def get_serializer(self, instance=None, *args, **kwargs):
+        if instance is not None and self.request.method == 'GET':
+            if kwargs.get('many', False):
+                instance = set_area_geojson(instance, self.get_geojson_options())
+            else:
+                set_area_geojson([instance], self.get_geojson_options())
+        return super(LayerAreaMixin, self).get_serializer(instance, *args, **kwargs)
+
+
+class LayerList(ConditionalGetMixin, LayerAreaMixin, CompactRenderersMixin, LayerListBase):
     """
     Retrieve list of all layers.
 
+    Parameters:
+
+     * `contains=<lng>,<lat>`: retrieve only layers whose area contains the specified point
+     * `simplify=<tolerance>` or `simplify=true&zoom=<n>`: simplify areas with the specified tolerance (degrees) or for the specified zoom level
+     * `precision=<n>`: number of decimal digits of the coordinates of areas
+     * `format=msgpack`: same data encoded with MessagePack
+
     ### POST
 
     Create new layer if authorized (admins and allowed users only).
@@ -46,13 +84,31 @@ class LayerList(LayerListBase):
     paginate_by_param = 'limit'
     paginate_by = None
 
+    def get_queryset(self):
+        """ point in layer lookups are answered by the in-memory layer area index """
+        queryset = super(LayerList, self).get_queryset()
+        contains = self.request.QUERY_PARAMS.get('contains', None)
+        if contains is None:
+            return queryset
+        try:
+            lng, lat = [float(value) for value in contains.split(',')]
+        except ValueError:
+            raise ParseError(_('contains must be in the format lng,lat'))
+        layers = get_layer_index().layers_containing(Point(lng, lat), published=True)
+        return queryset.filter(pk__in=[layer.pk for layer in layers])
+
 layer_list = LayerList.as_view()
 
 
-class LayerDetail(LayerDetailBase):
+class LayerDetail(ConditionalGetMixin, LayerAreaMixin, LayerDetailBase):
     """
     Retrieve details of specified layer.
 
+    Parameters:
+
+     * `simplify=<tolerance>` or `simplify=true&zoom=<n>`: simplify the area with the specified tolerance (degrees) or for the specified zoom level
+     * `precision=<n>`: number of decimal digits of the coordinates of the area
+
     ### PUT & PATCH
 
     Edit specified layer
@@ -72,9 +128,14 @@ class LayerNodesList(ListSerializerMixin, NodeList):
 
     Parameters:
 
-     * `search=<word>`: search <word> in name of nodes of specified layer
+     * `search=<words>`: full text search of <words> in name, slug, address and description of nodes (most relevant first)
+     * `bbox=<minx>,<miny>,<maxx>,<maxy>`: retrieve only nodes whose bounding box overlaps the specified one
+       (nodes which are not points may be partly outside of it)
+     * `simplify=<tolerance>` or `simplify=true&zoom=<n>`: simplify geometries with the specified tolerance (degrees) or for the specified zoom level
+     * `precision=<n>`: number of decimal digits of coordinates
      * `limit=<n>`: specify number of items per page (defaults to 40)
      * `layerinfo`: true shows layer description and other info, false doesn't (defaults to true)
+     * `format=msgpack`: same data encoded with MessagePack
     """
     layer = None
     layer_info_default = True  # show layer info by default
@@ -93,6 +154,12 @@ class LayerNodesList(ListSerializerMixin, NodeList):
         self.get_layer()
         return super(LayerNodesList, self).get_queryset().filter(layer_id=self.layer.id)
 
+    def get_validators(self):
+        """ the layer is part of the response too, validators must change when the layer changes """
+        etag, last_modified = super(LayerNodesList, self).get_validators()
+        etag = '"%s"' % hashlib.md5('%s:%s' % (etag, self.layer.updated)).hexdigest()
+        return etag, max(last_modified, self.layer.updated) if last_modified else self.layer.updated
+
     def get_nodes(self, request, *args, **kwargs):
         """ this method might be overridden by other modules (eg: nodeshot.interop.sync) """
         # ListSerializerMixin.list returns a serializer object
@@ -124,40 +191,172 @@ class LayerNodesList(ListSerializerMixin, NodeList):
 nodes_list = LayerNodesList.as_view()
 
 
-class LayerNodesGeoJSONList(LayerNodesList):
+class LayerNodesGeoJSONList(NodeClusterMixin, LayerNodesList):
     """
     Retrieve list of nodes of the specified layer in GeoJSON format.
 
     Parameters:
 
-     * `search=<word>`: search <word> in name, slug, description and address of nodes
+     * `search=<words>`: full text search of <words> in name, slug, address and description of nodes (most relevant first)
+     * `bbox=<minx>,<miny>,<maxx>,<maxy>`: retrieve only nodes whose bounding box overlaps the specified one
+       (nodes which are not points may be partly outside of it)
+     * `simplify=<tolerance>` or `simplify=true&zoom=<n>`: simplify geometries with the specified tolerance (degrees) or for the specified zoom level
+     * `precision=<n>`: number of decimal digits of coordinates
+     * `cluster=true&zoom=<n>`: group nodes in clusters suitable for the specified zoom level
+     * `stream=true`: stream the FeatureCollection instead of building it in memory (ignores `layerinfo`)
+     * `snapshot=true`: serve the precomputed snapshot of the FeatureCollection if snapshots are enabled (ignores `layerinfo`)
      * `limit=<n>`: specify number of items per page (defaults to 40)
      * `layerinfo`: true shows layer description and other info, false doesn't (defaults to false)
+     * `format=msgpack` or `format=geobuf`: same data encoded with MessagePack or Geobuf (geobuf ignores `layerinfo`, `stream` and `snapshot`)
     """
     serializer_class = NodeGeoSerializer
+    fast_serializer_class = FastNodeGeoSerializer
+    cursor_pagination_serializer_class = GeoJSONCursorPaginationSerializer
     paginate_by = 0
     layer_info_default = False  # don't show layer info by default
+    geobuf = True
+
+    @property
+    def cluster_scope(self):
+        return self.layer.id
+
+    def snapshot_requested(self):
+        """
+        snapshots are served only if enabled and explicitly requested (and geometries are not simplified);
+        external layers are excluded since their nodes might be retrieved from external sources
+        """
+        self.get_layer()
+        return (self.request.QUERY_PARAMS.get('snapshot', 'false') == 'true' and
+                snapshots_enabled() and not self.layer.is_external and
+                self.get_geojson_options().is_default and
+                self.request.accepted_renderer.format == 'json')
+
+    def get_validators(self):
+        """ snapshots are validated by their own ETag, which changes only when they're rebuilt """
+        if self.snapshot_requested():
+            return None
+        return super(LayerNodesGeoJSONList, self).get_validators()
+
+    def get_nodes_stream(self):
+        """
+        returns a generator which yields the FeatureCollection of the nodes a chunk at a time
+        or None if streaming is not possible; might be overridden by other modules (eg: nodeshot.interop.sync)
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        return stream_feature_collection(serializer.values(queryset), serializer)
 
     def get(self, request, *args, **kwargs):
         """ Retrieve list of nodes of the specified layer in GeoJSON format. """
-        # overwritten just to tweak the docstring for auto documentation purposes
+        self.get_layer()
+
+        zoom = self.get_cluster_zoom()
+        if zoom is not None:
+            return Response(self.get_clusters(zoom))
+
+        if self.snapshot_requested():
+            response = snapshot_response(request, 'layer_nodes', self.layer.id)
+            if response is not None:
+                return response
+
+        if request.QUERY_PARAMS.get('stream', 'false') == 'true' and request.accepted_renderer.format == 'json':
+            stream = self.get_nodes_stream()
+            if stream is not None:
+                return StreamingHttpResponse(stream, content_type='application/json')
+
         return super(LayerNodesGeoJSONList, self).get(request, *args, **kwargs)
 
 nodes_geojson_list = LayerNodesGeoJSONList.as_view()
 
 
-class LayerGeoJSONList(generics.ListAPIView):
+class LayerNodesBulk(generics.GenericAPIView):
+    """
+    ### POST
+
+    Create or update many nodes of the specified layer at once. Requires authentication.
+
+    Accepts a GeoJSON `FeatureCollection`: the `properties` of each feature
+    may contain `name`, `slug`, `status` (slug of the status), `elev`, `address`,
+    `description`, `access_level`, `is_published` and `data`
+    (`status`, `access_level` and `is_published` can be set only by admins and mantainers of the layer).
+    External layers can't be imported into, since they are synchronized.
+    Features whose slug (or slugified name) matches an existing node of the layer
+    update that node (only owners and admins can update nodes), the others create new nodes.
+
+    All the features are validated before writing anything: if any feature is not valid
+    no node is written and the response status is 400. The response contains the result
+    of each feature (`created`, `updated` or `error` with the validation errors).
+    """
+    authentication_classes = (authentication.SessionAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        """ import the nodes of a FeatureCollection """
+        layer = get_object_or_404(Layer.objects.published().filter(is_external=False), slug=kwargs['slug'])
+
+        importer = BulkNodeImport(layer, request.user)
+        report = importer.load(request.DATA)
+
+        if not importer.is_valid:
+            return Response({ 'features': report }, status=400)
+
+        importer.save()
+        return Response({
+            'created': len(importer.created),
+            'updated': len(importer.updated),
+            'features': report
+        }, status=201)
+
+nodes_bulk = LayerNodesBulk.as_view()
+
+
+class LayerNodesTile(generics.GenericAPIView):
+    """
+    Retrieve the nodes of the specified layer contained in tile `z/x/y`
+    encoded as a [Mapbox Vector Tile](https://github.com/mapbox/vector-tile-spec).
+
+    Tiles contain a layer named `nodes`, each feature has the `slug`,
+    `name` and `status` properties. Tiles are cached and invalidated
+    when nodes change.
+    """
+    authentication_classes = (authentication.SessionAuthentication,)
+
+    def get(self, request, *args, **kwargs):
+        """ Retrieve vector tile of the nodes of the specified layer """
+        try:
+            layer = Layer.objects.get(slug=kwargs['slug'])
+        except Layer.DoesNotExist:
+            raise Http404(_('Layer not found'))
+
+        z, x, y = int(kwargs['z']), int(kwargs['x']), int(kwargs['y'])
+        if not tile_is_valid(z, x, y):
+            raise Http404(_('Tile not found'))
+
+        queryset = Node.objects.published()\
+                               .accessible_to(request.user)\
+                               .filter(layer_id=layer.id)
+        tile = get_tile(queryset, layer.id, get_group_name(request.user), z, x, y)
+        return HttpResponse(tile, content_type=MVT_CONTENT_TYPE)
+
+nodes_tile = LayerNodesTile.as_view()
+
+
+class LayerGeoJSONList(ConditionalGetMixin, LayerAreaMixin, CompactRenderersMixin, generics.ListAPIView):
     """
     Retrieve list of layers in GeoJSON format.
     Parameters:
 
+     * `simplify=<tolerance>` or `simplify=true&zoom=<n>`: simplify areas with the specified tolerance (degrees) or for the specified zoom level
+     * `precision=<n>`: number of decimal digits of the coordinates of areas
      * `limit=<n>`: specify number of items per page (defaults to 40)
      * `page=<n>`: show page n
+     * `format=msgpack` or `format=geobuf`: same data encoded with MessagePack or Geobuf
     """
     pagination_serializer_class = PaginatedGeojsonLayerListSerializer
     paginate_by_param = 'limit'
     paginate_by = 40
     serializer_class = GeoLayerListSerializer
+    geobuf = True
     queryset = Layer.objects.published().exclude(area__isnull=True)
 
 layers_geojson_list = LayerGeoJSONList.as_view()
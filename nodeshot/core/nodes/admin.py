@@ -6,6 +6,7 @@ from nodeshot.core.base.widgets import AdvancedFileInput
 
 from .settings import settings, REVERSION_ENABLED, DESCRIPTION_HTML
 from .models import *
+from .search import search_nodes
 
 
 # enable django-reversion according to settings
@@ -66,6 +67,12 @@ class NodeAdmin(PublishActionsAdminMixin, GeoAdmin):
     def queryset(self, request):
         return super(NodeAdmin, self).queryset(request).select_related('user', 'layer', 'status')
 
+    def get_search_results(self, request, queryset, search_term):
+        """ full text search instead of search_fields """
+        if not search_term:
+            return queryset, False
+        return search_nodes(queryset, search_term), False
+
     if DESCRIPTION_HTML:
         # enable editor for "node description" only
         html_editor_fields = ['description']
@@ -81,3 +88,17 @@ class StatusAdmin(admin.ModelAdmin):
 
 admin.site.register(Node, NodeAdmin)
 admin.site.register(Status, StatusAdmin)
+
+
+if 'grappelli' in settings.INSTALLED_APPS:
+    from grappelli.views.related import AutocompleteLookup
+
+    class NodeAutocompleteLookup(AutocompleteLookup):
+        """
+        grappelli autocomplete lookup which uses full text search for nodes
+        (Node.autocomplete_search_fields is not used), other models are not affected
+        """
+        def get_searched_queryset(self, qs):
+            if self.model is Node:
+                return search_nodes(qs, self.GET['term'])
+            return super(NodeAutocompleteLookup, self).get_searched_queryset(qs)
@@ -0,0 +1,190 @@
+"""
+Incremental change feed of nodes
+
+Nodes added or updated after a point in time are read in (updated, id) order,
+deleted nodes are read from their tombstones (see NodeDeletion) in (deleted, id) order;
+both orders are backed by an index, therefore a page of changes costs the same
+regardless of the size of the history.
+
+Rows are written with timestamps taken before their transaction commits,
+therefore only the changes older than the start of the oldest transaction which
+is still running (minus NODESHOT_NODES_CHANGES_SAFETY_MARGIN seconds) are returned:
+more recent changes might still become visible with older timestamps.
+Tombstones are kept for NODESHOT_NODES_DELETIONS_RETENTION days (see the
+purge_node_deletions command), older positions can't be used.
+
+The two streams are merged by time in a single list of changes (tombstones first
+when times are equal: a node moved to another layer has a tombstone in the previous
+layer with the same time of the update); the position reached in each stream is
+encoded in an opaque token which is used to retrieve the following changes.
+"""
+import base64
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import ParseError
+
+from nodeshot.core.base.pagination import keyset_filter
+from nodeshot.core.base.utils import now, ago
+
+from .models import Node, NodeDeletion
+from .serializers import FastNodeListSerializer
+from .settings import CHANGES_SAFETY_MARGIN, DELETIONS_RETENTION
+
+
+__all__ = [
+    'encode_changes_token',
+    'decode_changes_token',
+    'parse_since',
+    'get_horizon',
+    'get_changes',
+]
+
+
+NODE_FIELDS = ('updated', 'id')
+DELETION_FIELDS = ('deleted', 'id')
+
+
+def encode_changes_token(node_position, deletion_position):
+    """ returns an opaque token which points after the specified positions of the two streams """
+    data = json.dumps({
+        'n': [value.isoformat() if hasattr(value, 'isoformat') else value for value in node_position],
+        'd': [value.isoformat() if hasattr(value, 'isoformat') else value for value in deletion_position]
+    })
+    return base64.urlsafe_b64encode(data)
+
+
+def decode_changes_token(token):
+    """ returns the positions of the two streams encoded in token """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(str(token)))
+        node_position = [Node._meta.get_field(field).to_python(value)
+                         for field, value in zip(NODE_FIELDS, data['n'])]
+        deletion_position = [NodeDeletion._meta.get_field(field).to_python(value)
+                             for field, value in zip(DELETION_FIELDS, data['d'])]
+        assert len(node_position) == len(deletion_position) == 2
+    except Exception:
+        raise ParseError(_('invalid token'))
+
+    return node_position, deletion_position
+
+
+def parse_since(since):
+    """
+    returns the positions of the two streams corresponding to since,
+    which is either an ISO 8601 timestamp or a token returned by get_changes
+    """
+    if not since:
+        raise ParseError(_('the since parameter is required'))
+
+    # "+" of timezone offsets if it wasn't encoded (tokens never contain spaces)
+    since = since.replace(' ', '+')
+
+    try:
+        timestamp = parse_datetime(since)
+    except ValueError:
+        raise ParseError(_('invalid timestamp'))
+
+    if timestamp is None:
+        node_position, deletion_position = decode_changes_token(since)
+    else:
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, timezone.get_default_timezone())
+        node_position, deletion_position = [timestamp, 0], [timestamp, 0]
+
+    # tombstones of the deletions which happened after since might have been purged
+    if deletion_position[0] < ago(days=DELETIONS_RETENTION):
+        raise ParseError(_('since is older than %d days, all the nodes must be retrieved again') % DELETIONS_RETENTION)
+
+    return node_position, deletion_position
+
+
+def get_horizon():
+    """
+    returns the time before which all the changes are visible: the start
+    of the oldest transaction which is still running in the database (other than
+    the current one) or the current time, minus NODESHOT_NODES_CHANGES_SAFETY_MARGIN seconds
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT min(pg_stat_get_backend_xact_start(backend.id))
+        FROM pg_stat_get_backend_idset() AS backend(id)
+        WHERE pg_stat_get_backend_pid(backend.id) <> pg_backend_pid()
+        AND pg_stat_get_backend_dbid(backend.id) = (SELECT oid FROM pg_database WHERE datname = current_database())
+    """)
+    oldest = cursor.fetchone()[0]
+    horizon = now()
+    if oldest is not None and oldest < horizon:
+        horizon = oldest
+    return horizon - timedelta(seconds=CHANGES_SAFETY_MARGIN)
+
+
+def get_changes(user, node_position, deletion_position, limit, layer_id=None, context=None):
+    """
+    returns a tuple containing:
+        * the first "limit" changes after the specified positions, ordered by time
+        * the token which points after the last of these changes
+        * whether there are more changes
+
+    Nodes updated in the meantime are returned with their current data,
+    nodes which have been unpublished are returned as deleted, as well as
+    nodes which have been moved to another layer or whose access level has been raised
+    (for the clients of the previous layer or access level).
+    Changes of nodes which the user can't access are not returned,
+    as well as the changes more recent than get_horizon().
+    """
+    horizon = get_horizon()
+    nodes = Node.objects.accessible_to(user).filter(updated__lt=horizon)
+    deletions = NodeDeletion.objects.accessible_to(user).filter(deleted__lt=horizon)
+
+    if layer_id is not None:
+        nodes = nodes.filter(layer_id=layer_id)
+        deletions = deletions.filter(layer_id=layer_id)
+
+    updated = nodes.filter(keyset_filter(NODE_FIELDS, node_position, 'gt'))\
+                   .order_by(*NODE_FIELDS)\
+                   .values_list('updated', 'id', 'slug', 'is_published')[:limit + 1]
+    deleted = deletions.filter(keyset_filter(DELETION_FIELDS, deletion_position, 'gt'))\
+                       .order_by(*DELETION_FIELDS)\
+                       .values_list('deleted', 'id', 'slug')[:limit + 1]
+
+    # merge the two streams by time, deletions first
+    events = [(row[0], 1, row) for row in updated] + [(row[0], 0, row) for row in deleted]
+    events.sort(key=lambda event: event[:2] + (event[2][1],))
+    more = len(events) > limit
+    events = events[:limit]
+
+    # current data of the published nodes
+    node_ids = [row[1] for time, stream, row in events if stream == 1 and row[3]]
+    serializer = FastNodeListSerializer(context=context)
+    data = {}
+    if node_ids:
+        for row in serializer.values(Node.objects.filter(id__in=node_ids)):
+            data[row['id']] = serializer.to_native(row)
+
+    changes = []
+
+    for time, stream, row in events:
+        if stream == 1:
+            node_position = row[:2]
+            if row[1] in data:
+                changes.append({ 'type': 'updated', 'slug': row[2], 'time': time, 'node': data[row[1]] })
+                continue
+        else:
+            deletion_position = row[:2]
+        changes.append({ 'type': 'deleted', 'slug': row[2], 'time': time })
+
+    # all the changes before the horizon have been returned: the next changes can only be
+    # more recent (this keeps tokens of clients which poll periodically within the retention)
+    if not more:
+        if node_position[0] < horizon:
+            node_position = [horizon, 0]
+        if deletion_position[0] < horizon:
+            deletion_position = [horizon, 0]
+
+    return changes, encode_changes_token(node_position, deletion_position), more
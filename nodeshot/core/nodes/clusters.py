@@ -0,0 +1,105 @@
+"""
+Server side clustering of nodes
+
+Nodes are grouped in the database by snapping their centroid to a grid
+whose cell size depends on the zoom level, each cell becomes a single
+GeoJSON feature with the number of nodes it contains, their centroid
+and the most frequent status.
+"""
+from django.db import connection
+from django.core.cache import cache
+
+from nodeshot.core.base.cache import cache_delete_pattern_or_all
+
+from .settings import CLUSTER_CELL_SIZE, CLUSTER_CACHE_TIMEOUT
+from .registry import get_status
+
+
+__all__ = [
+    'cluster_cell_size',
+    'cluster_cache_key',
+    'cluster_nodes',
+    'get_clusters',
+    'invalidate_clusters',
+]
+
+
+CLUSTER_SQL = """
+SELECT x, y, status_id, COUNT(*), ST_X(ST_Centroid(ST_Collect(point))), ST_Y(ST_Centroid(ST_Collect(point)))
+FROM (
+    SELECT ST_X(ST_SnapToGrid(point, %%s)) AS x, ST_Y(ST_SnapToGrid(point, %%s)) AS y, point, status_id
+    FROM (SELECT ST_Centroid(geometry) AS point, status_id FROM (%s) AS nodes) AS centroids
+) AS cells
+GROUP BY x, y, status_id
+"""
+
+
+def cluster_cell_size(zoom):
+    """ size in degrees of the side of a cluster cell at the specified zoom level (256 pixels tiles) """
+    return 360.0 / (256 * 2 ** zoom) * CLUSTER_CELL_SIZE
+
+
+def cluster_cache_key(scope, group, zoom):
+    """
+    "node_clusters:{scope}:{group}:{zoom}", eg: "node_clusters:1:public:8"
+    scope is either the id of a layer or "all"
+    """
+    return 'node_clusters:%s:%s:%d' % (scope, group, zoom)
+
+
+def cluster_nodes(queryset, zoom):
+    """
+    Groups the nodes of queryset in grid cells with one query
+    and returns a GeoJSON FeatureCollection of clusters
+    """
+    size = cluster_cell_size(zoom)
+    inner_sql, inner_params = queryset.values('geometry', 'status_id').query.sql_with_params()
+    cursor = connection.cursor()
+    cursor.execute(CLUSTER_SQL % inner_sql, [size, size] + list(inner_params))
+
+    cells = {}
+    for x, y, status_id, count, centroid_x, centroid_y in cursor.fetchall():
+        cell = cells.setdefault((x, y), { 'count': 0, 'x': 0.0, 'y': 0.0, 'statuses': {} })
+        cell['count'] += count
+        # centroid of the cell is the weighted average of the centroids of each status group
+        cell['x'] += centroid_x * count
+        cell['y'] += centroid_y * count
+        cell['statuses'][status_id] = count
+
+    features = []
+
+    for key in sorted(cells):
+        cell = cells[key]
+        dominant_status = max(cell['statuses'], key=cell['statuses'].get)
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [cell['x'] / cell['count'], cell['y'] / cell['count']]
+            },
+            'properties': {
+                'count': cell['count'],
+                'status': getattr(get_status(dominant_status), 'slug', None)
+            }
+        })
+
+    return { 'type': 'FeatureCollection', 'features': features }
+
+
+def get_clusters(queryset, zoom, cache_key=None):
+    """ returns cached clusters if cache_key is specified, otherwise calculates them """
+    if cache_key is None:
+        return cluster_nodes(queryset, zoom)
+
+    clusters = cache.get(cache_key)
+
+    if clusters is None:
+        clusters = cluster_nodes(queryset, zoom)
+        cache.set(cache_key, clusters, CLUSTER_CACHE_TIMEOUT)
+
+    return clusters
+
+
+def invalidate_clusters(scope='*'):
+    """ drops cached clusters of the specified scope, all of them by default """
+    cache_delete_pattern_or_all('node_clusters:%s:*' % scope)
@@ -0,0 +1,61 @@
+from time import time
+
+from django.core.management.base import BaseCommand
+
+from nodeshot.core.nodes.models import Node, Image
+
+from optparse import make_option
+
+
+class Command(BaseCommand):
+    help = 'Measure the time needed to instantiate models which extend BaseAccessLevel ' \
+           'when the access level settings are resolved for every instance (as it used to be) ' \
+           'and once for each model (current behaviour)'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--instances',
+            action='store',
+            dest='instances',
+            type='int',
+            default=50000,
+            help='Number of instances of each model to create (defaults to 50000)'
+        ),
+        make_option(
+            '--repeat',
+            action='store',
+            dest='repeat',
+            type='int',
+            default=3,
+            help='Number of times each measurement is run, the best time is shown (defaults to 3)'
+        ),
+    )
+
+    def output(self, message):
+        self.stdout.write('%s\n\r' % message)
+
+    def benchmark(self, model, instances, repeat, per_instance_options):
+        """ returns the best time needed to instantiate model the specified number of times """
+        best = None
+        for i in range(repeat):
+            start = time()
+            for n in xrange(instances):
+                # what BaseAccessLevel.__init__ used to do
+                if per_instance_options:
+                    model.set_access_level_options()
+                model(id=n, access_level=0)
+            elapsed = time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        """ run benchmark """
+        instances = options['instances']
+        self.output('instantiating %d objects of each model, best of %d runs:' % (instances, options['repeat']))
+
+        for model in [Node, Image]:
+            before = self.benchmark(model, instances, options['repeat'], per_instance_options=True)
+            after = self.benchmark(model, instances, options['repeat'], per_instance_options=False)
+            self.output('%s: %.3f seconds before, %.3f seconds after (%.2f microseconds saved per instance)' % (
+                model.__name__, before, after, (before - after) / instances * 1000000
+            ))
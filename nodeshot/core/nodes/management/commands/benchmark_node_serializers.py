@@ -0,0 +1,104 @@
+import random
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.test.client import RequestFactory
+
+from rest_framework.renderers import JSONRenderer
+
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.serializers import NodeGeoSerializer, FastNodeGeoSerializer
+
+from optparse import make_option
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the time needed by NodeGeoSerializer and FastNodeGeoSerializer ' \
+           'to render the GeoJSON of all the nodes'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--nodes',
+            action='store',
+            dest='nodes',
+            type='int',
+            default=50000,
+            help='Number of nodes to serialize, missing nodes are created\n\
+                 and deleted at the end of the benchmark (defaults to 50000)'
+        ),
+        make_option(
+            '--repeat',
+            action='store',
+            dest='repeat',
+            type='int',
+            default=3,
+            help='Number of times each serializer is run, the best time is shown (defaults to 3)'
+        ),
+    )
+
+    def output(self, message):
+        self.stdout.write('%s\n\r' % message)
+
+    def create_nodes(self, count):
+        """ creates count nodes with random points, cloning the first node """
+        template = Node.objects.first()
+        if template is None:
+            raise CommandError('at least one node is needed to run the benchmark')
+
+        nodes = []
+        for i in range(count):
+            nodes.append(Node(
+                name='benchmark node %d' % i,
+                slug='benchmark-node-%d' % i,
+                layer_id=template.layer_id,
+                status_id=template.status_id,
+                user_id=template.user_id,
+                is_published=True,
+                access_level=0,
+                geometry=Point(random.uniform(-180, 180), random.uniform(-85, 85)),
+                address=template.address,
+                description=template.description
+            ))
+        Node.objects.bulk_create(nodes, batch_size=1000)
+
+    def benchmark(self, serializer_class, queryset, context, repeat):
+        """ returns best time and length of the rendered output """
+        best = None
+        for i in range(repeat):
+            start = time()
+            content = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+            elapsed = time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(content)
+
+    def handle(self, *args, **options):
+        """ run benchmark """
+        context = { 'request': RequestFactory().get('/') }
+
+        try:
+            with transaction.atomic():
+                missing = options['nodes'] - Node.objects.count()
+                if missing > 0:
+                    self.output('creating %d temporary nodes...' % missing)
+                    self.create_nodes(missing)
+
+                queryset = Node.objects.select_related('layer', 'status', 'user').order_by('pk')[:options['nodes']]
+                self.output('serializing %d nodes, best of %d runs:' % (queryset.count(), options['repeat']))
+
+                regular, regular_length = self.benchmark(NodeGeoSerializer, queryset, context, options['repeat'])
+                self.output('NodeGeoSerializer:     %.3f seconds (%d bytes)' % (regular, regular_length))
+
+                fast, fast_length = self.benchmark(FastNodeGeoSerializer, queryset, context, options['repeat'])
+                self.output('FastNodeGeoSerializer: %.3f seconds (%d bytes)' % (fast, fast_length))
+                self.output('speedup: %.1fx' % (regular / fast))
+
+                # temporary nodes are discarded
+                raise Rollback()
+        except Rollback:
+            pass
@@ -0,0 +1,134 @@
+import gzip
+import json
+import random
+from cStringIO import StringIO
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.test.client import RequestFactory
+
+from rest_framework.renderers import JSONRenderer
+
+from nodeshot.core.base.renderers import MessagePackRenderer, GeobufRenderer, msgpack, geobuf
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.serializers import FastNodeGeoSerializer
+
+from optparse import make_option
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare size and decoding time of the GeoJSON of nodes rendered in JSON, MessagePack and Geobuf'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--nodes',
+            action='append',
+            dest='nodes',
+            type='int',
+            help='Number of nodes to render, can be repeated (defaults to 10000 and 100000);\n\
+                 missing nodes are created and deleted at the end of the benchmark'
+        ),
+        make_option(
+            '--repeat',
+            action='store',
+            dest='repeat',
+            type='int',
+            default=3,
+            help='Number of times each output is decoded, the best time is shown (defaults to 3)'
+        ),
+    )
+
+    def output(self, message):
+        self.stdout.write('%s\n\r' % message)
+
+    def create_nodes(self, count):
+        """
+        creates count nodes with random points (with the 7 decimal digits of GPS coordinates),
+        cloning the first node
+        """
+        template = Node.objects.first()
+        if template is None:
+            raise CommandError('at least one node is needed to run the benchmark')
+
+        nodes = []
+        for i in range(count):
+            nodes.append(Node(
+                name='benchmark node %d' % i,
+                slug='benchmark-node-%d' % i,
+                layer_id=template.layer_id,
+                status_id=template.status_id,
+                user_id=template.user_id,
+                is_published=True,
+                access_level=0,
+                geometry=Point(round(random.uniform(-180, 180), 7), round(random.uniform(-85, 85), 7)),
+                address=template.address,
+                description=template.description
+            ))
+        Node.objects.bulk_create(nodes, batch_size=1000)
+
+    def gzipped_length(self, content):
+        buffer = StringIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) as f:
+            f.write(content)
+        return len(buffer.getvalue())
+
+    def benchmark(self, name, renderer, decode, data, repeat):
+        """ renders data and outputs size, gzipped size, rendering time and best decoding time """
+        start = time()
+        try:
+            content = renderer.render(data)
+        except ValueError as e:
+            # geobuf: coordinates which can't be encoded exactly
+            self.output('%-8s %s' % (name, e))
+            return
+        rendering = time() - start
+
+        best = None
+        for i in range(repeat):
+            start = time()
+            decode(content)
+            elapsed = time() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        self.output('%-8s %12d %12d %12.3f %12.3f' % (name, len(content), self.gzipped_length(content), rendering, best))
+
+    def handle(self, *args, **options):
+        """ run benchmark """
+        counts = options['nodes'] or [10000, 100000]
+        context = { 'request': RequestFactory().get('/') }
+        renderers = [('json', JSONRenderer(), json.loads)]
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer(), msgpack.unpackb))
+        else:
+            self.output('msgpack is not installed, skipping MessagePack')
+        if geobuf is not None:
+            renderers.append(('geobuf', GeobufRenderer(), geobuf.decode))
+        else:
+            self.output('geobuf is not installed, skipping Geobuf')
+
+        try:
+            with transaction.atomic():
+                missing = max(counts) - Node.objects.count()
+                if missing > 0:
+                    self.output('creating %d temporary nodes...' % missing)
+                    self.create_nodes(missing)
+
+                for count in counts:
+                    queryset = Node.objects.select_related('layer', 'status', 'user').order_by('pk')[:count]
+                    data = FastNodeGeoSerializer(queryset, many=True, context=context).data
+
+                    self.output('\n%d nodes, best decoding time of %d runs:' % (len(data['features']), options['repeat']))
+                    self.output('%-8s %12s %12s %12s %12s' % ('format', 'bytes', 'gzip bytes', 'render (s)', 'decode (s)'))
+                    for name, renderer, decode in renderers:
+                        self.benchmark(name, renderer, decode, data, options['repeat'])
+
+                # temporary nodes are discarded
+                raise Rollback()
+        except Rollback:
+            pass
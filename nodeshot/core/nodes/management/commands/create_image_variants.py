@@ -0,0 +1,70 @@
+from multiprocessing import Pool, cpu_count
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from nodeshot.core.nodes.models import Image
+from nodeshot.core.nodes.tasks import create_image_variants
+
+from optparse import make_option
+
+
+def process_image(pk):
+    """ runs in the worker processes, returns True if the variants have been created """
+    return create_image_variants(pk)
+
+
+class Command(BaseCommand):
+    help = 'Create the resized variants of the images which have been uploaded before ' \
+           'variants were introduced or whose variants could not be created'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--processes',
+            action='store',
+            dest='processes',
+            type='int',
+            default=cpu_count(),
+            help='Number of images processed in parallel (defaults to the number of CPUs)'
+        ),
+        make_option(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help='Create again the variants of all the images (eg: after changing NODESHOT_NODES_IMAGE_VARIANTS)'
+        ),
+    )
+
+    def output(self, message):
+        self.stdout.write('%s\n\r' % message)
+
+    def handle(self, *args, **options):
+        """ create variants """
+        if options['processes'] < 1:
+            raise CommandError('processes must be a positive number')
+
+        queryset = Image.objects.exclude(file='')
+        if not options['all']:
+            queryset = queryset.filter(variants_ready=False)
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+        self.output('processing %d images with %d processes...' % (len(ids), options['processes']))
+
+        start = time()
+        if options['processes'] == 1:
+            results = [process_image(pk) for pk in ids]
+        else:
+            # each worker opens its own database connection
+            connection.close()
+            pool = Pool(options['processes'])
+            try:
+                results = pool.map(process_image, ids, chunksize=10)
+            finally:
+                pool.close()
+                pool.join()
+
+        created = len([result for result in results if result])
+        self.output('variants of %d images created in %.2f seconds' % (created, time() - start))
+        if created < len(ids):
+            self.output('%d images could not be processed, see the log for details' % (len(ids) - created))
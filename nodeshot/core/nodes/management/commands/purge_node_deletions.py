@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from nodeshot.core.nodes.models import NodeDeletion
+from nodeshot.core.base.utils import ago
+
+from ...settings import DELETIONS_RETENTION
+
+
+class Command(BaseCommand):
+    help = "Delete the tombstones of nodes (used by the change feed) older than NODESHOT_NODES_DELETIONS_RETENTION days"
+
+    def output(self, message):
+        self.stdout.write('%s\n\r' % message)
+
+    def handle(self, *args, **options):
+        """ Purge tombstones """
+        tombstones = NodeDeletion.objects.filter(deleted__lt=ago(days=DELETIONS_RETENTION))
+        count = tombstones.count()
+
+        if count > 0:
+            tombstones.delete()
+            self.output('%d tombstones deleted successfully.' % count)
+        else:
+            self.output('there are no old tombstones to purge')
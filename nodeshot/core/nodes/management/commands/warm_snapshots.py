@@ -0,0 +1,38 @@
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nodeshot.core.base.snapshots import warm_snapshots, get_snapshot_names
+
+from optparse import make_option
+
+
+class Command(BaseCommand):
+    help = 'Build the precomputed snapshots of all the registered responses ' \
+           '(eg: essential_data of the UI, GeoJSON of the nodes of each layer), useful after deploys'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--name',
+            action='append',
+            dest='names',
+            default=None,
+            help='Build only the snapshots with the specified name (can be repeated)'
+        ),
+    )
+
+    def output(self, message):
+        self.stdout.write('%s\n\r' % message)
+
+    def handle(self, *args, **options):
+        """ build snapshots """
+        names = options['names']
+        for name in names or []:
+            if name not in get_snapshot_names():
+                raise CommandError('snapshot "%s" is not registered, available snapshots are: %s' % (
+                    name, ', '.join(get_snapshot_names())
+                ))
+
+        start = time()
+        count = warm_snapshots(names)
+        self.output('%d snapshots built in %.2f seconds' % (count, time() - start))
@@ -1,22 +1,30 @@
 from .node import Node
 from .image import Image
 from .status import Status
+from .deletion import NodeDeletion
 
 
 __all__ = [
     'Node',
     'Image',
-    'Status'
+    'Status',
+    'NodeDeletion'
 ]
 
 
 # ------ Signals ------ #
 
 
+import sys
+
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete, post_save
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete, post_syncdb
 from django.core.cache import cache
-from ..signals import node_status_changed
+from ..signals import node_status_changed, nodes_bulk_saved
+from ..clusters import invalidate_clusters
+from ..registry import invalidate_status_registry
+from ..search import install_search_vector
+from ..tasks import create_image_variants
 
 
 @receiver(post_save, sender=Status)
@@ -24,6 +32,7 @@ from ..signals import node_status_changed
 @receiver(post_save, sender=Node)
 @receiver(pre_delete, sender=Node)
 @receiver(node_status_changed, sender=Node)
+@receiver(nodes_bulk_saved, sender=Node)
 def clear_cache(sender, **kwargs):
     # clear only cached pages if supported
     if hasattr(cache, 'delete_pattern'):
@@ -31,3 +40,64 @@ def clear_cache(sender, **kwargs):
     # otherwise clear the entire cache
     else:
         cache.clear()
+
+
+@receiver(post_save, sender=Status)
+@receiver(pre_delete, sender=Status)
+def clear_all_clusters(sender, **kwargs):
+    """ the dominant status of each cluster is represented by its slug """
+    invalidate_clusters()
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_delete, sender=Status)
+def clear_status_registry(sender, **kwargs):
+    invalidate_status_registry()
+
+
+@receiver(post_save, sender=Node)
+@receiver(pre_delete, sender=Node)
+def clear_node_clusters(sender, **kwargs):
+    """ clear cached clusters of the whole map and of the layer of the node """
+    invalidate_clusters('all')
+    layer_id = getattr(kwargs['instance'], 'layer_id', None)
+    if layer_id is not None:
+        invalidate_clusters(layer_id)
+
+
+@receiver(pre_delete, sender=Node)
+def log_node_deletion(sender, **kwargs):
+    """ tombstones of deleted nodes are needed by the change feed """
+    NodeDeletion.log(kwargs['instance'])
+
+
+@receiver(pre_save, sender=Node)
+def log_node_visibility_change(sender, **kwargs):
+    """ nodes moved to another layer or with a higher access level are deleted for some clients """
+    node = kwargs['instance']
+    NodeDeletion.log_visibility_changes([node], node.updated)
+
+
+@receiver(nodes_bulk_saved, sender=Node)
+def clear_bulk_node_clusters(sender, **kwargs):
+    """ same as clear_node_clusters, once for all the layers of the nodes """
+    invalidate_clusters('all')
+    for layer_id in set([getattr(node, 'layer_id', None) for node in kwargs['created'] + kwargs['updated']]):
+        if layer_id is not None:
+            invalidate_clusters(layer_id)
+
+
+@receiver(post_save, sender=Image)
+def create_variants_of_new_image(sender, **kwargs):
+    """ resize uploaded images in background """
+    image = kwargs['instance']
+    if kwargs.get('raw') or image.variants_ready or not image.file:
+        return
+    # task will be executed in background unless settings.CELERY_ALWAYS_EAGER is True
+    create_image_variants.delay(image.pk)
+
+
+@receiver(post_syncdb, sender=sys.modules[__name__])
+def create_search_vector(sender, **kwargs):
+    """ full text search column, trigger and index are not managed by the ORM """
+    install_search_vector()
@@ -0,0 +1,69 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from nodeshot.core.base.choices import ACCESS_LEVELS
+from nodeshot.core.base.managers import AccessLevelManager
+from nodeshot.core.base.utils import choicify, now
+
+
+class NodeDeletion(models.Model):
+    """
+    Tombstone of a deleted node, written by the pre_delete receiver
+    of 'Node' and read by the change feed (see nodeshot.core.nodes.changes).
+
+    Tombstones are written also when a node is moved to another layer
+    or its access level is raised (see log_visibility_changes), because
+    the clients which can't see the node anymore must remove it.
+    """
+    node_id = models.IntegerField(_('node id'))
+    slug = models.SlugField(max_length=75, db_index=False)
+    layer_id = models.IntegerField(_('layer id'), blank=True, null=True)
+    access_level = models.SmallIntegerField(_('access level'), choices=choicify(ACCESS_LEVELS), default=0)
+    deleted = models.DateTimeField(_('deleted on'), default=now)
+
+    # manager
+    objects = AccessLevelManager()
+
+    class Meta:
+        db_table = 'nodes_node_deletion'
+        app_label= 'nodes'
+        # order of the change feed
+        index_together = [['deleted', 'id']]
+
+    def __unicode__(self):
+        return self.slug
+
+    @classmethod
+    def log(cls, node):
+        """ records the deletion of node """
+        return cls.objects.create(
+            node_id=node.pk,
+            slug=node.slug,
+            layer_id=getattr(node, 'layer_id', None),
+            access_level=node.access_level
+        )
+
+    @classmethod
+    def log_visibility_changes(cls, nodes, timestamp):
+        """
+        records the previous layer and access level of the nodes which have been
+        moved to another layer or whose access level has been raised;
+        timestamp must not be greater than the "updated" field of the nodes,
+        so that the node is deleted from the previous layer before being updated
+        """
+        tombstones = []
+        for node in nodes:
+            if node._current_visibility is None:
+                continue
+            layer_id, access_level = node._current_visibility
+            if getattr(node, 'layer_id', None) != layer_id or node.access_level > access_level:
+                tombstones.append(cls(
+                    node_id=node.pk,
+                    slug=node.slug,
+                    layer_id=layer_id,
+                    access_level=access_level,
+                    deleted=timestamp
+                ))
+        if tombstones:
+            cls.objects.bulk_create(tombstones)
+        return tombstones
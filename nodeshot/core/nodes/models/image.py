@@ -6,6 +6,8 @@ from django.utils.translation import ugettext_lazy as _
 from nodeshot.core.base.models import BaseOrderedACL
 from nodeshot.core.base.managers import AccessLevelManager
 
+from ..thumbnails import delete_variants
+
 
 class Image(BaseOrderedACL):
     """
@@ -14,6 +16,7 @@ class Image(BaseOrderedACL):
     node = models.ForeignKey('nodes.Node', verbose_name=_('node'))
     file = models.ImageField(upload_to='nodes/', verbose_name=_('image'))
     description = models.CharField(_('description'), max_length=255, blank=True, null=True)
+    variants_ready = models.BooleanField(_('resized variants ready'), default=False, editable=False)
 
     # manager
     objects = AccessLevelManager()
@@ -31,13 +34,25 @@ class Image(BaseOrderedACL):
         """ overriding a BaseOrdered Abstract Model method """
         return self.__class__.objects.filter(node=self.node)
 
+    def save(self, *args, **kwargs):
+        """ variants of a new file are created again, the ones of the replaced file are deleted """
+        if not self.file._committed:
+            self.variants_ready = False
+            if self.pk:
+                old_name = self.__class__.objects.filter(pk=self.pk).values_list('file', flat=True).first()
+                if old_name:
+                    delete_variants(old_name, self.file.storage)
+
+        super(Image, self).save(*args, **kwargs)
+
     def delete(self, *args, **kwargs):
-        """ delete image when an image record is deleted """
+        """ delete image and its variants when an image record is deleted """
         try:
             os.remove(self.file.file.name)
         # image does not exist
         except (OSError, IOError):
             pass
+        delete_variants(self.file.name, self.file.storage)
 
         super(Image, self).delete(*args, **kwargs)
 
@@ -2,6 +2,7 @@ from django.contrib.gis.db import models
 from django.contrib.gis.geos.collections import GeometryCollection
 from django.contrib.gis.geos import GEOSException
 from django.utils.translation import ugettext_lazy as _
+from django.core.exceptions import ValidationError
 from django.template.defaultfilters import slugify
 
 from nodeshot.core.base.models import BaseAccessLevel
@@ -11,6 +12,7 @@ from django_hstore.fields import DictionaryField
 
 from ..settings import settings, PUBLISHED_DEFAULT, HSTORE_SCHEMA
 from ..signals import node_status_changed
+from ..registry import get_status, get_default_status
 from .status import Status
 
 
@@ -56,23 +58,31 @@ class Node(BaseAccessLevel):
     # explained here:
     # http://stackoverflow.com/questions/1355150/django-when-saving-how-can-you-check-if-a-field-has-changed
     _current_status = None
+    # layer and access level when the node was loaded, needed to write
+    # the tombstones of nodes which some clients can't see anymore (see NodeDeletion)
+    _current_visibility = None
 
     # needed for extensible validation
     _additional_validation = []
+    # set based equivalents of additional validation methods (see validate_batch)
+    _additional_batch_validation = {}
 
     class Meta:
         db_table = 'nodes_node'
         app_label= 'nodes'
+        # order of the change feed
+        index_together = [['updated', 'id']]
 
     def __unicode__(self):
         return '%s' % self.name
 
     def __init__(self, *args, **kwargs):
-        """ Fill __current_status """
+        """ Fill __current_status and __current_visibility """
         super(Node, self).__init__(*args, **kwargs)
         # set current status, but only if it is an existing node
         if self.pk:
             self._current_status = self.status_id
+            self._current_visibility = (getattr(self, 'layer_id', None), self.access_level)
 
     def clean(self , *args, **kwargs):
         """ call extensible validation """
@@ -95,10 +105,9 @@ class Node(BaseAccessLevel):
 
         # if no status specified
         if not self.status and not self.status_id:
-            try:
-                self.status = Status.objects.filter(is_default=True)[0]
-            except IndexError:
-                pass
+            default_status = get_default_status()
+            if default_status is not None:
+                self.status = default_status
 
         super(Node, self).save(*args, **kwargs)
 
@@ -109,11 +118,12 @@ class Node(BaseAccessLevel):
             node_status_changed.send(
                 sender=self.__class__,
                 instance=self,
-                old_status=Status.objects.get(pk=self._current_status),
+                old_status=get_status(self._current_status) or Status.objects.get(pk=self._current_status),
                 new_status=self.status
             )
-        # update _current_status
+        # update _current_status and _current_visibility
         self._current_status = self.status_id
+        self._current_visibility = (getattr(self, 'layer_id', None), self.access_level)
 
     def extensible_validation(self):
         """
@@ -126,12 +136,15 @@ class Node(BaseAccessLevel):
             getattr(self, validation_method)()
 
     @classmethod
-    def add_validation_method(class_, method):
+    def add_validation_method(class_, method, batch_method=None):
         """
         Extend validation of Node by adding a function to the _additional_validation list.
         The additional validation function will be called by the clean method
 
         :method function: function to be added to _additional_validation
+        :batch_method function: optional function which performs the same validation
+                                on a list of nodes at once (used by Node.validate_batch),
+                                it must return a dictionary of {index: ValidationError}
         """
         method_name = method.func_name
 
@@ -141,6 +154,40 @@ class Node(BaseAccessLevel):
         # add method to this class
         setattr(class_, method_name, method)
 
+        if batch_method is not None:
+            class_._additional_batch_validation[method_name] = batch_method
+
+    @classmethod
+    def validate_batch(class_, nodes):
+        """
+        Execute the additional validation on a list of nodes which are going to be saved.
+        Validation methods which define a batch equivalent are executed once for all the nodes
+        (eg: one spatial query instead of one query for each node), the others once for each node.
+        Returns a list containing either None or the ValidationError of the node in the same position.
+        Validation of a node stops at the first error, as it happens in Node.clean.
+        """
+        nodes = list(nodes)
+        errors = [None] * len(nodes)
+
+        for method_name in class_._additional_validation:
+            # nodes which are still valid
+            indexes = [i for i, error in enumerate(errors) if error is None]
+            if not indexes:
+                break
+            batch_method = class_._additional_batch_validation.get(method_name)
+            if batch_method is not None:
+                batch_errors = batch_method([nodes[i] for i in indexes])
+                for position, error in batch_errors.items():
+                    errors[indexes[position]] = error
+            else:
+                for i in indexes:
+                    try:
+                        getattr(nodes[i], method_name)()
+                    except ValidationError as e:
+                        errors[i] = e
+
+        return errors
+
     @property
     def owner(self):
         return self.user
@@ -164,6 +211,7 @@ class Node(BaseAccessLevel):
     if 'grappelli' in settings.INSTALLED_APPS:
         @staticmethod
         def autocomplete_search_fields():
+            """ enables grappelli autocomplete, nodes are searched by NodeAutocompleteLookup (full text) """
             return ('name__icontains', 'slug__icontains', 'address__icontains')
 
     # some more properties are added by the layer app
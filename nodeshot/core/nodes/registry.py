@@ -0,0 +1,92 @@
+"""
+Process-local registry of node statuses
+
+Statuses almost never change but are read very often (Node.save, synchronizers,
+open311, clusters), so all of them are kept in memory and looked up
+by primary key, by slug or as the default status without querying the database.
+
+The registry is built lazily; it is rebuilt when a status changes (the version
+stored in NODESHOT_VERSIONS_CACHE changes, which invalidates the registry of every process)
+and anyway after NODESHOT_NODES_STATUS_REGISTRY_TIMEOUT seconds.
+
+Statuses returned by the registry are shared, they must not be modified.
+"""
+from time import time
+
+from nodeshot.core.base.cache import get_version, new_version
+
+from .settings import STATUS_REGISTRY_TIMEOUT
+
+
+__all__ = [
+    'StatusRegistry',
+    'get_status_registry',
+    'invalidate_status_registry',
+    'get_status',
+    'get_status_by_slug',
+    'get_default_status',
+]
+
+
+VERSION_CACHE_KEY = 'nodes_status_registry_version'
+
+
+class StatusRegistry(object):
+    """ statuses indexed by primary key and by slug """
+
+    def __init__(self, statuses):
+        self.created = time()
+        self.statuses = list(statuses)
+        self.by_pk = dict([(status.pk, status) for status in self.statuses])
+        # slugs are looked up case insensitively
+        self.by_slug = dict([(status.slug.lower(), status) for status in self.statuses])
+        defaults = [status for status in self.statuses if status.is_default]
+        self.default = defaults[0] if defaults else None
+
+    def get(self, pk):
+        return self.by_pk.get(pk)
+
+    def get_by_slug(self, slug):
+        return self.by_slug.get(slug.lower()) if isinstance(slug, basestring) else None
+
+    def all(self):
+        """ all the statuses, ordered like Status.objects.all() """
+        return list(self.statuses)
+
+
+_registry = None
+_registry_version = None
+
+
+def get_status_registry():
+    """ returns the status registry of the current process, (re)building it if necessary """
+    global _registry, _registry_version
+    version = get_version(VERSION_CACHE_KEY)
+    registry = _registry
+    if registry is None or version != _registry_version or time() - registry.created > STATUS_REGISTRY_TIMEOUT:
+        from .models import Status
+        registry = StatusRegistry(Status.objects.all())
+        _registry, _registry_version = registry, version
+    return registry
+
+
+def invalidate_status_registry():
+    """ drops the registry of the current process and signals the other processes to rebuild theirs """
+    global _registry
+    _registry = None
+    new_version(VERSION_CACHE_KEY)
+
+
+def get_status(pk):
+    """ status with the specified primary key or None """
+    return get_status_registry().get(pk)
+
+
+def get_status_by_slug(slug):
+    """ status with the specified slug (case insensitive) or None """
+    return get_status_registry().get_by_slug(slug)
+
+
+def get_default_status():
+    """ default status or None """
+    return get_status_registry().default
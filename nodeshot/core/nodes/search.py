@@ -0,0 +1,120 @@
+"""
+Full text search of nodes
+
+The "search_vector" column of "nodes_node" contains the tsvector of the name,
+slug, address and description of each node (in order of importance) and is
+indexed with GIN. The column is maintained by a trigger, therefore it is kept
+up to date on save, on bulk updates (QuerySet.update) and on bulk inserts.
+
+The "simple" text search configuration is used because names and addresses
+of nodes are written in many languages and must not be stemmed.
+"""
+import re
+
+from django.db import connection
+
+from .models import Node
+
+
+__all__ = [
+    'INSTALL_SEARCH_VECTOR_SQL',
+    'UNINSTALL_SEARCH_VECTOR_SQL',
+    'install_search_vector',
+    'search_query',
+    'search_nodes',
+]
+
+
+INSTALL_SEARCH_VECTOR_SQL = [
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'nodes_node' AND column_name = 'search_vector') THEN
+            ALTER TABLE nodes_node ADD COLUMN search_vector tsvector;
+        END IF;
+    END$$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION nodes_node_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.slug, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.address, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    DROP TRIGGER IF EXISTS nodes_node_search_vector_trigger ON nodes_node;
+    CREATE TRIGGER nodes_node_search_vector_trigger BEFORE INSERT OR UPDATE ON nodes_node
+    FOR EACH ROW EXECUTE PROCEDURE nodes_node_search_vector_update();
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'nodes_node_search_vector_id') THEN
+            -- fill the new column (the trigger does the work) and index it
+            UPDATE nodes_node SET search_vector = NULL;
+            CREATE INDEX nodes_node_search_vector_id ON nodes_node USING GIN (search_vector);
+        END IF;
+    END$$;
+    """,
+]
+
+UNINSTALL_SEARCH_VECTOR_SQL = [
+    'DROP TRIGGER IF EXISTS nodes_node_search_vector_trigger ON nodes_node;',
+    'DROP FUNCTION IF EXISTS nodes_node_search_vector_update();',
+    'DROP INDEX IF EXISTS nodes_node_search_vector_id;',
+    'ALTER TABLE nodes_node DROP COLUMN IF EXISTS search_vector;',
+]
+
+
+def install_search_vector(**kwargs):
+    """
+    creates the search_vector column, its trigger and its index if they don't exist yet;
+    connected to post_syncdb, because syncdb (and therefore the test runner) doesn't run migrations
+    """
+    # with south the table might not have been created yet, the migration will install it
+    if Node._meta.db_table not in connection.introspection.table_names():
+        return
+    cursor = connection.cursor()
+    for statement in INSTALL_SEARCH_VECTOR_SQL:
+        cursor.execute(statement)
+
+
+def search_query(text):
+    """
+    converts the text typed by the user in a tsquery which matches
+    nodes containing all the words, the last of which might be incomplete,
+    eg: "fuso rom" -> "fuso:* & rom:*"
+    """
+    words = re.findall(r'\w+', text, re.UNICODE)
+    return ' & '.join(['%s:*' % word for word in words])
+
+
+def search_nodes(queryset, text):
+    """
+    returns the nodes of queryset which match text, most relevant first;
+    queryset is returned unchanged if text is empty or blank
+    """
+    if not text.strip():
+        return queryset
+
+    query = search_query(text)
+
+    if not query:
+        return queryset.none()
+
+    vector = '%s.%s' % (connection.ops.quote_name(Node._meta.db_table), connection.ops.quote_name('search_vector'))
+    tsquery = "to_tsquery('simple', %s)"
+
+    return queryset.extra(
+        select={ 'search_rank': 'ts_rank(%s, %s)' % (vector, tsquery) },
+        select_params=[query],
+        where=['%s @@ %s' % (vector, tsquery)],
+        params=[query],
+        order_by=['-search_rank', 'name']
+    )
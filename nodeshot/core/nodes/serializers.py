@@ -1,10 +1,18 @@
+import json
+
+from django.db import connection
+from django.contrib.gis.geos import GEOSGeometry
+from django.utils.datastructures import SortedDict
+
 from rest_framework import serializers, pagination
 from rest_framework.reverse import reverse
 from rest_framework_gis import serializers as geoserializers
 
 from nodeshot.core.base.serializers import GeoJSONPaginationSerializer
-from .settings import settings, ADDITIONAL_NODE_FIELDS
+from nodeshot.core.base.geojson import GeoJSONOptions
+from .settings import settings, ADDITIONAL_NODE_FIELDS, IMAGE_VARIANTS
 from .base import ExtensibleNodeSerializer
+from .thumbnails import variant_name
 from .models import *
 
 
@@ -13,6 +21,8 @@ __all__ = [
     'NodeCreatorSerializer',
     'NodeDetailSerializer',
     'NodeGeoSerializer',
+    'FastNodeListSerializer',
+    'FastNodeGeoSerializer',
     'PaginatedNodeListSerializer',
     'PaginatedGeojsonNodeListSerializer',
     'ImageListSerializer',
@@ -77,9 +87,129 @@ class NodeGeoSerializer(geoserializers.GeoFeatureModelSerializer, NodeListSerial
     pass
 
 
+class FastNodeListSerializer(serializers.Field):
+    """
+    Read-only fast path of NodeListSerializer which produces the same output:
+    only the needed columns are retrieved with values(), therefore no model
+    instance, related object or field object is involved for each node.
+    Can also be used as object serializer of pagination serializers.
+
+    Geometries are retrieved in (hex) EWKB and encoded in GeoJSON by GDAL exactly like
+    the GeometryField of the regular serializers does, so coordinates are formatted
+    in the same way; when the "geojson_options" of the context simplify geometries
+    or reduce their precision (which the regular serializers don't support)
+    geometries are encoded in GeoJSON by the database (ST_AsGeoJSON) instead.
+    """
+    geojson = False
+    # (output key, column) in the same order of NodeListSerializer.Meta.fields
+    columns = (
+        ('name', 'name'),
+        ('slug', 'slug'),
+        ('layer', 'layer__slug'),
+        ('layer_name', 'layer__name'),
+        ('user', 'user__username'),
+        ('status', 'status__slug'),
+        ('geometry', 'geojson'),
+        ('elev', 'elev'),
+        ('address', 'address'),
+        ('description', 'description'),
+        ('updated', 'updated'),
+        ('added', 'added'),
+        ('details', None)
+    )
+    slug_placeholder = '__slug__'
+
+    def __init__(self, instance=None, many=True, context=None, source=None, **kwargs):
+        super(FastNodeListSerializer, self).__init__(source=source)
+        self.object = instance
+        self.context = context or {}
+        self.geojson_options = self.context.get('geojson_options') or GeoJSONOptions()
+        self._details_url = None
+
+    def values(self, queryset):
+        """
+        returns a values() queryset containing the columns needed by the serializer,
+        the "id" column (needed by nodeshot.core.base.streaming) and the GeoJSON of the geometry
+        (or its EWKB if the "geojson_options" of the context are the default ones);
+        slices (eg: pages) of queryset are preserved
+        """
+        low_mark, high_mark = queryset.query.low_mark, queryset.query.high_mark
+        queryset = queryset.all()
+        queryset.query.clear_limits()
+        geometry = '%s.%s' % (connection.ops.quote_name(Node._meta.db_table),
+                              connection.ops.quote_name('geometry'))
+        if self.geojson_options.is_default:
+            select = "encode(ST_AsEWKB(%s), 'hex')" % geometry
+        else:
+            select = self.geojson_options.as_sql(geometry)
+        fields = ['id'] + [column for key, column in self.columns if column]
+        # extra columns might be needed for ordering (eg: search rank)
+        fields += [name for name in queryset.query.extra if name not in fields]
+        queryset = queryset.extra(select={'geojson': select}).values(*fields)
+        queryset.query.set_limits(low_mark, high_mark)
+        return queryset
+
+    def get_details_url(self, slug):
+        """ same URL of the HyperlinkedIdentityField of NodeListSerializer, reversed only once """
+        if self._details_url is None:
+            self._details_url = reverse('api_node_details',
+                                        kwargs={'slug': self.slug_placeholder},
+                                        request=self.context.get('request', None),
+                                        format=self.context.get('format', None))
+        return self._details_url.replace(self.slug_placeholder, slug)
+
+    def geometry_to_native(self, value):
+        """ same as the GeometryField of rest_framework_gis unless the geometry is already in GeoJSON """
+        if self.geojson_options.is_default:
+            return json.loads(GEOSGeometry(value).geojson)
+        return json.loads(value)
+
+    def to_native(self, row):
+        """ converts a row returned by values() """
+        ret = SortedDict()
+
+        for key, column in self.columns:
+            if key == 'geometry':
+                ret[key] = self.geometry_to_native(row[column])
+            elif key == 'details':
+                ret[key] = self.get_details_url(row['slug'])
+            else:
+                ret[key] = row[column]
+
+        if not self.geojson:
+            return ret
+
+        feature = SortedDict()
+        feature['id'] = ret.pop('slug')
+        feature['type'] = 'Feature'
+        feature['geometry'] = ret.pop('geometry')
+        feature['properties'] = ret
+        return feature
+
+    def serialize(self, queryset):
+        return [self.to_native(row) for row in self.values(queryset)]
+
+    def field_to_native(self, obj, field_name):
+        return self.serialize(getattr(obj, self.source or field_name))
+
+    @property
+    def data(self):
+        data = self.serialize(self.object)
+        if self.geojson:
+            # same structure of GeoFeatureModelSerializer.data
+            data = {'type': 'FeatureCollection', 'features': data}
+        return data
+
+
+class FastNodeGeoSerializer(FastNodeListSerializer):
+    """ read-only fast path of NodeGeoSerializer """
+    geojson = True
+
+
 class ImageListSerializer(serializers.ModelSerializer):
     """ Serializer used to show list """
     file_url = serializers.SerializerMethodField('get_image_file')
+    variants = serializers.SerializerMethodField('get_variants')
     details = serializers.SerializerMethodField('get_uri')
 
     def get_image_file(self, obj):
@@ -91,6 +221,22 @@ class ImageListSerializer(serializers.ModelSerializer):
 
         return url
 
+    def get_variants(self, obj):
+        """
+        returns urls of the resized variants of the image file,
+        the url of the original file is used until variants are created
+        """
+        url = self.get_image_file(obj)
+        if not url:
+            return {}
+        variants = SortedDict()
+        for variant, size in IMAGE_VARIANTS:
+            if obj.variants_ready:
+                variants[variant] = '%s%s' % (settings.MEDIA_URL, variant_name(obj.file.name, variant))
+            else:
+                variants[variant] = url
+        return variants
+
     def get_uri(self, obj):
         """ returns uri of API image resource """
         args = {
@@ -103,7 +249,7 @@ class ImageListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Image
         fields = (
-            'id', 'file', 'file_url', 'description', 'order',
+            'id', 'file', 'file_url', 'variants', 'description', 'order',
             'access_level', 'added', 'updated', 'details'
         )
         read_only_fields = ('added', 'updated')
@@ -114,7 +260,7 @@ class ImageAddSerializer(ImageListSerializer):
     class Meta:
         model = Image
         fields = (
-            'node', 'id', 'file', 'file_url', 'description', 'order',
+            'node', 'id', 'file', 'file_url', 'variants', 'description', 'order',
             'access_level', 'added', 'updated', 'details'
         )
 
@@ -123,7 +269,7 @@ class ImageEditSerializer(ImageListSerializer):
     """ Serializer for image edit """
     class Meta:
         model = Image
-        fields = ('id', 'file_url', 'description', 'order', 'access_level', 'added', 'updated', 'details')
+        fields = ('id', 'file_url', 'variants', 'description', 'order', 'access_level', 'added', 'updated', 'details')
         read_only_fields = ('file', 'added', 'updated')
 
 
@@ -131,14 +277,28 @@ class ImageRelationSerializer(ImageListSerializer):
     """ Serializer to reference images """
     class Meta:
         model = Image
-        fields = ('id', 'file', 'file_url', 'description', 'added', 'updated')
+        fields = ('id', 'file', 'file_url', 'variants', 'description', 'added', 'updated')
+
+
+def get_images(obj, request):
+    """ images of a node which are accessible to the current user """
+    return obj.image_set.accessible_to(request.user).all()
+
+
+def prefetch_images(nodes, request):
+    """ images of many nodes in a single query, returns a dictionary of lists indexed by node pk """
+    images = dict([(node.pk, []) for node in nodes])
+    for image in Image.objects.filter(node__in=images.keys()).accessible_to(request.user):
+        images[image.node_id].append(image)
+    return images
 
 
 ExtensibleNodeSerializer.add_relationship(
     'images',
     serializer=ImageRelationSerializer,
     many=True,
-    queryset='obj.image_set.accessible_to(request.user).all()'
+    queryset=get_images,
+    prefetch=prefetch_images
 )
 
 
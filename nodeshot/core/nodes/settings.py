@@ -4,6 +4,18 @@ PUBLISHED_DEFAULT = getattr(settings, 'NODESHOT_NODES_PUBLISHED_DEFAULT', True)
 HSTORE_SCHEMA = getattr(settings, 'NODESHOT_NODES_HSTORE_SCHEMA', None)
 REVERSION_ENABLED = getattr(settings, 'NODESHOT_NODES_REVERSION_ENABLED', True)
 DESCRIPTION_HTML = getattr(settings, 'NODESHOT_NODES_HTML_DESCRIPTION', True)
+CLUSTER_MAX_ZOOM = getattr(settings, 'NODESHOT_NODES_CLUSTER_MAX_ZOOM', 12)
+CLUSTER_CELL_SIZE = getattr(settings, 'NODESHOT_NODES_CLUSTER_CELL_SIZE', 64)
+CLUSTER_CACHE_TIMEOUT = getattr(settings, 'NODESHOT_NODES_CLUSTER_CACHE_TIMEOUT', 86400)
+STATUS_REGISTRY_TIMEOUT = getattr(settings, 'NODESHOT_NODES_STATUS_REGISTRY_TIMEOUT', 600)
+IMAGE_VARIANTS = getattr(settings, 'NODESHOT_NODES_IMAGE_VARIANTS', (
+    ('thumb', (200, 200)),
+    ('medium', (800, 800)),
+))
+IMAGE_VARIANTS_QUALITY = getattr(settings, 'NODESHOT_NODES_IMAGE_VARIANTS_QUALITY', 85)
+# change feed (see nodeshot.core.nodes.changes)
+CHANGES_SAFETY_MARGIN = getattr(settings, 'NODESHOT_NODES_CHANGES_SAFETY_MARGIN', 60)
+DELETIONS_RETENTION = getattr(settings, 'NODESHOT_NODES_DELETIONS_RETENTION', 90)
 
 
 if HSTORE_SCHEMA:
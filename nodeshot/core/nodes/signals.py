@@ -1,3 +1,5 @@
 import django.dispatch
 
-node_status_changed = django.dispatch.Signal(providing_args=["instance", "old_status", "new_status"])
\ No newline at end of file
+node_status_changed = django.dispatch.Signal(providing_args=["instance", "old_status", "new_status"])
+# sent once by bulk operations (which don't send post_save) with the lists of created and updated nodes
+nodes_bulk_saved = django.dispatch.Signal(providing_args=["created", "updated"])
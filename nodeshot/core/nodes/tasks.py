@@ -0,0 +1,43 @@
+import logging
+
+from celery import task
+
+from django.core import management
+
+from .models import Image
+from .thumbnails import create_variants
+
+
+@task()
+def purge_node_deletions():
+    """
+    deletes old tombstones of nodes
+    """
+    management.call_command('purge_node_deletions')
+
+
+# ------ Asynchronous tasks ------ #
+
+
+@task(bind=True, max_retries=5)
+def create_image_variants(self, image_id):
+    """
+    create the resized variants of an image in background,
+    returns True if variants have been created
+    """
+    try:
+        image = Image.objects.get(pk=image_id)
+    except Image.DoesNotExist as e:
+        # the task is sent by post_save, the transaction which saved the image might not be committed yet;
+        # images which have been deleted in the meanwhile are still missing after the last retry
+        if self.request.called_directly or self.request.retries >= self.max_retries:
+            return False
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+    try:
+        create_variants(image)
+    except IOError as e:
+        logging.getLogger(__name__).warning('could not create variants of image %s: %s' % (image.file.name, e))
+        return False
+    # the file might have been replaced in the meanwhile
+    Image.objects.filter(pk=image.pk, file=image.file.name).update(variants_ready=True)
+    return True
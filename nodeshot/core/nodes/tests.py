@@ -3,23 +3,31 @@ nodeshot.core.nodes unit tests
 """
 
 import os
+import random
 import simplejson as json
 
 from django.test import TestCase
-from django.test.client import Client
+from django.conf import settings
+from django.test.client import Client, RequestFactory
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth.models import AnonymousUser
-from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.gis.geos import GEOSGeometry, Polygon
 from django.contrib.gis.measure import D
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
+from rest_framework import serializers
+
 from nodeshot.core.layers.models import Layer
-from nodeshot.core.base.tests import user_fixtures, BaseTestCase
+from nodeshot.core.base.tests import user_fixtures, query_plan, BaseTestCase
+from nodeshot.core.base.cache import get_group_name, invalidate_group_names
+from nodeshot.core.base.serializers import DynamicRelationshipsMixin
 
 from .models import *
+from .serializers import *
+from .serializers import prefetch_images
 
 
 class ModelsTest(TestCase):
@@ -70,6 +78,55 @@ class ModelsTest(TestCase):
         self.assertEqual(default_statuses.count(), 1)
         self.assertEqual(default_statuses[0].pk, unconfirmed.pk)
 
+    def test_status_registry(self):
+        """ statuses are looked up without queries and the registry is rebuilt when they change """
+        from .registry import get_status_registry, get_status, get_status_by_slug, get_default_status
+        get_status_registry()
+
+        default = Status.objects.get(is_default=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_status(default.pk), default)
+            self.assertEqual(get_status_by_slug(default.slug.upper()), default)
+            self.assertEqual(get_default_status(), default)
+            self.assertIsNone(get_status(0))
+            self.assertIsNone(get_status_by_slug('nonexistent'))
+            self.assertIsNone(get_status_by_slug(None))
+            self.assertEqual(get_status_registry().all(), list(Status.objects.all()))
+
+        # saving a node without status doesn't query the default status
+        node = Node.objects.get(slug='fusolab')
+        node.status = None
+        node.save()
+        self.assertEqual(node.status, default)
+
+        # post_save invalidates the registry
+        testing = Status.objects.create(name='testing', slug='testing', description='testing', is_default=True)
+        self.assertEqual(get_status_by_slug('testing'), testing)
+        self.assertEqual(get_default_status(), testing)
+
+        # post_delete invalidates the registry too
+        testing.delete()
+        self.assertIsNone(get_status_by_slug('testing'))
+
+    def test_status_registry_node_save(self):
+        """ saving a node clears the cache, but the status registry is not rebuilt """
+        from django.core.cache import get_cache
+        from nodeshot.core.base import cache
+        from . import models as node_models
+        from .registry import get_status_registry
+
+        default, versions = node_models.cache, cache.versions_cache
+        # a backend without delete_pattern is cleared completely each time a node is saved
+        node_models.cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='default')
+        cache.versions_cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='versions')
+        try:
+            registry = get_status_registry()
+            Node.objects.get(slug='fusolab').save()
+            with self.assertNumQueries(0):
+                self.assertIs(get_status_registry(), registry)
+        finally:
+            node_models.cache, cache.versions_cache = default, versions
+
     def test_current_status(self):
         """ test that node._current_status is none for new nodes """
         n = Node()
@@ -212,6 +269,60 @@ class ModelsTest(TestCase):
         point = GEOSGeometry("POINT(12.509303756712 41.881163629853)")
         self.assertEqual(node.geometry, point)
 
+    def test_access_level_options(self):
+        """ access level settings are resolved once for each model, not for each instance """
+        from nodeshot.core.base.choices import ACCESS_LEVELS
+        from nodeshot.core.base.models import BaseAccessLevel
+        from nodeshot.core.base.settings import ACL_DEFAULT_VALUE, ACL_DEFAULT_EDITABLE
+
+        self.assertNotIn('__init__', BaseAccessLevel.__dict__)
+
+        for model in [Node, Image]:
+            field = model._meta.get_field('access_level')
+            self.assertEqual(field.default, ACCESS_LEVELS.get(ACL_DEFAULT_VALUE))
+            self.assertEqual(field.editable, ACL_DEFAULT_EDITABLE)
+            self.assertEqual(model().access_level, ACCESS_LEVELS.get(ACL_DEFAULT_VALUE))
+
+    def test_accessible_to_group_name_cache(self):
+        """ the group of a user is retrieved once and forgotten when the group membership changes """
+        from django.contrib.auth.models import Group
+
+        from django.core.cache import get_cache
+        from nodeshot.core.base import cache
+
+        user = User.objects.get(username='registered')
+        trusted = Group.objects.get(name='trusted')
+        # the cache of the test settings is a DummyCache
+        default, versions = cache.cache, cache.versions_cache
+        cache.cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='group-names')
+        cache.versions_cache = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='versions')
+        try:
+            invalidate_group_names()
+
+            with self.assertNumQueries(1):
+                self.assertEqual(get_group_name(user), 'registered')
+            # another request of the same user (shared cache)
+            user = User.objects.get(username='registered')
+            with self.assertNumQueries(0):
+                self.assertEqual(get_group_name(user), 'registered')
+            # only the query of the items
+            with self.assertNumQueries(1):
+                list(Image.objects.accessible_to(user))
+            with self.assertNumQueries(1):
+                list(Node.objects.accessible_to(user))
+
+            # membership changes are seen by other processes (which share the cache, not the user instance)
+            User.objects.get(pk=user.pk).groups.add(trusted)
+            self.assertEqual(get_group_name(User.objects.get(pk=user.pk)), 'trusted')
+            trusted.user_set.remove(user)
+            self.assertEqual(get_group_name(User.objects.get(username='registered')), 'registered')
+            # changes of groups invalidate the group names of all the users
+            key = cache.group_name_cache_key(user.pk)
+            trusted.save()
+            self.assertNotEqual(cache.group_name_cache_key(user.pk), key)
+        finally:
+            cache.cache, cache.versions_cache = default, versions
+
 
 ### ------ API tests ------ ###
 
@@ -265,10 +376,254 @@ class APITest(BaseTestCase):
         response = self.client.get(url, { "search": "Fusolab" })
         self.assertEqual(response.data['count'], 1)
 
+    def test_node_full_text_search(self):
+        url = reverse('api_node_list')
+
+        def search(text):
+            response = self.client.get(url, { "search": text })
+            return [node['slug'] for node in response.data['results']]
+
+        # beginning of words
+        self.assertEqual(search('fuso'), ['fusolab'])
+        # every word must match
+        self.assertEqual(search('potenziale pisa'), ['potenziale-pisano'])
+        # punctuation is ignored
+        self.assertEqual(search("potenziale: 'pisa'"), ['potenziale-pisano'])
+        self.assertEqual(search('!?'), [])
+        # empty search returns all the nodes
+        count = self.client.get(url).data['count']
+        self.assertEqual(self.client.get(url, { "search": "" }).data['count'], count)
+        self.assertEqual(self.client.get(url, { "search": " " }).data['count'], count)
+        # bulk updates keep the search vector up to date, most relevant nodes come first
+        Node.objects.filter(slug='eigenlab').update(description='friends of fusolab')
+        self.assertEqual(search('fusolab'), ['fusolab', 'eigenlab'])
+        # geojson and layer nodes
+        response = self.client.get(reverse('api_node_gejson_list'), { "search": "fuso" })
+        self.assertEqual(response.data['features'][0]['id'], 'fusolab')
+        response = self.client.get(reverse('api_layer_nodes_list', args=['rome']), { "search": "fuso" })
+        self.assertEqual(len(response.data['nodes']['results']), 1)
+
+    def test_node_list_cursor_pagination(self):
+        url = reverse('api_node_list')
+        expected = list(Node.objects.published().access_level_up_to('public').order_by('id').values_list('slug', flat=True))
+
+        # follow next links
+        response = self.client.get(url, { 'cursor': '', 'limit': 3 })
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        pages = [response.data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        slugs = [node['slug'] for page in pages for node in page['results']]
+        self.assertEqual(slugs, expected)
+
+        # follow previous link
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(response.data['results'], pages[-2]['results'])
+
+        # geojson
+        response = self.client.get(reverse('api_node_gejson_list'), { 'cursor': '', 'limit': 3 })
+        self.assertEqual([feature['id'] for feature in response.data['features']], expected[0:3])
+        self.assertIsNotNone(response.data['next'])
+
+        # GET: 400 - invalid cursor
+        response = self.client.get(url, { 'cursor': 'wrong' })
+        self.assertEqual(response.status_code, 400)
+
+    def test_node_list_bbox(self):
+        url = reverse('api_node_list')
+        bbox = Polygon.from_bbox((12.4, 41.6, 12.7, 42.0))
+        rome_public_nodes = Node.objects.published().access_level_up_to('public').filter(geometry__within=bbox)
+
+        # GET: 200
+        response = self.client.get(url, { "bbox": "12.4,41.6,12.7,42.0" })
+        self.assertEqual(response.data['count'], rome_public_nodes.count())
+        slugs = [node['slug'] for node in response.data['results']]
+        self.assertIn('fusolab', slugs)
+        self.assertNotIn('eigenlab', slugs)
+
+        # geojson and layer nodes
+        response = self.client.get(reverse('api_node_gejson_list'), { "bbox": "12.4,41.6,12.7,42.0" })
+        self.assertEqual(len(response.data['features']), rome_public_nodes.count())
+        response = self.client.get(reverse('api_layer_nodes_geojson', args=['rome']), { "bbox": "10.0,43.0,11.0,44.0" })
+        self.assertEqual(len(response.data['features']), 0)
+
+        # GET: 400 - malformed bbox
+        response = self.client.get(url, { "bbox": "12.4,41.6,12.7" })
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(url, { "bbox": "12.7,42.0,12.4,41.6" })
+        self.assertEqual(response.status_code, 400)
+
+    def test_node_bbox_uses_spatial_index(self):
+        bbox = Polygon.from_bbox((12.4, 41.6, 12.7, 42.0))
+        bbox.srid = 4326
+        plan = query_plan(Node.objects.filter(geometry__bboverlaps=bbox))
+        self.assertIn('nodes_node_geometry_id', plan)
+
+    def test_node_geojson_clusters(self):
+        url = reverse('api_node_gejson_list')
+        public_node_count = Node.objects.published().access_level_up_to('public').count()
+
+        # zoom 0: all the nodes are in the same cell
+        response = self.client.get(url, { 'cluster': 'true', 'zoom': 0 })
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(len(response.data['features']), 1)
+        cluster = response.data['features'][0]
+        self.assertEqual(cluster['properties']['count'], public_node_count)
+        self.assertEqual(cluster['properties']['status'], Status.objects.get(pk=3).slug)
+        self.assertEqual(cluster['geometry']['type'], 'Point')
+
+        # zoom 8: nodes of different cities are in different cells
+        response = self.client.get(url, { 'cluster': 'true', 'zoom': 8 })
+        self.assertTrue(len(response.data['features']) > 1)
+        self.assertEqual(sum([f['properties']['count'] for f in response.data['features']]), public_node_count)
+
+        # clusters of a single layer
+        response = self.client.get(reverse('api_layer_nodes_geojson', args=['rome']), { 'cluster': 'true', 'zoom': 0 })
+        count = Node.objects.published().access_level_up_to('public').filter(layer__slug='rome').count()
+        self.assertEqual(response.data['features'][0]['properties']['count'], count)
+
+        # high zoom levels return nodes
+        response = self.client.get(url, { 'cluster': 'true', 'zoom': 18 })
+        self.assertIn('name', response.data['features'][0]['properties'])
+
+        # zoom is required
+        response = self.client.get(url, { 'cluster': 'true' })
+        self.assertEqual(400, response.status_code)
+
     def test_delete_node(self):
         node = Node.objects.first()
         node.delete()
 
+    def test_node_changes(self):
+        from nodeshot.core.base.utils import now
+        from . import changes
+        # changes are returned as soon as they are saved
+        self.addCleanup(setattr, changes, 'CHANGES_SAFETY_MARGIN', changes.CHANGES_SAFETY_MARGIN)
+        changes.CHANGES_SAFETY_MARGIN = 0
+        url = reverse('api_node_changes')
+        since = now().isoformat()
+
+        # GET: 400 - since is required or invalid
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, { 'since': 'wrong' }).status_code, 400)
+        self.assertEqual(self.client.get(url, { 'since': since, 'limit': 0 }).status_code, 400)
+
+        response = self.client.get(url, { 'since': since })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changes'], [])
+        self.assertFalse(response.data['more'])
+
+        public = Node.objects.published().access_level_up_to('public').order_by('id')
+        updated, deleted, unpublished = public[0], public[1], public[2]
+        updated.save()
+        deleted.delete()
+        unpublished.is_published = False
+        unpublished.save()
+        private = Node.objects.published().exclude(access_level=0)[0]
+        private.save()
+
+        response = self.client.get(url, { 'since': since })
+        changes = response.data['changes']
+        self.assertEqual([(change['type'], change['slug']) for change in changes], [
+            ('updated', updated.slug),
+            ('deleted', deleted.slug),
+            ('deleted', unpublished.slug)
+        ])
+        self.assertEqual(changes[0]['node']['name'], updated.name)
+        self.assertEqual(NodeDeletion.objects.get(slug=deleted.slug).node_id, deleted.pk)
+
+        # follow tokens one change at a time
+        response = self.client.get(url, { 'since': since, 'limit': 1 })
+        paged = response.data['changes']
+        while response.data['more']:
+            response = self.client.get(url, { 'since': response.data['next'], 'limit': 1 })
+            paged += response.data['changes']
+        self.assertEqual(paged, changes)
+
+        # nothing changed since the last token
+        response = self.client.get(url, { 'since': response.data['next'] })
+        self.assertEqual(response.data['changes'], [])
+
+        # private nodes are visible to users who can access them
+        self.client.login(username='admin', password='tester')
+        response = self.client.get(url, { 'since': since })
+        self.assertIn(private.slug, [change['slug'] for change in response.data['changes']])
+
+        # changes of a layer
+        layer_slugs = set(Node.objects.filter(layer=updated.layer).values_list('slug', flat=True))
+        layer_slugs.update(NodeDeletion.objects.filter(layer_id=updated.layer_id).values_list('slug', flat=True))
+        response = self.client.get(url, { 'since': since, 'layer': updated.layer.slug })
+        self.assertIn(updated.slug, [change['slug'] for change in response.data['changes']])
+        for change in response.data['changes']:
+            self.assertIn(change['slug'], layer_slugs)
+        self.assertEqual(self.client.get(url, { 'since': since, 'layer': 'wrong' }).status_code, 404)
+
+    def test_node_changes_horizon(self):
+        """ recent changes are returned only after the safety margin, old tombstones are purged """
+        from StringIO import StringIO
+        from django.core.management import call_command
+        from nodeshot.core.base.utils import ago
+        from . import changes
+        url = reverse('api_node_changes')
+
+        since = ago(seconds=1).isoformat()
+        Node.objects.published().access_level_up_to('public')[0].save()
+        # the transaction which saved the node might still be running
+        self.assertEqual(self.client.get(url, { 'since': since }).data['changes'], [])
+        self.assertTrue(changes.get_horizon() <= ago(seconds=changes.CHANGES_SAFETY_MARGIN))
+
+        # tombstones of deletions after since might have been purged
+        since = ago(days=changes.DELETIONS_RETENTION + 1).isoformat()
+        self.assertEqual(self.client.get(url, { 'since': since }).status_code, 400)
+
+        NodeDeletion.objects.create(node_id=0, slug='old', deleted=ago(days=changes.DELETIONS_RETENTION + 1))
+        NodeDeletion.objects.create(node_id=0, slug='recent')
+        call_command('purge_node_deletions', stdout=StringIO())
+        self.assertEqual(list(NodeDeletion.objects.filter(node_id=0).values_list('slug', flat=True)), ['recent'])
+
+    def test_node_changes_visibility(self):
+        """ nodes moved to another layer or with a higher access level are deleted for some clients """
+        from nodeshot.core.base.choices import ACCESS_LEVELS
+        from nodeshot.core.base.utils import now
+        from . import changes
+        self.addCleanup(setattr, changes, 'CHANGES_SAFETY_MARGIN', changes.CHANGES_SAFETY_MARGIN)
+        changes.CHANGES_SAFETY_MARGIN = 0
+        url = reverse('api_node_changes')
+        since = now().isoformat()
+
+        moved, restricted = Node.objects.published().access_level_up_to('public').order_by('id')[:2]
+        old_layer = moved.layer
+        moved.layer = Layer.objects.published().exclude(pk=old_layer.pk)[0]
+        moved.save()
+        restricted.access_level = ACCESS_LEVELS.get('trusted')
+        restricted.save()
+        # saving again doesn't write other tombstones
+        count = NodeDeletion.objects.count()
+        moved.save()
+        restricted.save()
+        self.assertEqual(NodeDeletion.objects.count(), count)
+
+        # the tombstone of moved comes before its update
+        response = self.client.get(url, { 'since': since })
+        changes = [(change['type'], change['slug']) for change in response.data['changes']]
+        self.assertEqual(changes, [
+            ('deleted', moved.slug),
+            ('updated', moved.slug),
+            ('deleted', restricted.slug)
+        ])
+
+        response = self.client.get(url, { 'since': since, 'layer': old_layer.slug })
+        self.assertIn(('deleted', moved.slug), [(change['type'], change['slug']) for change in response.data['changes']])
+        response = self.client.get(url, { 'since': since, 'layer': moved.layer.slug })
+        self.assertEqual([(change['type'], change['slug']) for change in response.data['changes']], [('updated', moved.slug)])
+
+        # users who can still access restricted see it deleted and updated
+        self.client.login(username='admin', password='tester')
+        response = self.client.get(url, { 'since': since })
+        changes = [(change['type'], change['slug']) for change in response.data['changes']]
+        self.assertEqual(changes[-2:], [('deleted', restricted.slug), ('updated', restricted.slug)])
+
     def test_node_geojson_list(self):
         """ test node geojson list """
         url = reverse('api_node_gejson_list')
@@ -277,6 +632,158 @@ class APITest(BaseTestCase):
         response = self.client.get(url)
         self.assertEqual(200, response.status_code)
 
+    def test_node_compact_renderers(self):
+        """ msgpack and geobuf outputs are decoded to the same data of the JSON output (geobuf coordinates are rounded) """
+        from nodeshot.core.base.renderers import GeobufRenderer, coordinates_precision, round_significant, msgpack, geobuf
+
+        self.assertEqual(coordinates_precision({ 'type': 'Point', 'coordinates': [12.5, 41.123] }), (3, 2))
+        self.assertEqual(coordinates_precision({ 'type': 'Polygon', 'coordinates': [[[1.0, 2.0, 3.25], [1e-07, 2]]] }), (7, 3))
+        # coordinates are rounded to 15 significant digits
+        point = { 'type': 'Point', 'coordinates': [12.509303756711999, 41.88] }
+        self.assertEqual(coordinates_precision(point), (12, 2))
+        self.assertEqual(point['coordinates'], [12.509303756712, 41.88])
+        # tiny values would need more than 15 decimal digits
+        self.assertIsNone(coordinates_precision({ 'type': 'Point', 'coordinates': [12.5, 1.5e-20] }))
+
+        def round_coordinates(data):
+            for feature in data['features']:
+                feature['geometry']['coordinates'] = [round_significant(value) for value in feature['geometry']['coordinates']]
+            return data
+
+        url = reverse('api_node_gejson_list')
+        expected = json.loads(self.client.get(url).content)
+
+        if msgpack is not None:
+            response = self.client.get(url, { 'format': 'msgpack' })
+            self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+            self.assertEqual(msgpack.unpackb(response.content, raw=False), expected)
+            # non GeoJSON views
+            response = self.client.get(reverse('api_node_list'), { 'format': 'msgpack' })
+            self.assertEqual(msgpack.unpackb(response.content, raw=False), json.loads(self.client.get(reverse('api_node_list')).content))
+
+        if geobuf is not None:
+            # coordinates with 15 decimal digits (as written by PostGIS) are rounded to 15 significant digits
+            for params in [{}, { 'precision': 6 }]:
+                expected = json.loads(self.client.get(url, params).content)
+                response = self.client.get(url, dict(params, format='geobuf'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/x-geobuf')
+                self.assertEqual(geobuf.decode(response.content), round_coordinates(expected))
+            # coordinates are decoded to the same values, rounded to 15 significant digits
+            renderer = GeobufRenderer()
+            for i in range(1000):
+                digits = random.randint(0, 17)
+                coordinates = [round(random.uniform(-180, 180), digits), round(random.uniform(-90, 90), digits)]
+                point = { 'type': 'Point', 'coordinates': coordinates }
+                if GeobufRenderer.prepare(point) is None:
+                    self.assertRaises(ValueError, renderer.render, point)
+                else:
+                    point = geobuf.decode(renderer.render(point))
+                    self.assertEqual(point['coordinates'], [round_significant(value) for value in coordinates])
+            # responses which can't be encoded exactly are not acceptable
+            prepare = GeobufRenderer.prepare
+            GeobufRenderer.prepare = staticmethod(lambda data: None)
+            try:
+                response = self.client.get(url, { 'format': 'geobuf' })
+            finally:
+                GeobufRenderer.prepare = staticmethod(prepare)
+            self.assertEqual(response.status_code, 406)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            # errors are rendered in JSON
+            response = self.client.get(url, { 'format': 'geobuf', 'bbox': '12.4,41.6,12.7' })
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response['Content-Type'], 'application/json')
+        else:
+            self.assertEqual(self.client.get(url, { 'format': 'geobuf' }).status_code, 404)
+
+    def test_fast_node_serializers(self):
+        """ the fast path serializers must produce the same output of the regular serializers """
+        from rest_framework.renderers import JSONRenderer
+
+        context = { 'request': RequestFactory().get('/') }
+        queryset = Node.objects.published().order_by('pk')
+
+        for serializer, fast_serializer in [(NodeListSerializer, FastNodeListSerializer),
+                                            (NodeGeoSerializer, FastNodeGeoSerializer)]:
+            # whole queryset and slices (pagination)
+            for nodes in [queryset, queryset[2:5]]:
+                expected = serializer(nodes, many=True, context=context).data
+                data = fast_serializer(nodes, many=True, context=context).data
+                self.assertTrue(data)
+                self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_node_relationships_batch(self):
+        """ relationships are resolved with a constant number of queries, regardless of the number of nodes """
+        class NodeRelationshipsSerializer(DynamicRelationshipsMixin, serializers.ModelSerializer):
+            relationships = serializers.SerializerMethodField('get_relationships')
+            _relationships = {}
+
+            class Meta:
+                model = Node
+                fields = ('slug', 'relationships')
+
+        NodeRelationshipsSerializer.add_relationship(
+            'images',
+            serializer=ImageRelationSerializer,
+            many=True,
+            queryset='obj.image_set.accessible_to(request.user).all()',
+            prefetch=prefetch_images
+        )
+        NodeRelationshipsSerializer.add_relationship(
+            'layer',
+            view_name='api_layer_detail',
+            lookup_field='layer.slug',
+            prefetch_related=['layer']
+        )
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        queryset = Node.objects.all().order_by('pk')
+        self.assertTrue(queryset.count() > 2)
+
+        # nodes, images, layers
+        for nodes in [queryset[0:1], queryset[0:2], queryset]:
+            with self.assertNumQueries(3):
+                data = NodeRelationshipsSerializer(nodes, many=True, context={ 'request': request, 'format': None }).data
+
+        # same results of resolving relationships one by one
+        for node, item in zip(queryset, data):
+            images = node.image_set.accessible_to(request.user).all()
+            self.assertEqual([image['id'] for image in item['relationships']['images']], [image.id for image in images])
+            self.assertIn('/%s/' % node.layer.slug, item['relationships']['layer'])
+
+        # details of a single node
+        node = queryset[0]
+        with self.assertNumQueries(2):
+            NodeRelationshipsSerializer(node, context={ 'request': request, 'format': None }).data
+
+    def test_node_conditional_get(self):
+        for url in [reverse('api_node_list'), reverse('api_node_gejson_list'), reverse('api_node_details', args=['fusolab'])]:
+            response = self.client.get(url)
+            self.assertEqual(200, response.status_code)
+            etag = response['ETag']
+            last_modified = response['Last-Modified']
+
+            # nothing changed: 304 and empty body
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(304, response.status_code)
+            self.assertEqual('', response.content)
+            self.assertEqual(etag, response['ETag'])
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(304, response.status_code)
+
+            # a different group sees different content
+            self.client.login(username='admin', password='tester')
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(200, response.status_code)
+            self.client.logout()
+
+        # a node changes: validators change
+        Node.objects.get(slug='fusolab').save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
     def test_node_details(self):
         """ test node details """
         url = reverse('api_node_details', args=['fusolab'])
@@ -408,8 +915,8 @@ class APITest(BaseTestCase):
             image = Image.objects.all().order_by('-id')[0]
             self.assertIn('image_unit_test', image.file.name)
             self.assertIn('.gif', image.file.name)
-            # remove file
-            os.remove(image.file.file.name)
+            # remove file and its variants
+            image.delete()
 
         # POST 201 - ensure additional post data "user" and "node" are ignored
         with open("%s/templates/image_unit_test.gif" % os.path.dirname(os.path.realpath(__file__)), 'rb') as image_file:
@@ -422,8 +929,8 @@ class APITest(BaseTestCase):
             # ensure image name is in DB
             image = Image.objects.all().order_by('-id')[0]
             self.assertIn('image_unit_test', image.file.name)
-            # remove file
-            os.remove(image.file.file.name)
+            # remove file and its variants
+            image.delete()
 
         self.client.logout()
         self.client.login(username='pisano', password='tester')
@@ -433,6 +940,47 @@ class APITest(BaseTestCase):
             response = self.client.post(url, good_post_data)
             self.assertEqual(response.status_code, 403)
 
+    def test_node_image_variants(self):
+        """ uploaded images are resized in background (eagerly in tests) """
+        from .thumbnails import variant_name
+
+        self.assertEqual(variant_name('nodes/photo.jpg', 'thumb'), 'nodes/thumb/photo.jpg')
+        self.assertEqual(variant_name('nodes/photo.png', 'medium'), 'nodes/medium/photo.png.jpg')
+
+        self.client.login(username='admin', password='tester')
+        url = reverse('api_node_images', args=['fusolab'])
+        with open("%s/templates/image_unit_test.gif" % os.path.dirname(os.path.realpath(__file__)), 'rb') as image_file:
+            response = self.client.post(url, { "description": "new image", "order": "", "file": image_file })
+        self.assertEqual(response.status_code, 201)
+        image = Image.objects.all().order_by('-id')[0]
+        self.assertTrue(image.variants_ready)
+        storage = image.file.storage
+        for variant in ['thumb', 'medium']:
+            self.assertTrue(storage.exists(variant_name(image.file.name, variant)))
+
+        # variant urls
+        response = self.client.get(reverse('api_node_image_detail', args=['fusolab', image.pk]))
+        self.assertEqual(response.data['variants']['thumb'], '%s%s' % (settings.MEDIA_URL, variant_name(image.file.name, 'thumb')))
+
+        # images without variants use the original file
+        Image.objects.filter(pk=image.pk).update(variants_ready=False)
+        response = self.client.get(reverse('api_node_image_detail', args=['fusolab', image.pk]))
+        self.assertEqual(response.data['variants']['medium'], response.data['file_url'])
+
+        # variants are deleted together with the image
+        image.delete()
+        for variant in ['thumb', 'medium']:
+            self.assertFalse(storage.exists(variant_name(image.file.name, variant)))
+
+        # images which are not found (eg: not committed yet) are retried, deleted images are skipped
+        from .tasks import create_image_variants
+        from celery.exceptions import Retry
+        self.assertFalse(create_image_variants(image.pk))
+        result = create_image_variants.apply(args=[image.pk])
+        self.assertIsInstance(result.result, Retry)
+        result = create_image_variants.apply(args=[image.pk], retries=create_image_variants.max_retries)
+        self.assertFalse(result.get())
+
     def test_node_image_list_permissions(self):
         # GET protected image should return 404
         url = reverse('api_node_images', args=['hidden-rome'])
@@ -0,0 +1,121 @@
+"""
+Resized variants of node images
+
+Uploaded images (often photos of several MB) are resized to the variants defined in
+NODESHOT_NODES_IMAGE_VARIANTS (by default "thumb" and "medium"); variants are
+rotated according to their EXIF orientation and re-encoded in JPEG without EXIF data
+(which might contain the GPS position of the camera).
+
+Variants are created in background by the create_image_variants task when an image is uploaded;
+existing images can be processed with the "create_image_variants" management command.
+"""
+import os
+from cStringIO import StringIO
+
+from django.core.files.base import ContentFile
+
+from PIL import Image as PILImage
+
+from .settings import IMAGE_VARIANTS, IMAGE_VARIANTS_QUALITY
+
+
+__all__ = [
+    'variant_name',
+    'create_variants',
+    'delete_variants',
+]
+
+
+EXIF_ORIENTATION = 274
+# transpositions needed to display images correctly for each EXIF orientation value
+ORIENTATIONS = {
+    2: (PILImage.FLIP_LEFT_RIGHT,),
+    3: (PILImage.ROTATE_180,),
+    4: (PILImage.FLIP_TOP_BOTTOM,),
+    5: (PILImage.ROTATE_90, PILImage.FLIP_TOP_BOTTOM),
+    6: (PILImage.ROTATE_270,),
+    7: (PILImage.ROTATE_270, PILImage.FLIP_TOP_BOTTOM),
+    8: (PILImage.ROTATE_90,),
+}
+
+
+def variant_name(name, variant):
+    """
+    name of the file of the specified variant of an image file
+    eg: nodes/photo.jpg > nodes/thumb/photo.jpg, nodes/photo.png > nodes/thumb/photo.png.jpg
+    """
+    directory, filename = os.path.split(name)
+    root, extension = os.path.splitext(filename)
+    if extension != '.jpg':
+        root = filename
+    return os.path.join(directory, variant, '%s.jpg' % root)
+
+
+def get_orientation(image):
+    """ EXIF orientation of a PIL image, None if unknown """
+    try:
+        exif = image._getexif() or {}
+    # not a JPEG or corrupted EXIF data
+    except (AttributeError, IndexError, KeyError, SyntaxError, TypeError, ValueError):
+        return None
+    return exif.get(EXIF_ORIENTATION)
+
+
+def prepare(image):
+    """ returns an RGB copy of a PIL image rotated according to its EXIF orientation """
+    for method in ORIENTATIONS.get(get_orientation(image), ()):
+        image = image.transpose(method)
+
+    if image.mode == 'P' and 'transparency' in image.info:
+        image = image.convert('RGBA')
+    # transparent areas become white
+    if image.mode in ('RGBA', 'LA'):
+        background = PILImage.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def encode(image, size):
+    """ resizes a PIL image to fit in size (without enlarging it), returns the JPEG data """
+    image = image.copy()
+    image.thumbnail(size, PILImage.ANTIALIAS)
+    output = StringIO()
+    # EXIF data is not passed on, therefore it's stripped
+    image.save(output, 'JPEG', quality=IMAGE_VARIANTS_QUALITY, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def create_variants(image):
+    """
+    creates (or replaces) the variants of an Image instance in the storage of its file;
+    raises IOError if the file does not exist or is not a valid image
+    """
+    storage = image.file.storage
+    image.file.open('rb')
+    try:
+        original = PILImage.open(image.file)
+        # JPEG images are decoded directly at a reduced scale, which is much faster
+        largest = max([max(size) for variant, size in IMAGE_VARIANTS])
+        original.draft('RGB', (largest, largest))
+        original.load()
+    finally:
+        image.file.close()
+
+    original = prepare(original)
+    for variant, size in IMAGE_VARIANTS:
+        name = variant_name(image.file.name, variant)
+        content = ContentFile(encode(original, size))
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, content)
+
+
+def delete_variants(name, storage):
+    """ deletes the variants of an image file """
+    for variant, size in IMAGE_VARIANTS:
+        variant_file = variant_name(name, variant)
+        if storage.exists(variant_file):
+            storage.delete(variant_file)
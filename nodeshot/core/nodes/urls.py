@@ -4,6 +4,7 @@ from django.conf.urls import patterns, url
 urlpatterns = patterns('nodeshot.core.nodes.views',
     url(r'^nodes/$', 'node_list', name='api_node_list'),
     url(r'^nodes.geojson$', 'geojson_list', name='api_node_gejson_list'),
+    url(r'^nodes/changes/$', 'node_changes', name='api_node_changes'),
     url(r'^nodes/(?P<slug>[-\w]+)/$', 'node_details', name='api_node_details'),
     
     # images
@@ -2,14 +2,22 @@ from django.http import Http404
 from django.utils.translation import ugettext_lazy as _
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
-from django.db.models import Q
 
 from rest_framework import permissions, authentication, generics
+from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
 
-from nodeshot.core.base.mixins import ACLMixin, CustomDataMixin
+from nodeshot.core.base.mixins import (ACLMixin, BBoxFilterMixin, ConditionalGetMixin, CursorPaginationMixin,
+                                       CustomDataMixin, GeoJSONOptionsMixin)
+from nodeshot.core.base.serializers import GeoJSONCursorPaginationSerializer
+from nodeshot.core.base.renderers import CompactRenderersMixin
 from nodeshot.core.base.utils import Hider
+from nodeshot.core.base.cache import get_group_name
 
-from .settings import REVERSION_ENABLED
+from .settings import REVERSION_ENABLED, CLUSTER_MAX_ZOOM
+from .clusters import cluster_cache_key, get_clusters
+from .changes import parse_since, get_changes
+from .search import search_nodes
 from .permissions import IsOwnerOrReadOnly
 from .serializers import *
 from .models import *
@@ -44,14 +52,21 @@ def get_queryset_or_404(queryset, kwargs):
     return obj
 
 
-class NodeList(NodeListBase):
+class NodeList(ConditionalGetMixin, CursorPaginationMixin, BBoxFilterMixin, GeoJSONOptionsMixin,
+               CompactRenderersMixin, NodeListBase):
     """
     Retrieve list of all published nodes.
 
     Parameters:
 
-     * `search=<word>`: search <word> in name, slug, description and address of nodes
+     * `search=<words>`: full text search of <words> in name, slug, address and description of nodes (most relevant first)
+     * `bbox=<minx>,<miny>,<maxx>,<maxy>`: retrieve only nodes whose bounding box overlaps the specified one
+       (nodes which are not points may be partly outside of it)
+     * `simplify=<tolerance>` or `simplify=true&zoom=<n>`: simplify geometries with the specified tolerance (degrees) or for the specified zoom level
+     * `precision=<n>`: number of decimal digits of coordinates
      * `limit=<n>`: specify number of items per page (defaults to 50)
+     * `cursor=`: paginate with cursors (faster on deep pages, no count), follow the `next` and `previous` links
+     * `format=msgpack`: same data encoded with MessagePack
 
     ### POST
 
@@ -61,10 +76,18 @@ class NodeList(NodeListBase):
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     queryset = Node.objects.published()
     serializer_class = NodeListSerializer
+    # read-only serializer used to list nodes, produces the same output of serializer_class
+    fast_serializer_class = FastNodeListSerializer
     pagination_serializer_class = PaginatedNodeListSerializer
     paginate_by_param = 'limit'
     paginate_by = 50
 
+    def get_serializer_class(self):
+        """ use the fast path to list nodes """
+        if self.request.method == 'GET' and self.fast_serializer_class:
+            return self.fast_serializer_class
+        return super(NodeList, self).get_serializer_class()
+
     def pre_save(self, obj):
         """ automatically determine user on creation """
         if not obj.id:
@@ -83,21 +106,15 @@ class NodeList(NodeListBase):
         search = self.request.QUERY_PARAMS.get('search', None)
 
         if search is not None:
-            search_query = (
-                Q(name__icontains=search) |
-                Q(slug__icontains=search) |
-                Q(description__icontains=search) |
-                Q(address__icontains=search)
-            )
-            # add instructions for search to queryset
-            queryset = queryset.filter(search_query)
+            # full text search, most relevant nodes first
+            queryset = search_nodes(queryset, search)
 
         return queryset
 
 node_list = NodeList.as_view()
 
 
-class NodeDetail(NodeDetailBase):
+class NodeDetail(ConditionalGetMixin, NodeDetailBase):
     """
     Retrieve details of specified node. Node must be published and accessible.
 
@@ -118,25 +135,127 @@ class NodeDetail(NodeDetailBase):
 node_details = NodeDetail.as_view()
 
 
-class NodeGeoJSONList(NodeList):
+class NodeClusterMixin(object):
+    """
+    Adds the clustering mode to GeoJSON node lists:
+
+        ?cluster=true&zoom=<n>
+
+    Up to zoom level NODESHOT_NODES_CLUSTER_MAX_ZOOM nodes are grouped
+    in the database and returned as clusters, at higher zoom levels
+    the usual list of nodes is returned.
+    """
+    cluster_scope = 'all'
+
+    def get_cluster_zoom(self):
+        """ returns the zoom level if clusters have been requested and are needed, None otherwise """
+        if self.request.QUERY_PARAMS.get('cluster', 'false') != 'true':
+            return None
+
+        try:
+            zoom = int(self.request.QUERY_PARAMS['zoom'])
+        except (KeyError, ValueError):
+            raise ParseError(_('cluster mode requires a valid zoom parameter'))
+
+        if zoom < 0:
+            raise ParseError(_('zoom must be a positive number'))
+
+        return zoom if zoom <= CLUSTER_MAX_ZOOM else None
+
+    def get_cluster_cache_key(self, zoom):
+        """ filtered results are not worth caching """
+        if 'search' in self.request.QUERY_PARAMS or 'bbox' in self.request.QUERY_PARAMS:
+            return None
+        return cluster_cache_key(self.cluster_scope, get_group_name(self.request.user), zoom)
+
+    def get_clusters(self, zoom):
+        return get_clusters(self.get_queryset(), zoom, self.get_cluster_cache_key(zoom))
+
+
+class NodeGeoJSONList(NodeClusterMixin, NodeList):
     """
     Retrieve list of all published nodes in GeoJSON format.
 
     Parameters:
 
-     * `search=<word>`: search <word> in name, slug, description and address of nodes
+     * `search=<words>`: full text search of <words> in name, slug, address and description of nodes (most relevant first)
+     * `bbox=<minx>,<miny>,<maxx>,<maxy>`: retrieve only nodes whose bounding box overlaps the specified one
+       (nodes which are not points may be partly outside of it)
+     * `simplify=<tolerance>` or `simplify=true&zoom=<n>`: simplify geometries with the specified tolerance (degrees) or for the specified zoom level
+     * `precision=<n>`: number of decimal digits of coordinates
+     * `cluster=true&zoom=<n>`: group nodes in clusters suitable for the specified zoom level
      * `limit=<n>`: specify number of items per page (defaults to 50)
      * `page=<n>`: show page n
+     * `cursor=`: paginate with cursors (faster on deep pages, no count), follow the `next` and `previous` links
+     * `format=msgpack` or `format=geobuf`: same data encoded with MessagePack or Geobuf
     """
     pagination_serializer_class = PaginatedGeojsonNodeListSerializer
+    cursor_pagination_serializer_class = GeoJSONCursorPaginationSerializer
     paginate_by_param = 'limit'
     paginate_by = 50
     serializer_class = NodeGeoSerializer
+    fast_serializer_class = FastNodeGeoSerializer
+    geobuf = True
     post = Hider()
 
+    def get(self, request, *args, **kwargs):
+        """ Retrieve list of all published nodes in GeoJSON format. """
+        zoom = self.get_cluster_zoom()
+        if zoom is not None:
+            return Response(self.get_clusters(zoom))
+        return super(NodeGeoJSONList, self).get(request, *args, **kwargs)
+
 geojson_list = NodeGeoJSONList.as_view()
 
 
+class NodeChangeList(generics.GenericAPIView):
+    """
+    Retrieve the nodes added, updated or deleted since a point in time, ordered by time.
+
+    Parameters:
+
+     * `since=<timestamp|token>`: ISO 8601 timestamp (eg: `2014-06-01T00:00:00Z`) or the `next` token of a previous response
+     * `layer=<slug>`: retrieve only the changes of the nodes of the specified layer
+     * `limit=<n>`: maximum number of changes (defaults to 100, max 1000)
+
+    Each change has a `type` (`updated` or `deleted`), the `slug` of the node and its `time`;
+    updated nodes contain the current data of the node. Nodes which have been unpublished
+    are reported as deleted. Keep requesting `next` while `more` is `true`.
+    """
+    authentication_classes = (authentication.SessionAuthentication,)
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    queryset = Node.objects.all()
+    limit = 100
+    max_limit = 1000
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.QUERY_PARAMS.get('limit', self.limit))
+        except ValueError:
+            raise ParseError(_('invalid limit'))
+        if limit < 1:
+            raise ParseError(_('limit must be a positive number'))
+        return min(limit, self.max_limit)
+
+    def get_layer_id(self):
+        """ id of the layer specified in the layer parameter or None """
+        slug = self.request.QUERY_PARAMS.get('layer', None)
+        if not slug:
+            return None
+        Layer = Node._meta.get_field('layer').rel.to
+        return get_queryset_or_404(Layer.objects.values_list('id', flat=True), { 'slug': slug })
+
+    def get(self, request, *args, **kwargs):
+        node_position, deletion_position = parse_since(request.QUERY_PARAMS.get('since', None))
+        changes, token, more = get_changes(request.user, node_position, deletion_position,
+                                           limit=self.get_limit(),
+                                           layer_id=self.get_layer_id(),
+                                           context=self.get_serializer_context())
+        return Response({ 'changes': changes, 'next': token, 'more': more })
+
+node_changes = NodeChangeList.as_view()
+
+
 # -------- Images -------- #
 
 
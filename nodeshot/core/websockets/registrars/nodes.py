@@ -2,7 +2,7 @@ from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
 
-from nodeshot.core.nodes.signals import node_status_changed
+from nodeshot.core.nodes.signals import node_status_changed, nodes_bulk_saved
 from nodeshot.core.nodes.models import Node
 
 from ..tasks import send_message
@@ -17,6 +17,13 @@ def node_created_handler(sender, **kwargs):
         message = 'node "%s" has been added' % obj.name
         send_message.delay(message)
 
+@receiver(nodes_bulk_saved, sender=Node)
+def nodes_bulk_created_handler(sender, **kwargs):
+    created = kwargs['created']
+    if created:
+        message = '%d nodes have been added' % len(created)
+        send_message.delay(message)
+
 # ------ NODE STATUS CHANGED ------ #
 
 @receiver(node_status_changed)
@@ -42,6 +49,7 @@ def node_deleted_handler(sender, **kwargs):
 def disconnect():
     """ disconnect signals """
     post_save.disconnect(node_created_handler, sender=Node)
+    nodes_bulk_saved.disconnect(nodes_bulk_created_handler, sender=Node)
     node_status_changed.disconnect(node_status_changed_handler)
     pre_delete.disconnect(node_deleted_handler, sender=Node)
 
@@ -49,6 +57,7 @@ def disconnect():
 def reconnect():
     """ reconnect signals """
     post_save.connect(node_created_handler, sender=Node)
+    nodes_bulk_saved.connect(nodes_bulk_created_handler, sender=Node)
     node_status_changed.connect(node_status_changed_handler)
     pre_delete.connect(node_deleted_handler, sender=Node)
 
@@ -9,7 +9,7 @@ from netaddr import ip
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.db.models import Q
-from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.contrib.gis.geos import Point
 from django.utils.text import slugify
 from django.contrib.contenttypes.models import ContentType
@@ -457,6 +457,7 @@ choose (enter the number of) one of the following layers:
         self.message('saving nodes into local DB...')
 
         saved_nodes = []
+        nodes = []
 
         # loop over all old node and create new nodes
         for old_node in self.old_nodes:
@@ -518,8 +519,33 @@ choose (enter the number of) one of the following layers:
             if self.status_mapping:
                 node.status_id = self.get_status(old_node.status)
 
+            nodes.append(node)
+
+        # per node validation first, so that the nodes which won't be saved
+        # are not taken into account by the validation of the others
+        valid_nodes = []
+        unique_values = set()
+        for node in nodes:
+            try:
+                node.clean_fields()
+                node.validate_unique()
+                # nodes of the batch are not in the DB yet
+                if ('name', node.name) in unique_values or ('slug', node.slug) in unique_values:
+                    raise ValidationError('another node with the same name or slug is being imported')
+                unique_values.update([('name', node.name), ('slug', node.slug)])
+            except Exception as e:
+                tb = traceback.format_exc()
+                self.message('Could not save node %s, got exception:\n\n%s' % (node.name, tb))
+                continue
+            valid_nodes.append(node)
+
+        # additional validation (minimum distance, layer area) of all the valid nodes at once
+        errors = Node.validate_batch(valid_nodes)
+
+        for node, error in zip(valid_nodes, errors):
             try:
-                node.full_clean()
+                if error is not None:
+                    raise error
                 node.save(auto_update=False)
                 saved_nodes.append(node)
                 self.verbose('Saved node %s in layer %s with status %s' % (node.name, node.layer, node.status.name))
@@ -14,7 +14,8 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 
-from nodeshot.core.nodes.models import Node, Status, Image
+from nodeshot.core.nodes.models import Node, Image
+from nodeshot.core.nodes.registry import get_status
 from nodeshot.core.layers.models import Layer
 
 from .base import SERVICES, DISCOVERY, MODELS, iso8601_REGEXP
@@ -97,7 +98,9 @@ def create_output_data(data):
 
     # get status from model and converts it into the mapped status type (open/closed)
     status_id = data['status']
-    status = get_object_or_404(Status, pk=status_id)
+    status = get_status(status_id)
+    if status is None:
+        raise Http404
     data['detailed_status'] = status.name
     data['detailed_status_description'] = status.description
     try:
@@ -1,13 +1,35 @@
+from multiprocessing import Pool
+
 from django.core.management.base import BaseCommand, CommandError
-from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.db import connection
 from django.db.models import Q
-from django.utils.module_loading import import_by_path
+
+from celery import chord
 
 from nodeshot.core.layers.models import Layer
 
+from ...tasks import synchronize_external_layer, log_sync_reports
+from ...utils import summarize_reports
+
 from optparse import make_option
 
 
+def synchronize_layer(args):
+    """
+    runs in the worker processes; errors are returned in the report
+    so that the other layers are synchronized anyway
+    """
+    layer_slug, kwargs = args
+    try:
+        return synchronize_external_layer(layer_slug, **kwargs)
+    except Exception as e:
+        return {
+            'layer': layer_slug,
+            'result': 'failed',
+            'messages': ['Error while processing layer "%s": %s' % (layer_slug, e)]
+        }
+
+
 class Command(BaseCommand):
     args = '<layer_slug layer_slug ...>'
     help = 'Synchronize external layers with the local database'
@@ -23,6 +45,30 @@ class Command(BaseCommand):
                  e.g. --exclude=layer1-slug,layer2-slug,layer3-slug\n\
                  (works only if no layer has been specified)'
         ),
+        make_option(
+            '--force',
+            action='store_true',
+            dest='force',
+            default=False,
+            help='Synchronize layers even if their external source has not changed\n\
+                 since the last synchronization'
+        ),
+        make_option(
+            '--workers',
+            action='store',
+            dest='workers',
+            type='int',
+            default=1,
+            help='Number of layers synchronized in parallel by different processes (defaults to 1)'
+        ),
+        make_option(
+            '--group',
+            action='store_true',
+            dest='group',
+            default=False,
+            help='Synchronize each layer in a different task of a celery group\n\
+                 (reports are logged by the celery workers, requires a celery result backend)'
+        ),
     )
 
     def retrieve_layers(self, *args, **options):
@@ -94,38 +140,47 @@ class Command(BaseCommand):
         else:
             self.verbose('going to process %d layers...' % len(layers))
 
-        # loop over
-        for layer in layers:
-            # retrieve interop class if available
-            try:
-                synchronizer_path = layer.external.synchronizer_path
-            except (ObjectDoesNotExist, AttributeError):
-                self.stdout.write('External Layer %s does not have a synchronizer class specified\n\r' % layer.name)
-                continue
+        kwargs = {
+            'verbosity': self.verbosity,
+            'force': options.get('force', False)
+        }
+        slugs = [layer.slug for layer in layers]
+        workers = options.get('workers') or 1
 
-            # if no synchronizer_path jump to next layer
-            if synchronizer_path == 'None':
-                self.stdout.write('External Layer %s does not have a synchronizer class specified\n\r' % layer.name)
-                continue
+        if workers < 1:
+            raise CommandError('workers must be a positive number')
 
-            if layer.external.config is None:
-                self.stdout.write('Layer %s does not have a config yet\n\r' % layer.name)
-                continue
-
-            # retrieve class
-            Synchronizer = import_by_path(synchronizer_path)
-            self.stdout.write('imported module %s\r\n' % Synchronizer.__name__)
+        # each layer is synchronized by a different celery task, reports are logged by log_sync_reports
+        if options.get('group'):
+            chord([synchronize_external_layer.s(slug, **kwargs) for slug in slugs])(log_sync_reports.s())
+            self.stdout.write('synchronization of %d layers sent to celery workers\n\r' % len(slugs))
+            return
 
-            # try running
+        # reports are written as soon as each layer is done
+        if workers == 1 or len(slugs) == 1:
+            reports = self.output_reports(synchronize_external_layer(slug, **kwargs) for slug in slugs)
+        else:
+            # each worker opens its own database connection
+            connection.close()
+            pool = Pool(min(workers, len(slugs)))
             try:
-                instance = Synchronizer(layer, verbosity=self.verbosity)
-                self.stdout.write('Processing layer "%s"\r\n' % layer.slug)
-                messages = instance.process()
-            except ImproperlyConfigured, e:
-                self.stdout.write('Validation error: %s\r\n' % e)
-                continue
-
-            for message in messages:
-                self.stdout.write('%s\n\r' % message)
+                reports = self.output_reports(pool.imap_unordered(synchronize_layer, [(slug, kwargs) for slug in slugs]))
+            finally:
+                pool.close()
+                pool.join()
 
+        self.stdout.write('%s\n\r' % summarize_reports(reports))
         self.stdout.write('\r\n')
+
+        failed = [report['layer'] for report in reports if report['result'] == 'failed']
+        if failed:
+            raise CommandError('synchronization of the following layers failed: %s' % ', '.join(failed))
+
+    def output_reports(self, reports):
+        """ writes the messages of each report, returns the list of reports """
+        results = []
+        for report in reports:
+            for message in report['messages']:
+                self.stdout.write('%s\n\r' % message)
+            results.append(report)
+        return results
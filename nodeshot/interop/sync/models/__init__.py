@@ -12,14 +12,15 @@ check_dependencies(
 
 from .layer_external import LayerExternal
 from .node_external import NodeExternal
+from .feed_state import FeedState
 
 
-__all__ = ['LayerExternal', 'NodeExternal']
+__all__ = ['LayerExternal', 'NodeExternal', 'FeedState']
 
 
 # ------ patch LayerNodesList view to support external layers ------ #
 
-from nodeshot.core.layers.views import LayerNodesList
+from nodeshot.core.layers.views import LayerNodesList, LayerNodesGeoJSONList
 
 def get_nodes(self, request, *args, **kwargs):
     if self.layer.is_external and hasattr(self.layer.external, 'get_nodes'):
@@ -28,3 +29,28 @@ def get_nodes(self, request, *args, **kwargs):
         return (self.list(request, *args, **kwargs)).data
 
 LayerNodesList.get_nodes = get_nodes
+
+
+_get_validators = LayerNodesList.get_validators
+
+def get_validators(self):
+    # nodes of external layers might be retrieved by the synchronizer, the local database can't validate them
+    self.get_layer()
+    if self.layer.is_external and hasattr(self.layer.external, 'get_nodes'):
+        return None
+    else:
+        return _get_validators(self)
+
+LayerNodesList.get_validators = get_validators
+
+
+_get_nodes_stream = LayerNodesGeoJSONList.get_nodes_stream
+
+def get_nodes_stream(self):
+    # nodes of external layers might be retrieved by the synchronizer, which can't stream them
+    if self.layer.is_external and hasattr(self.layer.external, 'get_nodes'):
+        return None
+    else:
+        return _get_nodes_stream(self)
+
+LayerNodesGeoJSONList.get_nodes_stream = get_nodes_stream
@@ -0,0 +1,48 @@
+import hashlib
+import json
+
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from nodeshot.core.base.utils import now
+
+from .layer_external import LayerExternal
+
+
+class FeedState(models.Model):
+    """
+    State of the external source of a layer at the last successful synchronization:
+    HTTP validators (ETag, Last-Modified) and hash of the content,
+    used to skip synchronizations when the external source has not changed
+    """
+    external = models.OneToOneField(LayerExternal, verbose_name=_('external layer'), related_name='feed_state')
+    config_hash = models.CharField(_('configuration hash'), max_length=40, blank=True)
+    etag = models.CharField(_('ETag'), max_length=255, blank=True)
+    last_modified = models.CharField(_('Last-Modified'), max_length=64, blank=True)
+    content_hash = models.CharField(_('content hash'), max_length=40, blank=True)
+    checked = models.DateTimeField(_('last checked on'), null=True, blank=True)
+    changed = models.DateTimeField(_('last changed on'), null=True, blank=True)
+
+    class Meta:
+        app_label = 'sync'
+        db_table = 'layers_external_feed_state'
+        verbose_name = _('external feed state')
+        verbose_name_plural = _('external feed states')
+
+    def __unicode__(self):
+        return 'feed state of external layer %s' % self.external_id
+
+    @staticmethod
+    def hash_config(synchronizer_path, config):
+        """ validators and hash of the content are valid only for the same configuration """
+        # JSON is the same for byte strings and unicode strings
+        dump = json.dumps([synchronizer_path, config or {}], sort_keys=True, default=unicode)
+        return hashlib.sha1(dump).hexdigest()
+
+    def matches(self, synchronizer_path, config):
+        return self.pk is not None and self.config_hash == self.hash_config(synchronizer_path, config)
+
+    def touch(self):
+        """ records that the external source has been checked and found unchanged """
+        self.checked = now()
+        self.__class__.objects.filter(pk=self.pk).update(checked=self.checked)
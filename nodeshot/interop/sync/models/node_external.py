@@ -29,6 +29,8 @@ class NodeExternal(models.Model):
 from django.dispatch import receiver
 from django.db.models.signals import pre_delete, post_save
 
+from nodeshot.core.nodes.signals import nodes_bulk_saved
+
 from ..tasks import push_changes_to_external_layers
 
 
@@ -44,6 +46,16 @@ def save_external_nodes(sender, **kwargs):
     push_changes_to_external_layers.delay(node=node, external_layer=node.layer.external, operation=operation)
 
 
+@receiver(nodes_bulk_saved, sender=Node)
+def bulk_save_external_nodes(sender, **kwargs):
+    """ same as save_external_nodes for the nodes saved by a bulk operation """
+    for operation, nodes in [('add', kwargs['created']), ('change', kwargs['updated'])]:
+        for node in nodes:
+            if node.layer.is_external is False or not hasattr(node.layer, 'external') or node.layer.external.synchronizer_path is None:
+                continue
+            push_changes_to_external_layers.delay(node=node, external_layer=node.layer.external, operation=operation)
+
+
 @receiver(pre_delete, sender=Node)
 def delete_external_nodes(sender, **kwargs):
     """ sync by deleting nodes from external layers when needed """
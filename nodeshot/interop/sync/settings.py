@@ -9,3 +9,6 @@ DEFAULT_SYNCHRONIZERS = [
 ]
 
 SYNCHRONIZERS = DEFAULT_SYNCHRONIZERS + getattr(settings, 'NODESHOT_SYNCHRONIZERS', [])
+
+# number of nodes written by each query during synchronization
+BATCH_SIZE = getattr(settings, 'NODESHOT_SYNC_BATCH_SIZE', 500)
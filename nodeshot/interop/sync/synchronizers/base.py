@@ -1,16 +1,29 @@
 from __future__ import absolute_import
 
+import hashlib
 import requests
+import tempfile
+import threading
+from datetime import datetime
 from xml.dom import minidom
+from xml.etree.cElementTree import iterparse
 from dateutil import parser as DateParser
 
+from django.contrib.gis.geos.collections import GeometryCollection
+from django.db import transaction
+from django.db.models import Q
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
-from nodeshot.core.base.utils import pause_disconnectable_signals, resume_disconnectable_signals
-from nodeshot.core.nodes.models import Node, Status
+from nodeshot.core.base.utils import pause_disconnectable_signals, resume_disconnectable_signals, bulk_update, now
+from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.registry import get_status_by_slug, get_default_status
+from nodeshot.core.nodes.signals import nodes_bulk_saved
+
+from ..models import FeedState
+from ..settings import BATCH_SIZE
 
 
 __all__ = [
@@ -24,6 +37,36 @@ __all__ = [
 ]
 
 
+# number of synchronizations which are saving nodes in this process (eg: in different threads)
+_disabled_validation = 0
+_disabled_validation_lock = threading.Lock()
+
+
+def disable_new_nodes_validation():
+    """
+    TRICK: disables new_nodes_allowed_for_layer validation while nodes are synchronized;
+    the validation is disabled by the first of concurrent synchronizations
+    and re-enabled by the last one (see enable_new_nodes_validation)
+    """
+    global _disabled_validation
+    with _disabled_validation_lock:
+        _disabled_validation += 1
+        if _disabled_validation == 1:
+            try:
+                Node._additional_validation.remove('new_nodes_allowed_for_layer')
+            except ValueError as e:
+                print "WARNING! got exception: %s" % e
+
+
+def enable_new_nodes_validation():
+    """ re-enables new_nodes_allowed_for_layer validation """
+    global _disabled_validation
+    with _disabled_validation_lock:
+        _disabled_validation = max(_disabled_validation - 1, 0)
+        if _disabled_validation == 0 and 'new_nodes_allowed_for_layer' not in Node._additional_validation:
+            Node._additional_validation.insert(0, 'new_nodes_allowed_for_layer')
+
+
 class BaseSynchronizer(object):
     """
     Base Synchronizer
@@ -37,6 +80,8 @@ class BaseSynchronizer(object):
         * log messages with different levels of verbosity
     """
     SCHEMA = None
+    # set to True by retrieve_data if the external source has not changed since the last synchronization
+    unchanged = False
 
     def __init__(self, layer, *args, **kwargs):
         """
@@ -44,6 +89,8 @@ class BaseSynchronizer(object):
         """
         self.layer = layer
         self.verbosity = kwargs.get('verbosity', 1)
+        # process the external source even if it has not changed
+        self.force = kwargs.get('force', False)
         self.load_config()
 
     def load_config(self, config=None):
@@ -72,32 +119,30 @@ class BaseSynchronizer(object):
 
         Steps:
             0. Call "before_start" method (which might be implemented by children classes)
-            1. Retrieve data from external source
+            1. Retrieve data from external source (stop here if it has not changed)
             2. Parse the data
             3. Save the data locally
             4. Call "after_complete" method (which might be implemented by children classes)
         """
         self.before_start()
         self.retrieve_data()
+
+        if self.unchanged:
+            self.message = 'external source unchanged since the last synchronization, nothing to do'
+            return [self.message]
+
         self.parse()
 
-        # TRICK: disable new_nodes_allowed_for_layer validation
-        try:
-            Node._additional_validation.remove('new_nodes_allowed_for_layer')
-        except ValueError as e:
-            print "WARNING! got exception: %s" % e
+        disable_new_nodes_validation()
         # avoid sending zillions of notifications
         pause_disconnectable_signals()
 
-        self.save()
-
-        # Re-enable new_nodes_allowed_for_layer validation
         try:
-            Node._additional_validation.insert(0, 'new_nodes_allowed_for_layer')
-        except ValueError as e:
-            print "WARNING! got exception: %s" % e
-        # reconnect signals
-        resume_disconnectable_signals()
+            self.save()
+        finally:
+            # reconnect signals and re-enable new_nodes_allowed_for_layer validation
+            resume_disconnectable_signals()
+            enable_new_nodes_validation()
 
         self.after_complete()
 
@@ -122,7 +167,81 @@ class BaseSynchronizer(object):
 
 
 class HttpRetrieverMixin(object):
-    """ Retrieve external data through HTTP """
+    """
+    Retrieve external data through HTTP
+
+    The validators (ETag, Last-Modified) and the SHA1 hash of the content retrieved
+    in the last successful synchronization are stored in FeedState: requests are
+    conditional and, if the server replies "304 Not Modified" or the content has
+    the same hash, "unchanged" is set to True and the synchronization is skipped
+    (unless the synchronizer has been created with force=True).
+    The stored state is ignored if the synchronizer or its configuration change.
+    """
+    feed_validators = ('', '')
+    content_hash = ''
+
+    @property
+    def feed_state(self):
+        """ FeedState of the external layer (a new unsaved instance if there is none yet) """
+        if not hasattr(self, '_feed_state'):
+            external = self.layer.external
+            try:
+                self._feed_state = FeedState.objects.get(external=external)
+            except FeedState.DoesNotExist:
+                self._feed_state = FeedState(external=external)
+        return self._feed_state
+
+    @property
+    def config_hash(self):
+        return FeedState.hash_config(self.layer.external.synchronizer_path, self.config)
+
+    def is_feed_state_valid(self):
+        """ whether the stored state can be used to detect unchanged content """
+        return not self.force and self.feed_state.matches(self.layer.external.synchronizer_path, self.config)
+
+    def request(self, url, **kwargs):
+        """ conditional GET request, sets unchanged to True if the server replies 304 Not Modified """
+        headers = {}
+        if self.is_feed_state_valid():
+            if self.feed_state.etag:
+                headers['If-None-Match'] = self.feed_state.etag
+            if self.feed_state.last_modified:
+                headers['If-Modified-Since'] = self.feed_state.last_modified
+
+        response = requests.get(url, verify=self.verify_ssl, headers=headers, **kwargs)
+
+        if response.status_code == 304:
+            self.mark_unchanged()
+        else:
+            self.feed_validators = (response.headers.get('ETag', ''),
+                                    response.headers.get('Last-Modified', ''))
+        return response
+
+    def check_content(self, content_hash):
+        """ sets unchanged to True if the content has the same hash of the last synchronization """
+        self.content_hash = content_hash
+        if self.is_feed_state_valid() and self.feed_state.content_hash == content_hash:
+            self.mark_unchanged()
+
+    def mark_unchanged(self):
+        self.unchanged = True
+        if self.feed_state.pk:
+            self.feed_state.touch()
+
+    def save_feed_state(self):
+        """ stores validators and hash of the content after a successful synchronization """
+        state = self.feed_state
+        state.config_hash = self.config_hash
+        state.etag, state.last_modified = self.feed_validators
+        state.content_hash = self.content_hash
+        state.checked = state.changed = now()
+        state.save()
+
+    def process(self):
+        messages = super(HttpRetrieverMixin, self).process()
+        if not self.unchanged:
+            self.save_feed_state()
+        return messages
 
     def retrieve_data(self):
         """ retrieve data from an HTTP URL """
@@ -130,32 +249,169 @@ class HttpRetrieverMixin(object):
         url = self.config.get('url')
 
         # do HTTP request and store content
-        self.data = requests.get(url, verify=self.verify_ssl).content
+        response = self.request(url)
+        if self.unchanged:
+            self.data = ''
+            return
+        self.data = response.content
+        self.check_content(hashlib.sha1(self.data).hexdigest())
+
+    def retrieve_stream(self, chunk_size=65536):
+        """
+        returns an iterator over the content of the URL read in chunks of chunk_size bytes,
+        without storing the whole content in memory; file:// URLs are read from the local filesystem.
+        The content is hashed before being returned (responses are spooled to a temporary file),
+        an empty iterator is returned if it has not changed.
+        """
+        url = self.config.get('url')
+
+        sha1 = hashlib.sha1()
+        if url.startswith('file://'):
+            f = open(url[len('file://'):], 'rb')
+            for chunk in iter(lambda: f.read(chunk_size), ''):
+                sha1.update(chunk)
+        else:
+            response = self.request(url, stream=True)
+            if self.unchanged:
+                return iter([])
+            f = tempfile.TemporaryFile()
+            for chunk in response.iter_content(chunk_size):
+                sha1.update(chunk)
+                f.write(chunk)
+        self.check_content(sha1.hexdigest())
+
+        if self.unchanged:
+            f.close()
+            return iter([])
+        f.seek(0)
+        return self._read_file(f, chunk_size)
+
+    @staticmethod
+    def _read_file(f, chunk_size):
+        """ yields the content of a file object in chunks and closes it """
+        with f:
+            for chunk in iter(lambda: f.read(chunk_size), ''):
+                yield chunk
+
+
+class ChunksFile(object):
+    """ read-only file-like object which reads an iterable of strings (eg: the chunks returned by retrieve_stream) """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 class XMLParserMixin(object):
-    """ XML Parsing utility methods """
+    """
+    XML Parsing utility methods
+
+    By default the whole document is parsed with minidom; if item_tags is set
+    (eg: ('item',)) the document is read (see HttpRetrieverMixin.retrieve_stream) and
+    parsed incrementally with iterparse instead, and parsed_data yields the elements
+    with the tags returned by get_item_tags one by one; each item is freed as soon as
+    the next one is requested so that memory usage does not grow with the size of the document.
+    The name of the root element is stored in the root attribute before the items are parsed.
+    get_text works with both kinds of elements.
+    """
+    item_tags = None
+    root = None
+
+    def retrieve_data(self):
+        """ documents which are parsed incrementally are read while they're parsed """
+        if self.item_tags:
+            self.data = self.retrieve_stream()
+        else:
+            super(XMLParserMixin, self).retrieve_data()
+
+    def get_item_tags(self):
+        """ tags of the items yielded by the incremental parser, might depend on the root element """
+        return self.item_tags
 
     def parse(self):
         """ parse data """
-        self.parsed_data = minidom.parseString(self.data)
+        if not self.item_tags:
+            self.parsed_data = minidom.parseString(self.data)
+            return
+
+        # data might have been retrieved in a single string as well
+        chunks = [self.data] if isinstance(self.data, basestring) else self.data
+        events = iterparse(ChunksFile(chunks), events=('start-ns', 'start', 'end'))
+        prefixes = {}
+        # namespaces are declared before the root element starts
+        for event, element in events:
+            if event == 'start':
+                break
+            prefix, uri = element
+            prefixes.setdefault(uri, prefix)
+        self.root = self.qualified_name(element.tag, prefixes)
+        self.parsed_data = self.iterparse_items(events, self.get_item_tags(), prefixes, [element])
+
+    @staticmethod
+    def qualified_name(tag, prefixes):
+        """ converts an ElementTree tag (eg: {http://www.georss.org/georss}point) to the name used in the document (eg: georss:point) """
+        if not tag.startswith('{'):
+            return tag
+        uri, name = tag[1:].split('}', 1)
+        prefix = prefixes.get(uri)
+        return '%s:%s' % (prefix, name) if prefix else name
+
+    def iterparse_items(self, events, tags, prefixes, parents):
+        """
+        yields the elements with the specified tags while the document is being parsed
+        (events are the remaining iterparse events, parents the elements which have started);
+        elements are renamed with the names used in the document so that they can
+        be looked up like in minidom (eg: item > georss:point)
+        """
+        for event, element in events:
+            if event == 'start-ns':
+                prefix, uri = element
+                prefixes.setdefault(uri, prefix)
+            elif event == 'start':
+                parents.append(element)
+            else:
+                parents.pop()
+                element.tag = self.qualified_name(element.tag, prefixes)
+                if element.tag in tags:
+                    yield element
+                    # free the item and its children
+                    element.clear()
+                    if parents:
+                        parents[-1].remove(element)
 
     @staticmethod
     def get_text(item, tag, default=False):
-        """ returns text content of an xml tag """
+        """ returns text content of an xml tag (a minidom or an ElementTree element) """
         try:
-            xmlnode = item.getElementsByTagName(tag)[0].firstChild
+            if hasattr(item, 'getElementsByTagName'):
+                xmlnode = item.getElementsByTagName(tag)[0].firstChild
+            else:
+                # same as getElementsByTagName: descendants only
+                xmlnode = [element for element in item.iter(tag) if element is not item][0]
         except IndexError as e:
             if default is not False:
                 return default
             else:
                 raise IndexError(e)
 
-        if xmlnode is not None:
+        if xmlnode is None:
+            # empty tag
+            return ''
+        elif hasattr(xmlnode, 'nodeValue'):
             return unicode(xmlnode.nodeValue)
-        # empty tag
         else:
-            return ''
+            return unicode(xmlnode.text or '')
 
 
 class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
@@ -293,9 +549,14 @@ class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
             }
         }
     ]
+    # fields written when a node is updated
+    update_fields = ('name', 'status', 'address', 'is_published', 'user', 'geometry',
+                     'elev', 'description', 'notes', 'added', 'updated', 'data')
 
     def __init__(self, layer, *args, **kwargs):
         super(GenericGisSynchronizer, self).__init__(layer, *args, **kwargs)
+        # users of the imported nodes indexed by username, filled by get_user
+        self.users = {}
         # init empty dict
         self.field_mapping = {}
         # include all keys which start with 'field_'
@@ -345,13 +606,7 @@ class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
             item['status'] = self.default_status
 
         # get status or get default status or None
-        try:
-            item['status'] = Status.objects.get(slug__iexact=item['status'])
-        except Status.DoesNotExist:
-            try:
-                item['status'] = Status.objects.filter(is_default=True)[0]
-            except IndexError:
-                item['status'] = None
+        item['status'] = get_status_by_slug(item['status']) or get_default_status()
 
         # slugify slug
         item['slug'] = slugify(item['name'])
@@ -363,10 +618,7 @@ class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
             item['is_published'] = ''
 
         # get user or None
-        try:
-            item['user'] = User.objects.get(username=item['user'])
-        except User.DoesNotExist:
-            item['user'] = None
+        item['user'] = self.get_user(item['user'])
 
         if not item['elev']:
             item['elev'] = None
@@ -409,6 +661,15 @@ class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
 
         return result
 
+    def get_user(self, username):
+        """ returns the user with the specified username or None, each user is retrieved only once """
+        if username not in self.users:
+            try:
+                self.users[username] = User.objects.get(username=username)
+            except User.DoesNotExist:
+                self.users[username] = None
+        return self.users[username]
+
     def key_mapping(self):
         key_map = self.field_mapping
         self.keys = {
@@ -429,10 +690,15 @@ class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
         """
         save data into DB:
 
-         1. save new (missing) data
-         2. update only when needed
-         3. delete old data
-         4. generate report that will be printed
+         1. items are processed in batches of NODESHOT_SYNC_BATCH_SIZE items (parsed_data might be
+            a generator, in which case only the current batch is kept in memory);
+            names and slugs of each batch which are already taken are changed (see ensure_unique_names)
+         2. each batch is compared with the nodes of the layer which have the same slugs (one query),
+            changed nodes are updated with one query and new nodes are inserted with bulk_create
+         3. once all the items have been processed old nodes are deleted;
+            all the changes are committed in a single transaction
+         4. the nodes_bulk_saved signal is sent once for all the saved nodes after the commit
+         5. generate report that will be printed
 
         constraints:
          * ensure new nodes do not take a name/slug which is already used
@@ -440,52 +706,139 @@ class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
          * use good defaults
         """
         self.key_mapping()
-        # retrieve all items
+        # retrieve all items (might be a generator, see XMLParserMixin and GeoJson)
         items = self.parsed_data
 
-        # init empty lists
+        # slugs and names of external nodes, slugs are needed to perform delete operations
+        processed_slugs = set()
+        processed_names = set()
+        self.counts = { 'added': 0, 'changed': 0, 'unmodified': 0 }
+        items_count = 0
+        batch = []
+        # nodes saved by all the batches, signaled once committed
         added_nodes = []
         changed_nodes = []
-        unmodified_nodes = []
 
-        # retrieve a list of all the slugs of this layer
-        layer_nodes_slug_list = Node.objects.filter(layer=self.layer).values_list('slug', flat=True)
-        # keep a list of all the nodes of other layers
-        other_layers_slug_list = Node.objects.exclude(layer=self.layer).values_list('slug', flat=True)
-        # init empty list of slug of external nodes that will be needed to perform delete operations
-        processed_slug_list = []
-        deleted_nodes_count = 0
+        # batches and the deletion of old nodes are committed together, so that
+        # an error (eg: an invalid item or a broken stream) leaves the layer as it was
+        with transaction.atomic():
+            # loop over every item
+            for item in items:
 
-        # loop over every item
-        for item in items:
+                batch.append(self._convert_item(item))
+                items_count += 1
+
+                if len(batch) >= BATCH_SIZE:
+                    self.ensure_unique_names(batch, processed_slugs, processed_names)
+                    added, changed = self.save_batch(batch)
+                    added_nodes += added
+                    changed_nodes += changed
+                    batch = []
+
+            self.ensure_unique_names(batch, processed_slugs, processed_names)
+            added, changed = self.save_batch(batch)
+            added_nodes += added
+            changed_nodes += changed
+
+            # local nodes not found in external nodes
+            layer_nodes = dict(Node.objects.filter(layer=self.layer).values_list('slug', 'name'))
+            deleted_slugs = [slug for slug in layer_nodes.keys() if slug not in processed_slugs]
+
+            # related objects are deleted and the delete signals are sent as usual
+            if deleted_slugs:
+                Node.objects.filter(layer=self.layer, slug__in=deleted_slugs).delete()
+
+        if added_nodes or changed_nodes:
+            nodes_bulk_saved.send(sender=Node, created=added_nodes, updated=changed_nodes)
 
-            item = self._convert_item(item)
+        for slug in deleted_slugs:
+            self.verbose('node "%s" deleted' % layer_nodes[slug])
 
-            number = 1
-            original_name = item['name']
-            needed_different_name = False
+        # message that will be returned
+        self.message = """
+            %s nodes added
+            %s nodes changed
+            %s nodes deleted
+            %s nodes unmodified
+            %s total external records processed
+            %s total local nodes for this layer
+        """ % (
+            self.counts['added'],
+            self.counts['changed'],
+            len(deleted_slugs),
+            self.counts['unmodified'],
+            items_count,
+            len(layer_nodes) - len(deleted_slugs)
+        )
 
-            while True:
-                # items might have the same name... so we add a number..
-                if item['slug'] in processed_slug_list or item['slug'] in other_layers_slug_list:
-                    needed_different_name = True
+    def ensure_unique_names(self, items, processed_slugs, processed_names):
+        """
+        renames the items of a batch whose name or slug is already taken by a node of another layer,
+        by a node of this layer with a different slug or by an item processed before;
+        slugs and names of the batch are looked up with one query, renamed items are looked up again.
+        The slugs and names of the items are added to processed_slugs and processed_names.
+        """
+        # items might have the same name... so we add a number..
+        pending = [(item, item['name'], 1) for item in items]
+
+        while pending:
+            slugs = [item['slug'] for item, original_name, number in pending]
+            names = [item['name'] for item, original_name, number in pending]
+            other_layers_slugs = set()
+            other_layers_names = set()
+            # names of the nodes of this layer, which can be taken only by the node with the same slug
+            layer_names = {}
+            for layer_id, slug, name in Node.objects.filter(Q(slug__in=slugs) | Q(name__in=names))\
+                                                    .values_list('layer_id', 'slug', 'name'):
+                if layer_id == self.layer.pk:
+                    layer_names[name] = slug
+                else:
+                    other_layers_slugs.add(slug)
+                    other_layers_names.add(name)
+
+            renamed = []
+            for item, original_name, number in pending:
+                if item['slug'] in processed_slugs or item['slug'] in other_layers_slugs or\
+                   item['name'] in processed_names or item['name'] in other_layers_names or\
+                   layer_names.get(item['name'], item['slug']) != item['slug']:
                     number = number + 1
                     item['name'] = "%s - %d" % (original_name, number)
                     item['slug'] = slugify(item['name'])
+                    renamed.append((item, original_name, number))
                 else:
-                    if needed_different_name:
+                    if number > 1:
                         self.verbose('needed a different name for %s, trying "%s"' % (original_name, item['name']))
-                    break
+                    # fill node list container
+                    processed_slugs.add(item['slug'])
+                    processed_names.add(item['name'])
+
+            pending = renamed
+
+    def save_batch(self, items):
+        """
+        compares a batch of converted items (whose slugs and names have already been checked)
+        with the nodes of the layer and writes the differences (in the transaction opened by save);
+        returns a tuple containing the list of added nodes and the list of changed nodes
+        """
+        if not items:
+            return [], []
+
+        # nodes of this layer which have the slugs of the items
+        layer_nodes = dict([(node.slug, node) for node in Node.objects.filter(layer=self.layer,
+                                                                             slug__in=[item['slug'] for item in items])])
+        added_nodes = []
+        changed_nodes = []
+        timestamp = now()
 
+        for item in items:
             # default values
             added = False
             changed = False
 
-            try:
-                # edit existing node
-                node = Node.objects.get(slug=item['slug'], layer=self.layer)
-            except Node.DoesNotExist:
-                # add a new node
+            # edit existing node
+            node = layer_nodes.get(item['slug'])
+            # add a new node
+            if node is None:
                 node = Node()
                 node.layer = self.layer
                 added = True
@@ -509,70 +862,70 @@ class GenericGisSynchronizer(HttpRetrieverMixin, BaseSynchronizer):
 
             if added is True or (node.geometry.equals(item['geometry']) is False\
                                  and node.geometry.equals_exact(item['geometry']) is False):
+                if not added:
+                    # remember the previous location, like the pre_save receiver of the layers app does
+                    node._previous_location = (node.layer_id, node.geometry)
                 node.geometry = item['geometry']
+                # same as Node.save: a geometry collection of just 1 item becomes that item
+                if isinstance(node.geometry, GeometryCollection) and 0 < len(node.geometry) < 2:
+                    node.geometry = node.geometry[0]
                 changed = True
 
             node.data = node.data or {}
 
             # store any additional key/value in HStore data field
             for key, value in item['data'].items():
-                if node.data[key] != value:
+                if node.data.get(key) != value:
                     node.data[key] = value
                     changed = True
 
             # perform save or update only if necessary
             if added or changed:
+                # dates which are not specified by the external source (same as BaseDate.save)
+                if not isinstance(item['updated'], datetime):
+                    node.updated = timestamp
+                if added and not isinstance(item['added'], datetime):
+                    node.added = timestamp
                 try:
-                    node.full_clean()
-                    if node.added is not None and node.updated is not None:
-                        node.save(auto_update=False)
-                    else:
-                        node.save()
+                    # uniqueness of slug and name has been ensured by ensure_unique_names, related objects come from the DB;
+                    # additional validation is performed later on all the nodes at once
+                    node.clean_fields(exclude=['layer', 'status', 'user'])
                 except Exception as e:
                     raise Exception('error while processing "%s": %s' % (node.name, e))
 
             if added:
                 added_nodes.append(node)
+                self.counts['added'] += 1
                 self.verbose('new node saved with name "%s"' % node.name)
             elif changed:
                 changed_nodes.append(node)
+                self.counts['changed'] += 1
                 self.verbose('node "%s" updated' % node.name)
             else:
-                unmodified_nodes.append(node)
+                self.counts['unmodified'] += 1
                 self.verbose('node "%s" unmodified' % node.name)
 
-            # fill node list container
-            processed_slug_list.append(node.slug)
-
-        # delete old nodes
-        for local_node in layer_nodes_slug_list:
-            # if local node not found in external nodes
-            if local_node not in processed_slug_list:
-                # store node name to print it later
-                node_name = node.name
-                # retrieve from DB and delete
-                node = Node.objects.get(slug=local_node)
-                node.delete()
-                # then increment count that will be included in message
-                deleted_nodes_count = deleted_nodes_count + 1
-                self.verbose('node "%s" deleted' % node_name)
+        # spatial validation (eg: minimum distance) of all the nodes with a few queries
+        nodes_to_save = added_nodes + changed_nodes
+        errors = Node.validate_batch(nodes_to_save)
+        for node, error in zip(nodes_to_save, errors):
+            if error is not None:
+                raise Exception('error while processing "%s": %s' % (node.name, error))
 
-        # message that will be returned
-        self.message = """
-            %s nodes added
-            %s nodes changed
-            %s nodes deleted
-            %s nodes unmodified
-            %s total external records processed
-            %s total local nodes for this layer
-        """ % (
-            len(added_nodes),
-            len(changed_nodes),
-            deleted_nodes_count,
-            len(unmodified_nodes),
-            len(items),
-            Node.objects.filter(layer=self.layer).count()
-        )
+        if not nodes_to_save:
+            return [], []
+
+        bulk_update(changed_nodes, self.update_fields, batch_size=BATCH_SIZE)
+        Node.objects.bulk_create(added_nodes, batch_size=BATCH_SIZE)
+
+        # bulk_create doesn't set primary keys
+        ids = dict(Node.objects.filter(layer=self.layer, slug__in=[node.slug for node in added_nodes])
+                               .values_list('slug', 'id'))
+        for node in added_nodes:
+            node.id = ids[node.slug]
+            node._current_status = node.status_id
+
+        return added_nodes, changed_nodes
 
 
 class XmlSynchronizer(HttpRetrieverMixin, XMLParserMixin, BaseSynchronizer):
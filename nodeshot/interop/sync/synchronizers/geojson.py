@@ -1,25 +1,127 @@
 from __future__ import absolute_import
 
+import re
+
 import simplejson as json
 from django.contrib.gis.geos import GEOSGeometry
 from .base import GenericGisSynchronizer
 
 
+class JSONStreamReader(object):
+    """
+    Decodes the JSON values of a document read from an iterable of strings (eg: the chunks
+    of an HTTP response) one by one; only the value which is being decoded is kept in memory.
+    Raises ValueError if the document is not valid.
+    """
+    whitespace = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+        self.position = 0
+        self.decoder = json.JSONDecoder()
+
+    def read(self):
+        """ appends the next chunk to the buffer, returns False at the end of the document """
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            return False
+        # discard what has already been decoded
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            self.position = self.whitespace.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self.read():
+                return
+
+    def skip(self, char):
+        """ skips whitespace and char if it's the next character, returns True if char has been skipped """
+        self.skip_whitespace()
+        if self.buffer[self.position:self.position + 1] == char:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.skip(char):
+            raise ValueError('expected "%s" but found "%s"' % (char, self.buffer[self.position:self.position + 20]))
+
+    def decode(self):
+        """ decodes the next value """
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                # incomplete value
+                if self.read():
+                    continue
+                raise
+            # numbers might continue in the next chunk
+            if end == len(self.buffer) and self.read():
+                continue
+            self.position = end
+            return value
+
+
 class GeoJson(GenericGisSynchronizer):
-    """ GeoJSON synchronizer """
+    """
+    GeoJSON synchronizer
+
+    Features are parsed incrementally while the response (or the file:// URL) is being read,
+    therefore they can be saved in batches without loading the whole FeatureCollection in memory.
+    """
+
+    def retrieve_data(self):
+        """ the content is read while it's parsed """
+        self.data = self.retrieve_stream()
 
     def parse(self):
         """ parse geojson and ensure is collection """
+        # data might have been retrieved in a single string as well
+        chunks = [self.data] if isinstance(self.data, basestring) else self.data
+        self.parsed_data = self.iter_features(chunks)
+
+    def iter_features(self, chunks):
+        """ yields the features of the FeatureCollection one by one """
+        reader = JSONStreamReader(chunks)
+        collection_type = None
+        has_features = False
+
         try:
-            self.parsed_data = json.loads(self.data)
-        except Exception as e:
+            reader.expect('{')
+            first_member = True
+            while not reader.skip('}'):
+                if not first_member:
+                    reader.expect(',')
+                first_member = False
+                key = reader.decode()
+                reader.expect(':')
+                if key != 'features':
+                    value = reader.decode()
+                    if key == 'type':
+                        collection_type = value
+                    continue
+                if collection_type not in (None, 'FeatureCollection'):
+                    break
+                has_features = True
+                reader.expect('[')
+                first_feature = True
+                while not reader.skip(']'):
+                    if not first_feature:
+                        reader.expect(',')
+                    first_feature = False
+                    yield reader.decode()
+        except ValueError as e:
             raise Exception('Error while converting response from JSON to python. %s' % e)
 
-        if self.parsed_data.get('type', '') != 'FeatureCollection':
+        if collection_type != 'FeatureCollection' or not has_features:
             raise Exception('GeoJson synchronizer expects a FeatureCollection object at root level')
 
-        self.parsed_data = self.parsed_data['features']
-
     def parse_item(self, item):
         result = {
             "name": item['properties'].pop(self.keys['name'], ''),
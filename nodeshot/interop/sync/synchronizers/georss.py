@@ -7,6 +7,8 @@ from .base import XMLParserMixin, GenericGisSynchronizer
 
 class GeoRss(XMLParserMixin, GenericGisSynchronizer):
     """ Generic GeoRSS (simple version only) synchronizer """
+    # RSS items or ATOM entries are parsed incrementally, see get_item_tags
+    item_tags = ('item', 'entry')
     SCHEMA = [
         {
             'name': 'url',
@@ -140,7 +142,8 @@ class GeoRss(XMLParserMixin, GenericGisSynchronizer):
     def key_mapping(self, ):
         key_map = self.field_mapping
 
-        if 'summary' in self.data:
+        # ATOM
+        if self.root == 'feed':
             description_default_key = 'summary'
         else:
             description_default_key = 'description'
@@ -159,14 +162,9 @@ class GeoRss(XMLParserMixin, GenericGisSynchronizer):
         }
         self.default_status = self.config.get('default_status', '')
 
-    def parse(self):
-        """ parse data """
-        super(GeoRss, self).parse()
-
-        # support RSS and ATOM
-        tag_name = 'item' if '<item>' in self.data else 'entry'
-
-        self.parsed_data = self.parsed_data.getElementsByTagName(tag_name)
+    def get_item_tags(self):
+        """ RSS and ATOM are supported, the root element of ATOM feeds is "feed" """
+        return ('entry',) if self.root == 'feed' else ('item',)
 
     def parse_item(self, item):
         try:
@@ -6,11 +6,8 @@ from .base import XMLParserMixin, GenericGisSynchronizer
 
 class OpenWisp(XMLParserMixin, GenericGisSynchronizer):
     """ OpenWisp GeoRSS synchronizer class """
-
-    def parse(self):
-        """ parse data """
-        super(OpenWisp, self).parse()
-        self.parsed_data = self.parsed_data.getElementsByTagName('item')
+    # items are parsed incrementally
+    item_tags = ('item',)
 
     def parse_item(self, item):
         guid = self.get_text(item, 'guid')
@@ -1,6 +1,11 @@
+import logging
+
 from celery import task
 from django.utils.module_loading import import_by_path
 from django.core import management
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+
+from .utils import layer_lock, summarize_reports
 
 
 @task()
@@ -11,6 +16,83 @@ def synchronize_external_layers(*args, **kwargs):
     management.call_command('sync', *args, **kwargs)
 
 
+@task()
+def synchronize_external_layers_group(*args, **kwargs):
+    """
+    runs "python manage.py sync --group": each layer is synchronized by a
+    different task of a celery group, so layers are processed concurrently by the
+    celery workers and the reports are logged together by log_sync_reports
+    """
+    kwargs['group'] = True
+    management.call_command('sync', *args, **kwargs)
+
+
+@task()
+def synchronize_external_layer(layer_slug, verbosity=1, force=False):
+    """
+    synchronizes an external layer, unless it's already being synchronized.
+
+    Returns a report: a dictionary with the slug of the layer, the result ("synchronized",
+    "unchanged", "skipped" or "locked", see utils.RESULTS) and a list of messages
+    """
+    # avoid circular imports
+    from nodeshot.core.layers.models import Layer
+
+    layer = Layer.objects.get(slug=layer_slug)
+    report = { 'layer': layer_slug, 'result': 'skipped', 'messages': [] }
+    messages = report['messages']
+
+    # retrieve interop class if available
+    try:
+        synchronizer_path = layer.external.synchronizer_path
+    except (ObjectDoesNotExist, AttributeError):
+        synchronizer_path = 'None'
+
+    # if no synchronizer_path skip the layer
+    if synchronizer_path == 'None':
+        messages.append('External Layer %s does not have a synchronizer class specified' % layer.name)
+        return report
+
+    if layer.external.config is None:
+        messages.append('Layer %s does not have a config yet' % layer.name)
+        return report
+
+    # retrieve class
+    Synchronizer = import_by_path(synchronizer_path)
+    messages.append('imported module %s' % Synchronizer.__name__)
+
+    with layer_lock(layer) as acquired:
+        if not acquired:
+            report['result'] = 'locked'
+            messages.append('Layer "%s" is already being synchronized, skipped' % layer.slug)
+            return report
+
+        # try running
+        try:
+            instance = Synchronizer(layer, verbosity=verbosity, force=force)
+            messages.append('Processing layer "%s"' % layer.slug)
+            messages += instance.process()
+        except ImproperlyConfigured as e:
+            messages.append('Validation error: %s' % e)
+            return report
+
+    report['result'] = 'unchanged' if instance.unchanged else 'synchronized'
+    return report
+
+
+@task()
+def log_sync_reports(reports):
+    """
+    logs the reports of the layers synchronized by a celery group (see the sync command)
+    """
+    logger = logging.getLogger(__name__)
+    for report in reports:
+        logger.info('\n'.join(report['messages']))
+    summary = summarize_reports(reports)
+    logger.info(summary)
+    return summary
+
+
 # ------ Asynchronous tasks ------ #
 
 
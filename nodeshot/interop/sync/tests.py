@@ -1,4 +1,7 @@
+import os
 import sys
+import hashlib
+import tempfile
 import simplejson as json
 import requests
 from cStringIO import StringIO
@@ -13,11 +16,15 @@ from django.conf import settings
 
 from nodeshot.core.layers.models import Layer
 from nodeshot.core.nodes.models import Node
+from nodeshot.core.nodes.signals import nodes_bulk_saved
 from nodeshot.core.base.tests import user_fixtures
+from nodeshot.core.base.settings import DISCONNECTABLE_SIGNALS
+from nodeshot.core.base.utils import pause_disconnectable_signals, resume_disconnectable_signals
 
-from .models import LayerExternal, NodeExternal
+from .models import LayerExternal, NodeExternal, FeedState
 from .settings import settings, SYNCHRONIZERS
-from .tasks import synchronize_external_layers
+from .tasks import synchronize_external_layers, synchronize_external_layers_group
+from .utils import layer_lock
 
 
 TEST_FILES_PATH = '%snodeshot/testing' % settings.STATIC_URL
@@ -230,6 +237,34 @@ class SyncTest(TestCase):
         # ensure all nodes have been imported
         self.assertEqual(layer.node_set.count(), 2)
 
+    def test_xml_incremental_parser(self):
+        """ items yielded by iterparse have the same text values of the minidom ones """
+        from xml.dom import minidom
+        from .synchronizers.base import XMLParserMixin
+
+        path = os.path.join(os.path.dirname(__file__), 'static/nodeshot/testing/openwisp-georss.xml')
+        with open(path) as f:
+            data = f.read()
+
+        parser = XMLParserMixin()
+        parser.data = data
+        parser.item_tags = ('item',)
+        parser.parse()
+
+        # items are freed as soon as the next one is parsed, so they're read one at a time
+        item = next(parser.parsed_data)
+        dom_item = minidom.parseString(data).getElementsByTagName('item')[0]
+        for tag in ['guid', 'title', 'description', 'georss:point', 'updated']:
+            self.assertEqual(parser.get_text(dom_item, tag), parser.get_text(item, tag))
+
+        self.assertEqual(len(list(parser.parsed_data)), 41)
+
+        # documents read in chunks (see retrieve_stream), the root element is known before the items are parsed
+        parser.data = iter([data[i:i + 100] for i in range(0, len(data), 100)])
+        parser.parse()
+        self.assertEqual(parser.root, 'rss')
+        self.assertEqual(len(list(parser.parsed_data)), 42)
+
     def test_openwisp(self):
         """ test OpenWisp synchronizer """
         layer = Layer.objects.external()[0]
@@ -347,6 +382,18 @@ class SyncTest(TestCase):
             kwargs={ 'verbosity': 0 }
         )
 
+        # external source has not changed
+        self.assertIn('external source unchanged', output)
+        self.assertNotIn('nodes unmodified', output)
+
+        ### --- repeat forcing synchronization --- ###
+
+        output = capture_output(
+            management.call_command,
+            ['sync', 'vienna'],
+            kwargs={ 'verbosity': 0, 'force': True }
+        )
+
         # ensure following text is in output
         self.assertIn('2 nodes unmodified', output)
         self.assertIn('0 nodes deleted', output)
@@ -373,6 +420,207 @@ class SyncTest(TestCase):
         self.assertIn('2 total external', output)
         self.assertIn('2 total local', output)
 
+    def test_geojson_sync_stream(self):
+        """ features of local files are parsed incrementally and saved in batches """
+        from .synchronizers import base
+
+        layer = Layer.objects.external()[0]
+        layer.new_nodes_allowed = False
+        layer.save()
+        layer = Layer.objects.get(pk=layer.pk)
+
+        external = LayerExternal(layer=layer)
+        external.synchronizer_path = 'nodeshot.interop.sync.synchronizers.GeoJson'
+        external._reload_schema()
+        external.url = 'file://%s' % os.path.join(os.path.dirname(__file__), 'static/nodeshot/testing/geojson1.json')
+        external.full_clean()
+        external.save()
+
+        # nodes saved by all the batches are signaled once
+        signals = []
+
+        def receiver(sender, **kwargs):
+            signals.append(([node.slug for node in kwargs['created']], kwargs['updated']))
+        nodes_bulk_saved.connect(receiver, sender=Node)
+
+        batch_size = base.BATCH_SIZE
+        # one feature per batch
+        base.BATCH_SIZE = 1
+        try:
+            output = capture_output(
+                management.call_command,
+                ['sync', 'vienna'],
+                kwargs={ 'verbosity': 0 }
+            )
+            self.assertIn('2 nodes added', output)
+            self.assertEqual(signals, [(['simplegeojson', 'simplegeojson2'], [])])
+            self.assertIn('2 total external', output)
+            self.assertIn('2 total local', output)
+            self.assertEqual(layer.node_set.count(), 2)
+
+            # hash of the content is stored after a successful synchronization
+            state = FeedState.objects.get(external=external)
+            with open(external.url[len('file://'):], 'rb') as f:
+                self.assertEqual(state.content_hash, hashlib.sha1(f.read()).hexdigest())
+            external = LayerExternal.objects.get(pk=external.pk)
+            self.assertTrue(state.matches(external.synchronizer_path, external.config))
+
+            # content of the file has not changed
+            output = capture_output(
+                management.call_command,
+                ['sync', 'vienna'],
+                kwargs={ 'verbosity': 0 }
+            )
+            self.assertIn('external source unchanged', output)
+
+            output = capture_output(
+                management.call_command,
+                ['sync', 'vienna'],
+                kwargs={ 'verbosity': 0, 'force': True }
+            )
+            self.assertIn('2 nodes unmodified', output)
+            self.assertIn('0 nodes deleted', output)
+            self.assertEqual(len(signals), 1)
+        finally:
+            base.BATCH_SIZE = batch_size
+            nodes_bulk_saved.disconnect(receiver, sender=Node)
+
+    def test_geojson_sync_names(self):
+        """ names and slugs already taken by nodes of other layers are changed """
+        from .synchronizers import base
+
+        layer = Layer.objects.external()[0]
+        layer.new_nodes_allowed = False
+        layer.save()
+        layer = Layer.objects.get(pk=layer.pk)
+
+        # a node with the same name and a node with the same slug in other layers
+        Node.objects.filter(slug='fusolab').update(name='simplegeojson')
+        other = Node.objects.exclude(layer=layer).exclude(slug='fusolab')[0]
+        Node.objects.filter(pk=other.pk).update(slug='simplegeojson2')
+
+        external = LayerExternal(layer=layer)
+        external.synchronizer_path = 'nodeshot.interop.sync.synchronizers.GeoJson'
+        external._reload_schema()
+        external.url = 'file://%s' % os.path.join(os.path.dirname(__file__), 'static/nodeshot/testing/geojson1.json')
+        external.full_clean()
+        external.save()
+
+        batch_size = base.BATCH_SIZE
+        # one feature per batch
+        base.BATCH_SIZE = 1
+        try:
+            for i in range(2):
+                output = capture_output(
+                    management.call_command,
+                    ['sync', 'vienna'],
+                    kwargs={ 'verbosity': 0, 'force': True }
+                )
+                self.assertEqual(sorted(layer.node_set.values_list('name', 'slug')), [
+                    (u'simplegeojson - 2', u'simplegeojson-2'),
+                    (u'simplegeojson2 - 2', u'simplegeojson2-2')
+                ])
+            # the second synchronization finds the same nodes
+            self.assertIn('2 nodes unmodified', output)
+        finally:
+            base.BATCH_SIZE = batch_size
+
+    def test_geojson_sync_rollback(self):
+        """ an invalid feature in a later batch leaves the layer as it was """
+        from .synchronizers import base
+
+        layer = Layer.objects.external()[0]
+        layer.new_nodes_allowed = False
+        layer.save()
+        layer = Layer.objects.get(pk=layer.pk)
+
+        with open(os.path.join(os.path.dirname(__file__), 'static/nodeshot/testing/geojson1.json')) as f:
+            data = json.load(f)
+        # last feature has no name
+        invalid = dict(data['features'][0], properties={})
+        data['features'].append(invalid)
+        descriptor, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(descriptor, 'w') as f:
+            json.dump(data, f)
+
+        external = LayerExternal(layer=layer)
+        external.synchronizer_path = 'nodeshot.interop.sync.synchronizers.GeoJson'
+        external._reload_schema()
+        external.url = 'file://%s' % path
+        external.full_clean()
+        external.save()
+
+        batch_size = base.BATCH_SIZE
+        # one feature per batch
+        base.BATCH_SIZE = 1
+        try:
+            with self.assertRaises(Exception):
+                management.call_command('sync', 'vienna', verbosity=0)
+        finally:
+            base.BATCH_SIZE = batch_size
+            os.remove(path)
+
+        self.assertEqual(layer.node_set.count(), 0)
+        self.assertFalse(FeedState.objects.filter(external=external).exists())
+
+    def test_sync_layer_lock(self):
+        """ layers which are already being synchronized are skipped """
+        layer = Layer.objects.external()[0]
+        layer.new_nodes_allowed = False
+        layer.save()
+        layer = Layer.objects.get(pk=layer.pk)
+
+        external = LayerExternal(layer=layer)
+        external.synchronizer_path = 'nodeshot.interop.sync.synchronizers.GeoJson'
+        external._reload_schema()
+        external.url = 'file://%s' % os.path.join(os.path.dirname(__file__), 'static/nodeshot/testing/geojson1.json')
+        external.full_clean()
+        external.save()
+
+        with layer_lock(layer) as acquired:
+            self.assertTrue(acquired)
+            output = capture_output(
+                management.call_command,
+                ['sync', 'vienna'],
+                kwargs={ 'verbosity': 0 }
+            )
+            self.assertIn('already being synchronized', output)
+            self.assertIn('1 layers processed: 0 synchronized, 0 unchanged, 0 skipped, 1 locked', output)
+            self.assertEqual(layer.node_set.count(), 0)
+
+        output = capture_output(
+            management.call_command,
+            ['sync', 'vienna'],
+            kwargs={ 'verbosity': 0 }
+        )
+        self.assertIn('2 nodes added', output)
+        self.assertIn('1 layers processed: 1 synchronized', output)
+
+        # celery group variant
+        output = capture_output(
+            synchronize_external_layers_group.apply,
+            kwargs={ 'kwargs': { 'force': True } }
+        )
+        self.assertIn('sent to celery workers', output)
+        self.assertEqual(layer.node_set.count(), 2)
+
+    def test_pause_disconnectable_signals(self):
+        """ signals are reconnected when the last of nested or concurrent pauses is resumed """
+        calls = []
+        DISCONNECTABLE_SIGNALS.append({
+            'disconnect': lambda: calls.append('disconnect'),
+            'reconnect': lambda: calls.append('reconnect')
+        })
+        try:
+            pause_disconnectable_signals()
+            pause_disconnectable_signals()
+            resume_disconnectable_signals()
+            self.assertEqual(calls, ['disconnect'])
+            resume_disconnectable_signals()
+            self.assertEqual(calls, ['disconnect', 'reconnect'])
+        finally:
+            DISCONNECTABLE_SIGNALS.pop()
+
     def test_preexisting_name(self):
         """ test preexisting names """
         layer = Layer.objects.external()[0]
@@ -406,6 +654,37 @@ class SyncTest(TestCase):
         self.assertIn('2 total external', output)
         self.assertIn('2 total local', output)
 
+    def test_name_taken_by_other_layer(self):
+        """ names used by nodes of other layers are not taken even if their slug is different """
+        layer = Layer.objects.external()[0]
+        layer.new_nodes_allowed = False
+        layer.save()
+        layer = Layer.objects.get(pk=layer.pk)
+
+        node = Node.first()
+        self.assertNotEqual(layer.id, node.layer.id)
+        node.name = 'simplegeojson'
+        node.save()
+        self.assertNotEqual(node.slug, 'simplegeojson')
+
+        external = LayerExternal(layer=layer)
+        external.synchronizer_path = 'nodeshot.interop.sync.synchronizers.GeoJson'
+        external._reload_schema()
+        external.url = '%s/geojson1.json' % TEST_FILES_PATH
+        external.full_clean()
+        external.save()
+
+        output = capture_output(
+            management.call_command,
+            ['sync', 'vienna'],
+            kwargs={ 'verbosity': 0 }
+        )
+
+        self.assertIn('2 nodes added', output)
+        self.assertIn('2 total local', output)
+        self.assertEqual(Node.objects.get(slug='simplegeojson-2').name, 'simplegeojson - 2')
+        self.assertEqual(Node.objects.get(slug=node.slug).layer_id, node.layer_id)
+
     def test_key_mappings(self):
         """ importing a file with different keys """
         layer = Layer.objects.external()[0]
@@ -458,7 +737,7 @@ class SyncTest(TestCase):
         output = capture_output(
             management.call_command,
             ['sync', 'vienna'],
-            kwargs={ 'verbosity': 0 }
+            kwargs={ 'verbosity': 0, 'force': True }
         )
         # no changes
         self.assertIn('0 nodes added', output)
@@ -510,12 +789,12 @@ class SyncTest(TestCase):
         geometry = GEOSGeometry('POINT (-70.92 44.256)')
         self.assertTrue(node.geometry.equals_exact(geometry) or node.geometry.equals(geometry))
 
-        ### --- repeat --- ###
+        ### --- repeat forcing synchronization --- ###
 
         output = capture_output(
             management.call_command,
             ['sync', 'vienna'],
-            kwargs={ 'verbosity': 0 }
+            kwargs={ 'verbosity': 0, 'force': True }
         )
 
         # ensure following text is in output
@@ -567,12 +846,12 @@ class SyncTest(TestCase):
         geometry = GEOSGeometry('POINT (95.8932 5.6319)')
         self.assertTrue(node.geometry.equals_exact(geometry) or node.geometry.equals(geometry))
 
-        ### --- repeat --- ###
+        ### --- repeat forcing synchronization --- ###
 
         output = capture_output(
             management.call_command,
             ['sync', 'vienna'],
-            kwargs={ 'verbosity': 0 }
+            kwargs={ 'verbosity': 0, 'force': True }
         )
 
         # ensure following text is in output
@@ -0,0 +1,74 @@
+"""
+Helpers used to synchronize external layers concurrently
+(sync management command and celery tasks)
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+__all__ = [
+    'layer_lock',
+    'summarize_reports',
+]
+
+
+# first key of the PostgreSQL advisory locks of layers (the second one is the id of the layer),
+# avoids conflicts with advisory locks used for other purposes
+LOCK_NAMESPACE = 7001
+# possible results of the synchronization of a layer
+RESULTS = ('synchronized', 'unchanged', 'skipped', 'locked', 'failed')
+
+# layers which are being synchronized by this process
+_locked_layers = set()
+_locked_layers_lock = threading.Lock()
+
+
+@contextmanager
+def layer_lock(layer):
+    """
+    Prevents overlapping synchronizations of the same layer: yields True if the lock
+    has been acquired, False if the layer is already being synchronized by this process
+    (eg: by another thread) or by another process (sync command, its workers or celery workers).
+
+    Other processes are detected with a PostgreSQL advisory lock, which
+    is released automatically if the database connection is closed.
+    """
+    with _locked_layers_lock:
+        if layer.pk in _locked_layers:
+            acquired = False
+        else:
+            _locked_layers.add(layer.pk)
+            acquired = True
+
+    if not acquired:
+        yield False
+        return
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [LOCK_NAMESPACE, layer.pk])
+        locked = cursor.fetchone()[0]
+        try:
+            yield locked
+        finally:
+            if locked:
+                connection.cursor().execute('SELECT pg_advisory_unlock(%s, %s)', [LOCK_NAMESPACE, layer.pk])
+    finally:
+        with _locked_layers_lock:
+            _locked_layers.discard(layer.pk)
+
+
+def summarize_reports(reports):
+    """
+    returns a summary of the reports of synchronize_external_layer,
+    eg: "3 layers processed: 2 synchronized, 1 unchanged, 0 skipped, 0 locked, 0 failed"
+    """
+    counts = dict([(result, 0) for result in RESULTS])
+    for report in reports:
+        counts[report['result']] += 1
+    return '%d layers processed: %s' % (
+        len(reports),
+        ', '.join(['%d %s' % (counts[result], result) for result in RESULTS])
+    )
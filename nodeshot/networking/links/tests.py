@@ -6,8 +6,9 @@ import simplejson as json
 
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
+from django.contrib.gis.geos import Polygon
 
-from nodeshot.core.base.tests import BaseTestCase
+from nodeshot.core.base.tests import BaseTestCase, query_plan
 from nodeshot.core.base.tests import user_fixtures
 from nodeshot.networking.net.models import Interface
 
@@ -152,6 +153,23 @@ class LinkTest(BaseTestCase):
         response = self.client.get(url)
         self.assertEquals(response.status_code, 200)
     
+    def test_links_geojson_bbox(self):
+        link = self.link
+        link.save()
+        url = reverse('api_links_geojson_list')
+        xmin, ymin, xmax, ymax = link.line.extent
+
+        response = self.client.get(url, { 'bbox': '%s,%s,%s,%s' % (xmin, ymin, xmax, ymax) })
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(response.data['features']), 1)
+
+        response = self.client.get(url, { 'bbox': '%s,%s,%s,%s' % (xmax + 1, ymax + 1, xmax + 2, ymax + 2) })
+        self.assertEquals(len(response.data['features']), 0)
+
+        bbox = Polygon.from_bbox((xmin, ymin, xmax, ymax))
+        bbox.srid = 4326
+        self.assertIn('links_link_line_id', query_plan(Link.objects.filter(line__bboverlaps=bbox)))
+    
     def test_node_links_api(self):
         link = self.link
         link.save()
@@ -4,14 +4,15 @@ from django.db.models import Q
 
 from rest_framework import authentication, generics
 
-from nodeshot.core.base.mixins import ACLMixin
+from nodeshot.core.base.mixins import ACLMixin, BBoxFilterMixin, ConditionalGetMixin, CursorPaginationMixin
+from nodeshot.core.base.renderers import CompactRenderersMixin
 from nodeshot.core.nodes.models import Node
 
 from .serializers import *
 from .models import *
 
 
-class LinkList(ACLMixin, generics.ListAPIView):
+class LinkList(ConditionalGetMixin, CursorPaginationMixin, ACLMixin, CompactRenderersMixin, generics.ListAPIView):
     """
     Retrieve link list according to user access level
     
@@ -19,6 +20,8 @@ class LinkList(ACLMixin, generics.ListAPIView):
     
      * `limit=<n>`: specify number of items per page (defaults to 40)
      * `limit=0`: turns off pagination
+     * `cursor=`: paginate with cursors (faster on deep pages, no count), follow the `next` and `previous` links
+     * `format=msgpack`: same data encoded with MessagePack
     """
     authentication_classes = (authentication.SessionAuthentication,)
     queryset = Link.objects.all()
@@ -30,18 +33,25 @@ class LinkList(ACLMixin, generics.ListAPIView):
 link_list = LinkList.as_view()
 
 
-class LinkGeoJSONList(ACLMixin, generics.ListAPIView):
+class LinkGeoJSONList(ConditionalGetMixin, BBoxFilterMixin, ACLMixin, CompactRenderersMixin, generics.ListAPIView):
     """
     Retrieve link list in GeoJSON format
+
+    Parameters:
+
+     * `bbox=<minx>,<miny>,<maxx>,<maxy>`: retrieve only links within the specified bounding box
+     * `format=msgpack` or `format=geobuf`: same data encoded with MessagePack or Geobuf
     """
     authentication_classes = (authentication.SessionAuthentication,)
     queryset = Link.objects.all()
     serializer_class = LinkListGeoJSONSerializer
+    geobuf = True
+    bbox_filter_field = 'line'
     
 link_geojson_list = LinkGeoJSONList.as_view()
 
 
-class LinkDetails(ACLMixin, generics.RetrieveAPIView):
+class LinkDetails(ConditionalGetMixin, ACLMixin, generics.RetrieveAPIView):
     """
     Retrieve details of specified link
     """
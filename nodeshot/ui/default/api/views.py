@@ -1,27 +1,69 @@
+from django.http import StreamingHttpResponse
+
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from nodeshot.core.base.streaming import stream_json, stream_feature_collection
+from nodeshot.core.base.snapshots import snapshot_response
 from nodeshot.core.nodes.models import Node
-from nodeshot.core.nodes.models import Status
+from nodeshot.core.nodes.registry import get_status_registry
 from nodeshot.core.layers.models import Layer
 from nodeshot.core.cms.models import MenuItem
-from nodeshot.core.nodes.serializers import NodeGeoSerializer, StatusListSerializer
+from nodeshot.core.nodes.serializers import FastNodeGeoSerializer, StatusListSerializer
 from nodeshot.core.layers.serializers import LayerDetailSerializer
 from nodeshot.core.cms.serializers import MenuSerializer
 
 
-@api_view(('GET',))
-def essential_data(request, format=None):
-    """
-    Retrieve nodes (geojson), status, layers and menu in one request.
-    """
+def stream_essential_data(nodes, other_data, context):
+    """ yields nodes a chunk at a time, followed by the rest of the data """
+    yield '{"nodes": '
+    serializer = FastNodeGeoSerializer(context=context)
+    for chunk in stream_feature_collection(serializer.values(nodes), serializer):
+        yield chunk
+    for key, value in other_data.items():
+        yield ', %s: %s' % (stream_json(key), stream_json(value))
+    yield '}'
+
+
+def get_essential_data(request):
+    """ returns the queryset of nodes, the rest of the data and the serializer context """
     nodes = Node.objects.published().accessible_to(request.user)
     layers = Layer.objects.published()
-    status = Status.objects.all()
+    status = get_status_registry().all()
     menu = MenuItem.objects.published().filter(parent=None).accessible_to(request.user)
     context = { 'request': request }
-    return Response({
-        'nodes': NodeGeoSerializer(nodes, many=True, context=context).data,
+    data = {
         'layers': LayerDetailSerializer(layers, many=True, context=context).data,
         'status': StatusListSerializer(status, many=True, context=context).data,
         'menu': MenuSerializer(menu, many=True, context=context).data
-    })
+    }
+    return nodes, data, context
+
+
+def build_essential_data_snapshot(request, key=None):
+    """ used by nodeshot.core.base.snapshots """
+    return stream_essential_data(*get_essential_data(request))
+
+
+@api_view(('GET',))
+def essential_data(request, format=None):
+    """
+    Retrieve nodes (geojson), status, layers and menu in one request.
+
+    Parameters:
+
+     * `stream=true`: stream nodes instead of building the whole response in memory
+     * `snapshot=true`: serve the precomputed snapshot if snapshots are enabled
+    """
+    if request.QUERY_PARAMS.get('snapshot', 'false') == 'true':
+        response = snapshot_response(request, 'essential_data')
+        if response is not None:
+            return response
+
+    nodes, data, context = get_essential_data(request)
+
+    if request.QUERY_PARAMS.get('stream', 'false') == 'true':
+        return StreamingHttpResponse(stream_essential_data(nodes, data, context),
+                                     content_type='application/json')
+
+    data['nodes'] = FastNodeGeoSerializer(nodes, many=True, context=context).data
+    return Response(data)
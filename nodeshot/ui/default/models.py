@@ -0,0 +1,45 @@
+# ------ Snapshots ------ #
+
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from nodeshot.core.base.snapshots import register_snapshot, schedule_snapshots, groups_for_access_level
+from nodeshot.core.nodes.models import Node, Status
+from nodeshot.core.nodes.signals import nodes_bulk_saved
+from nodeshot.core.layers.models import Layer
+from nodeshot.core.cms.models import MenuItem
+
+from .api.views import build_essential_data_snapshot
+
+
+register_snapshot('essential_data', build_essential_data_snapshot)
+
+
+@receiver(post_save, sender=Node)
+@receiver(post_delete, sender=Node)
+def schedule_essential_data_node(sender, **kwargs):
+    """ new and deleted nodes affect only the groups which can see them """
+    node = kwargs['instance']
+    if kwargs.get('created', True):
+        schedule_snapshots('essential_data', group_names=groups_for_access_level(node.access_level))
+    else:
+        schedule_snapshots('essential_data')
+
+
+@receiver(nodes_bulk_saved, sender=Node)
+def schedule_essential_data_bulk(sender, **kwargs):
+    if kwargs['updated']:
+        schedule_snapshots('essential_data')
+    elif kwargs['created']:
+        access_level = min([node.access_level for node in kwargs['created']])
+        schedule_snapshots('essential_data', group_names=groups_for_access_level(access_level))
+
+
+@receiver(post_save, sender=Layer)
+@receiver(post_delete, sender=Layer)
+@receiver(post_save, sender=Status)
+@receiver(post_delete, sender=Status)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def schedule_essential_data(sender, **kwargs):
+    schedule_snapshots('essential_data')
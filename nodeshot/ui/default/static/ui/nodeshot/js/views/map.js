@@ -244,11 +244,13 @@ var MapView = Backbone.Marionette.ItemView.extend({
             self.newNodeMarker = marker;
 
             self.getAddress(e.latlng)
+            self.getLayer(e.latlng)
 
             self.newNodeMarker.on('dragend', function (event) {
                 var marker = event.target;
                 var result = marker.getLatLng();
                 self.getAddress(result)
+                self.getLayer(result)
             });
             self.map.panTo(e.latlng);
 
@@ -867,6 +869,24 @@ var MapView = Backbone.Marionette.ItemView.extend({
         });
     },
 
+    /*
+     * preselect the layer whose area contains the new node, if only one
+     */
+    getLayer: function (latlng) {
+        $.ajax({
+            url: '/api/v1/layers/?contains=' + latlng.lng + ',' + latlng.lat,
+            dataType: 'json',
+            success: function (response) {
+                if (response.length === 1) {
+                    var option = $('#id_layer option[value="' + response[0].slug + '"]');
+                    if (option.length) {
+                        $('#id_layer').selectpicker('val', response[0].slug);
+                    }
+                }
+            }
+        });
+    },
+
     searchAddress: function (e) {
         e.preventDefault();
         this.removeAddressFoundMarker()
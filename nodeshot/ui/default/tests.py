@@ -62,6 +62,17 @@ class DefaultUiTest(TestCase):
         self.assertIn('status', response.data)
         self.assertIn('menu', response.data)
 
+    def test_essential_data_stream(self):
+        response = self.client.get(reverse('api_ui_essential_data'), { 'stream': 'true' })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(''.join(response.streaming_content))
+        self.assertEqual(data['nodes']['type'], 'FeatureCollection')
+        self.assertEqual(len(data['nodes']['features']), Node.objects.published().access_level_up_to('public').count())
+        self.assertIn('layers', data)
+        self.assertIn('status', data)
+        self.assertIn('menu', data)
+
     def test_social_auth_optional(self):
         # enable social auth
         setattr(local_settings, 'SOCIAL_AUTH_ENABLED', True)